@@ -1,84 +1,177 @@
 import os
-import json
+import re
+import bisect
+import importlib.util
+from flask import (Flask, render_template, redirect, url_for,
+                   request, jsonify, session, Response, stream_with_context, g)
 import time
 import threading
-from collections import defaultdict
-from flask import Flask, render_template, send_from_directory, redirect, url_for, request
 import traceback
-
-from email_helper import send_photobooth_email  # <-- you create this
+from contextlib import contextmanager
+
+from style_worker import StyleWorker
+from photo_index import PhotoIndex
+from photo_archive import PhotoArchive, photo_of
+from thumbnails import ThumbnailCache
+from image_filters import FilterEngine
+from session_store import SessionStore
+from job_status import JobStatusBoard
+from email_outbox import EmailOutbox
+from ingest import Ingestor, IngestError, IngestConflict
+from image_delivery import ImageServer
+from style_cache import StyleResultCache
+from zip_stream import stream_zip
+try:
+    import face_indexer
+    from face_indexer import FaceIndexer
+    if not face_indexer.DETECTOR:
+        print("WARNING: no face detector in this OpenCV build, face analysis disabled")
+except ImportError as e:
+    print(f"WARNING: face analysis disabled ({e})")
+    FaceIndexer = None
+import metrics
 
 # Create directories if missing
 DIRS = ["photos", "photos_bw", "photos_vintage", "photos_style"]
 for d in DIRS:
     os.makedirs(d, exist_ok=True)
 
-# Safe import with fallback
-try:
-    import style_filter  # your style_filter.py
-    STYLE_AVAILABLE = True
-    print("✓ style_filter loaded successfully")
-except ImportError as e:
-    print(f"WARNING: style_filter.py not found: {e}")
+# Style transfer needs TensorFlow. Only check that it is installed here: importing it
+# takes seconds, so the style worker imports style_filter on its own thread instead.
+STYLE_AVAILABLE = (importlib.util.find_spec("tensorflow") is not None
+                   and importlib.util.find_spec("style_filter") is not None)
+if not STYLE_AVAILABLE:
+    print("WARNING: TensorFlow or style_filter.py not found")
     print("Style transfer will be disabled")
-    style_filter = None
-    STYLE_AVAILABLE = False
 
 app = Flask(__name__)
+app.secret_key = os.environ.get("PHOTOBOOTH_SECRET_KEY") or os.urandom(24)
 
 PHOTO_DIR = "photos"
 PHOTO_BW_DIR = "photos_bw"
 PHOTO_VINTAGE_DIR = "photos_vintage"
 STYLE_OUTPUT_DIR = "photos_style"
-SESSION_FILE = "session_photos.json"
+SESSION_DB = "booth.db"
 STYLE_STATUS_FILE = "style_latest.json"
+PERSIST_STYLE_STATUS = os.environ.get("PERSIST_STYLE_STATUS") == "1"
 MAX_RETAKES = 3
+PREVIEW_WAIT_SECONDS = 8      # how long /preview holds the request for the new photo
+CAPTURE_SLACK_SECONDS = 5     # a photo this much older than the screen press still counts
+CAPTURE_GIVE_UP_SECONDS = 10  # no photo by then: show the booth's latest instead
+INGEST_TOKEN = os.environ.get("PHOTOBOOTH_INGEST_TOKEN")  # shared with rdk_uploader.py
+METRICS_LOG_SECONDS = float(os.environ.get("PHOTOBOOTH_METRICS_LOG", "0"))  # 0 = off
+DEFAULT_STYLE_BACKEND = os.environ.get("STYLE_BACKEND", "quality")  # "quality" or "fast"
+STYLE_BACKEND_CHOICES = ("quality", "fast")   # keys of style_filter.STYLE_BACKENDS
+# quality backend profile; unset = the style worker picks one from the queue length
+DEFAULT_STYLE_PROFILE = os.environ.get("STYLE_PROFILE") or None
+STYLE_PROFILE_CHOICES = ("high", "standard", "preview")   # keys of style_filter.PROFILES
+DEFAULT_BOOTH = "default"     # single-kiosk setups never name their booth
+# SSE streams and long-polls each hold a request thread while they wait; serve.py
+# sets this to half its pool so page loads and images always find a free thread
+LONG_WAIT_SLOTS = int(os.environ.get("PHOTOBOOTH_LONG_WAIT_SLOTS", "8"))
+BUSY_RETRY_SECONDS = 2        # Retry-After when every long-wait slot is taken
+BOOTH_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,32}")
 
 # ---------- helpers ----------
 
-def load_groups():
-    groups = defaultdict(list)
-    if not os.path.exists(PHOTO_DIR):
-        return groups
-    for fname in os.listdir(PHOTO_DIR):
-        if not fname.endswith(".json"):
-            continue
-        json_path = os.path.join(PHOTO_DIR, fname)
-        try:
-            with open(json_path, "r") as f:
-                meta = json.load(f)
-        except Exception as e:
-            print("Failed to read", json_path, e)
-            continue
-        img_name = meta.get("filename")
-        person = meta.get("person", "unknown")
-        if img_name:
-            groups[person].append(img_name)
-    return groups
+long_waits = threading.BoundedSemaphore(LONG_WAIT_SLOTS)
+LONG_WAITS_REFUSED = metrics.counter("long_waits_refused_total",
+                                     "SSE / long-poll requests answered at once: no free slot",
+                                     ["route"])
+
+def set_long_wait_slots(n):
+    global long_waits
+    long_waits = threading.BoundedSemaphore(max(1, n))
+
+@contextmanager
+def long_wait_slot(route):
+    # yields whether this request may hold its thread to wait; never blocks
+    slots = long_waits
+    got = slots.acquire(blocking=False)
+    if not got:
+        LONG_WAITS_REFUSED.inc(route=route)
+    try:
+        yield got
+    finally:
+        if got:
+            slots.release()
+
+def busy_response():
+    # the pages' scripts retry a 503 after a short pause
+    resp = jsonify({"error": "busy, retry shortly"})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(BUSY_RETRY_SECONDS)
+    return resp
+
+KIND_DIRS = {
+    "original": PHOTO_DIR,
+    "bw": PHOTO_BW_DIR,
+    "vintage": PHOTO_VINTAGE_DIR,
+    "style": STYLE_OUTPUT_DIR,
+}
+IMAGE_ROUTES = {
+    "original": "photos_file",
+    "bw": "photos_bw_file",
+    "vintage": "photos_vintage_file",
+    "style": "photos_style_file",
+}
+
+session_store = SessionStore(SESSION_DB)
+email_outbox = EmailOutbox(SESSION_DB)
+photo_index = PhotoIndex(KIND_DIRS)
+# old photos move into pack files (photo_archive.py) and are still served from there
+photo_archive = PhotoArchive(KIND_DIRS, SESSION_DB)
+thumbnail_cache = ThumbnailCache(KIND_DIRS, archive=photo_archive)
+filter_engine = FilterEngine()
+image_server = ImageServer()   # ETag / immutable caching + in-memory LRU for every image route
+# make B&W/vintage derivatives and thumb/screen variants as soon as a new image shows up
+photo_index.subscribe(filter_engine.on_new_photo)
+photo_index.subscribe(thumbnail_cache.generate_async)
+# photos that arrive without a sidecar get one (and a gallery group) from face_indexer.py
+if FaceIndexer is not None and face_indexer.DETECTOR:
+    photo_index.subscribe(FaceIndexer(PHOTO_DIR).on_new_photo)
+# photos pushed by rdk_uploader.py are indexed (and filtered, thumbnailed) right after the rename
+ingestor = Ingestor({"original": PHOTO_DIR}, SESSION_DB,
+                    on_arrival=lambda kind, name: photo_index.refresh(kind))
+
+def image_url(kind, filename, size=None):
+    # size: None for the full image, or a thumbnails.SIZES key ("thumb", "screen")
+    if not filename or kind not in IMAGE_ROUTES:
+        return None
+    if size:
+        return url_for("photo_variant", size=size, kind=kind, filename=filename)
+    return url_for(IMAGE_ROUTES[kind], filename=filename)
 
 def get_latest_photo():
-    if not os.path.exists(PHOTO_DIR):
-        return None
-    files = [f for f in os.listdir(PHOTO_DIR) if f.endswith(".jpg")]
-    if not files:
-        return None
-    files.sort()
-    return files[-1]
+    return photo_index.latest("original")
+
+def photo_exists(base_name):
+    return photo_index.contains("original", base_name) or photo_archive.contains("original", base_name)
+
+def working_copy(base_name):
+    # email attachments and style jobs need real files: an archived photo (with its
+    # versions) moves back into the working folders first
+    if base_name and not photo_index.contains("original", base_name):
+        if photo_archive.restore(base_name):
+            photo_index.refresh()
+
+def send_image(kind, filename, directory=None):
+    # a photo route's response; archived images are read from their pack file.
+    # Only originals are immutable: backfills rewrite derivatives under the same name.
+    resp = image_server.send(directory or KIND_DIRS[kind], filename,
+                             fallback=lambda: photo_archive.open(kind, filename),
+                             immutable=kind == "original")
+    if resp.status_code < 400:    # only photos that exist count as viewed
+        photo_archive.touch(kind, filename)
+    return resp
 
 def get_latest_filtered_for(base_name):
-    root, _ = os.path.splitext(base_name)
-    bw_name = f"{root}_bw.jpg"
-    v_name = f"{root}_vintage.jpg"
-
-    candidates = []
-    bw_path = os.path.join(PHOTO_BW_DIR, bw_name)
-    if os.path.exists(bw_path):
-        candidates.append((os.path.getmtime(bw_path), "bw", bw_name))
-
-    v_path = os.path.join(PHOTO_VINTAGE_DIR, v_name)
-    if os.path.exists(v_path):
-        candidates.append((os.path.getmtime(v_path), "vintage", v_name))
-
+    derivatives = photo_index.derivatives(base_name)
+    candidates = [
+        (mtime, kind, fname)
+        for kind, (mtime, fname) in derivatives.items()
+        if kind in ("bw", "vintage")
+    ]
     if not candidates:
         return None, None
 
@@ -86,77 +179,112 @@ def get_latest_filtered_for(base_name):
     _, kind, fname = candidates[-1]
     return kind, fname
 
-def get_latest_style_file():
-    if not os.path.exists(STYLE_OUTPUT_DIR):
-        return None
-    files = [f for f in os.listdir(STYLE_OUTPUT_DIR) if f.endswith(".jpg")]
-    if not files:
-        return None
-    files.sort()
-    return files[-1]
-
-def load_session_photos():
-    if not os.path.exists(SESSION_FILE):
-        return []
-    try:
-        with open(SESSION_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return []
-
-def save_session_photos(names):
-    try:
-        with open(SESSION_FILE, "w") as f:
-            json.dump(names, f)
-    except Exception as e:
-        print(f"Failed to save session: {e}")
+# ---- booth sessions ----
+#
+# Several kiosks can share this server: each one opens /?booth=<id> once (the id is
+# kept in its session cookie) and its rdk_uploader.py sends the same id. Every flow
+# route then works on the photo captured in this guest's session, not on the newest
+# photo of the whole event.
+
+def current_booth():
+    return session.get("booth", DEFAULT_BOOTH)
+
+def booth_latest_photo(booth=None):
+    # newest photo taken at this booth; an unnamed booth sees every photo, as before
+    booth = booth or current_booth()
+    if booth == DEFAULT_BOOTH:
+        return get_latest_photo()
+    return ingestor.latest(booth)
+
+def current_session_id():
+    # one booth session per guest flow, kept in the signed Flask session cookie;
+    # checked against the store once per request
+    if "booth_session_id" not in g:
+        g.booth_session_id = session_store.ensure_session(session.get("booth_session"))
+        session["booth_session"] = g.booth_session_id
+    return g.booth_session_id
 
 def add_session_photo(filename):
-    names = load_session_photos()
-    names.append(filename)
-    save_session_photos(names)
-    return len(names)
+    return session_store.add_capture(current_session_id(), filename)
 
-# ---- style-transfer status helpers ----
+def current_photo():
+    # the photo this guest captured, or the booth's newest before their first capture
+    if "current_photo" not in g:
+        booth_session = session_store.get(current_session_id())
+        g.current_photo = (booth_session and booth_session["latest_photo"]) or booth_latest_photo()
+    return g.current_photo
 
-def save_style_status(state, filename=None, phase=None):
-    try:
-        data = {"state": state, "filename": filename, "phase": phase, "ts": time.time()}
-        with open(STYLE_STATUS_FILE, "w") as f:
-            json.dump(data, f)
-    except Exception as e:
-        print(f"Failed to save style status: {e}")
-
-def load_style_status():
-    if not os.path.exists(STYLE_STATUS_FILE):
-        return {"state": "idle", "filename": None, "phase": None}
-    try:
-        with open(STYLE_STATUS_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {"state": "idle", "filename": None, "phase": None}
+def current_style_file(base_name):
+    out_name = style_output_name(base_name) if base_name else None
+    return out_name if out_name and photo_index.contains("style", out_name) else None
 
-def start_style_job_for_latest():
-    if not STYLE_AVAILABLE:
-        return
+# ---- style-transfer status helpers ----
 
-    base_name = get_latest_photo()
-    if not base_name:
-        return
+job_board = JobStatusBoard(STYLE_STATUS_FILE if PERSIST_STYLE_STATUS else None)
+
+def save_style_status(state, filename=None, phase=None, **extra):
+    # called from the style worker thread; memory only unless PERSIST_STYLE_STATUS
+    job_board.update(filename, state=state, phase=phase, **extra)
+
+def style_output_name(base_name):
+    return os.path.splitext(base_name)[0] + "_style.jpg"
+
+def describe_style_job(job):
+    # add what the browser needs to show the result; needs a request context
+    if job.get("state") == "done":
+        job["url"] = image_url("style", job["job_id"], "screen")
+    return job
+
+# finished results by (photo content, style image, parameters): retakes of the same
+# frame and repeat requests are copied into place instead of optimised again
+style_cache = StyleResultCache()
+style_worker = (StyleWorker("style_filter", on_status=save_style_status, cache=style_cache,
+                            output_dir=STYLE_OUTPUT_DIR)
+                if STYLE_AVAILABLE else None)
+
+# ---- metrics (see metrics.py; served on /metrics) ----
+
+REQUEST_SECONDS = metrics.histogram("http_request_seconds", "Time to response headers", ["endpoint"])
+REQUESTS = metrics.counter("http_requests_total", "Requests by endpoint and status", ["endpoint", "status"])
+metrics.gauge("style_queue_depth", "Style jobs running + waiting",
+              fn=lambda: style_worker.queue_depth() if style_worker else 0)
+metrics.gauge("email_outbox_messages", "Outbox messages by state", ["state"], fn=email_outbox.counts)
+metrics.gauge("thumbnail_cache_bytes", "Bytes in the variant cache",
+              fn=lambda: thumbnail_cache.stats()["bytes"])
+metrics.gauge("image_memory_cache_bytes", "Bytes of images held in memory",
+              fn=lambda: image_server.stats()["bytes"])
+metrics.gauge("style_cache_bytes", "Bytes of cached style results",
+              fn=lambda: style_cache.stats()["bytes"])
+metrics.gauge("photo_archive_bytes", "Bytes of photos in pack files",
+              fn=lambda: photo_archive.stats()["live_bytes"])
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        endpoint = request.url_rule.endpoint if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+def start_style_job_for(base_name, backend=None, profile=None):
+    if not STYLE_AVAILABLE or not base_name:
+        return None
 
+    working_copy(base_name)
     content_path = os.path.join(PHOTO_DIR, base_name)
-    out_name = os.path.splitext(base_name)[0] + "_style.jpg"
+    out_name = style_output_name(base_name)
 
-    def job():
-        save_style_status("running", out_name, phase="loading")
-        try:
-            style_filter.run_style_on_latest(content_path, out_name)
-            save_style_status("done", out_name, phase="finished")
-        except Exception as e:
-            print("Style job failed:", e)
-            save_style_status("error", out_name, phase="error")
+    # already stylised: a page refresh must not start another optimisation
+    if photo_index.contains("style", out_name):
+        return None
 
-    threading.Thread(target=job, daemon=True).start()
+    return style_worker.submit(content_path, out_name, backend or DEFAULT_STYLE_BACKEND,
+                               booth=current_booth(), profile=profile or DEFAULT_STYLE_PROFILE)
 
 # ---- ERROR HANDLER ----
 
@@ -170,17 +298,46 @@ def handle_error(e):
 
 @app.route("/")
 def welcome():
+    # the welcome screen starts a fresh booth session for the next guest;
+    # a kiosk sharing the server is opened once at /?booth=<id>
+    booth = request.args.get("booth")
+    if booth is not None:
+        if not BOOTH_ID_RE.fullmatch(booth):
+            return "Booth ids are letters, digits, - and _ (up to 32)", 400
+        session["booth"] = booth
+    session["booth_session"] = session_store.new_session()
+    g.pop("booth_session_id", None)
+    session.pop("capture_at", None)
     return render_template("welcome.html")
 
 @app.route("/camera")
 def camera_live():
     return render_template("camera_live.html")
 
+def captured_since(started):
+    # accepts a photo that reached the server after (or just before) a screen press:
+    # guests press the physical button together with it, and a pushed photo can win.
+    # The guest's earlier captures don't count again.
+    taken = set(session_store.captures(current_session_id()))
+    def accept(name):
+        arrived = photo_index.arrived("original", name)
+        return (arrived is not None and arrived >= started - CAPTURE_SLACK_SECONDS
+                and name not in taken)
+    return accept
+
+def capture_expected(booth):
+    # only a running rdk_uploader.py pushes a photo right after the press; with
+    # sync_rdk.sh alone, or the RDK offline, nothing is on its way
+    return ingestor.uploader_online(None if booth == DEFAULT_BOOTH else booth)
+
 @app.route("/trigger_capture")
 def trigger_capture():
-    latest = get_latest_photo()
-    if latest:
-        add_session_photo(latest)
+    # the photo may still be on its way from the RDK; remember when the guest pressed
+    # so /preview can wait for the one taken by this press
+    if capture_expected(current_booth()):
+        session["capture_at"] = time.time()
+    else:
+        session.pop("capture_at", None)
     return redirect(url_for("buffer_game"))
 
 @app.route("/buffer")
@@ -189,16 +346,40 @@ def buffer_game():
 
 @app.route("/preview")
 def preview():
-    latest = get_latest_photo()
-    photo_url = url_for("photos_file", filename=latest) if latest else None
+    waiting_since = None
+    wait_seconds = 0
+    if "capture_at" in session:
+        started = session["capture_at"]
+        booth = current_booth()
+        with long_wait_slot("preview") as may_wait:
+            # no slot: just look once, the page then waits on /ingest/wait
+            latest = ingestor.wait_for(captured_since(started), lambda: booth_latest_photo(booth),
+                                       PREVIEW_WAIT_SECONDS if may_wait else 0)
+        if latest:
+            session.pop("capture_at")
+            add_session_photo(latest)
+        elif time.time() - started >= CAPTURE_GIVE_UP_SECONDS:
+            # the uploader is up but sent nothing, so only the screen button was
+            # pressed: as before the capture flow, show the booth's newest photo
+            session.pop("capture_at")
+            latest = current_photo()
+        else:
+            # not here yet: the page keeps waiting on /ingest/wait and reloads,
+            # at the latest when the give-up time has passed
+            waiting_since = started
+            wait_seconds = started + CAPTURE_GIVE_UP_SECONDS - time.time()
+    else:
+        latest = current_photo()
+    photo_url = image_url("original", latest, "screen")
 
-    session_photos = load_session_photos()
-    retake_count = len(session_photos)
+    retake_count = session_store.capture_count(current_session_id())
     max_reached = retake_count >= MAX_RETAKES
 
     return render_template(
         "preview.html",
         photo_url=photo_url,
+        waiting_since=waiting_since,
+        wait_seconds=wait_seconds,
         retake_count=retake_count,
         max_reached=max_reached,
         max_retakes=MAX_RETAKES
@@ -214,8 +395,8 @@ def preview_retake():
 
 @app.route("/filters", methods=["GET", "POST"])
 def filter_game():
-    latest = get_latest_photo()
-    photo_url = url_for("photos_file", filename=latest) if latest else None
+    latest = current_photo()
+    photo_url = image_url("original", latest, "screen")
 
     if request.method == "POST":
         return redirect(url_for("compare"))
@@ -223,37 +404,41 @@ def filter_game():
     filtered_url = None
     if latest:
         kind, fname = get_latest_filtered_for(latest)
-        if kind == "bw":
-            filtered_url = url_for("photos_bw_file", filename=fname)
-        elif kind == "vintage":
-            filtered_url = url_for("photos_vintage_file", filename=fname)
-
-    start_style_job_for_latest()
-    status = load_style_status()
-    styled_filename = status.get("filename")
+        filtered_url = image_url(kind, fname, "screen")
+
+    # ?style=fast|quality picks the style backend for this guest, ?profile= its quality
+    backend = request.args.get("style")
+    if not STYLE_AVAILABLE or backend not in STYLE_BACKEND_CHOICES:
+        backend = None
+    profile = request.args.get("profile")
+    if profile not in STYLE_PROFILE_CHOICES:
+        profile = None
+    style_position = start_style_job_for(latest, backend, profile)
+    style_depth = style_worker.queue_depth() if style_worker else 0
+    style_job = style_output_name(latest) if latest else None
     styled_url = None
-    if styled_filename and status.get("state") == "done":
-        styled_url = url_for("photos_style_file", filename=styled_filename)
+    if style_job and photo_index.contains("style", style_job):
+        styled_url = image_url("style", style_job, "screen")
 
     return render_template(
         "filters.html",
         photo_url=photo_url,
         filtered_url=filtered_url,
-        styled_url=styled_url
+        styled_url=styled_url,
+        style_position=style_position,
+        style_depth=style_depth,
+        style_job=style_job
     )
 
 @app.route("/compare", methods=["GET", "POST"])
 def compare():
-    latest = get_latest_photo()
-    photo_url = url_for("photos_file", filename=latest) if latest else None
+    latest = current_photo()
+    photo_url = image_url("original", latest, "screen")
 
     filtered_url = None
     if latest:
         kind, fname = get_latest_filtered_for(latest)
-        if kind == "bw":
-            filtered_url = url_for("photos_bw_file", filename=fname)
-        elif kind == "vintage":
-            filtered_url = url_for("photos_vintage_file", filename=fname)
+        filtered_url = image_url(kind, fname, "screen")
 
     if request.method == "POST":
         return redirect(url_for("gallery"))
@@ -279,42 +464,43 @@ def finalize():
     if request.method == "POST":
         return redirect(url_for("qr_page"))
 
-    base_name = get_latest_photo()
+    base_name = current_photo()
     if not base_name:
         return render_template("finalize.html", original_url=None, styled_url=None)
 
-    original_url = url_for("photos_file", filename=base_name)
+    original_url = image_url("original", base_name, "screen")
 
+    style_job = style_output_name(base_name)
     styled_url = None
-    style_file = get_latest_style_file()
-    if style_file:
-        styled_url = url_for("photos_style_file", filename=style_file)
+    if photo_index.contains("style", style_job):
+        styled_url = image_url("style", style_job, "screen")
+    if job_board.get(style_job) is None:
+        style_job = None     # nothing submitted (or forgotten): no progress stream to follow
 
-    return render_template("finalize.html", original_url=original_url, styled_url=styled_url)
+    return render_template("finalize.html", original_url=original_url, styled_url=styled_url,
+                           style_job=style_job)
 
 @app.route("/qr")
 def qr_page():
-    base_name = get_latest_photo()
-    original_url = url_for("photos_file", filename=base_name) if base_name else None
+    base_name = current_photo()
+    original_url = image_url("original", base_name, "screen")
 
     filtered_url = None
     if base_name:
         kind, fname = get_latest_filtered_for(base_name)
-        if kind == "bw":
-            filtered_url = url_for("photos_bw_file", filename=fname)
-        elif kind == "vintage":
-            filtered_url = url_for("photos_vintage_file", filename=fname)
+        filtered_url = image_url(kind, fname, "screen")
 
     styled_url = None
-    style_file = get_latest_style_file()
+    style_file = current_style_file(base_name)
     if style_file:
-        styled_url = url_for("photos_style_file", filename=style_file)
+        styled_url = image_url("style", style_file, "screen")
 
     return render_template(
         "qr.html",
         original_url=original_url,
         filtered_url=filtered_url,
-        styled_url=styled_url
+        styled_url=styled_url,
+        bundle_url=url_for("session_bundle", size="screen") if base_name else None
     )
 
 # ---------- EMAIL SHARE ROUTE ----------
@@ -324,8 +510,9 @@ def email_share():
     if request.method == "POST":
         email = request.form.get("email", "").strip()
 
-        base_name = get_latest_photo()
+        base_name = current_photo()
         attachments = []
+        working_copy(base_name)
 
         if base_name:
             attachments.append(os.path.join(PHOTO_DIR, base_name))
@@ -336,14 +523,15 @@ def email_share():
             elif kind == "vintage":
                 attachments.append(os.path.join(PHOTO_VINTAGE_DIR, fname))
 
-        style_file = get_latest_style_file()
+        style_file = current_style_file(base_name)
         if style_file:
             attachments.append(os.path.join(STYLE_OUTPUT_DIR, style_file))
 
         body = "Here are the three latest booth images, matching what you saw on screen."
 
+        # queued here, sent by the outbox thread: the guest doesn't wait for SMTP
         try:
-            send_photobooth_email(
+            email_outbox.enqueue(
                 to_email=email,
                 subject="HKUST Photobooth images",
                 body=body,
@@ -351,37 +539,269 @@ def email_share():
             )
             sent_ok = True
         except Exception as e:
-            print("Email send failed:", e)
+            print("Email enqueue failed:", e)
             sent_ok = False
 
         return render_template("email_share.html", submitted=True, sent_ok=sent_ok)
 
     return render_template("email_share.html", submitted=False, sent_ok=None)
 
+# ---------- INGEST (capture side pushes photos here) ----------
+
+def uploader_booth():
+    # the X-Booth-Id an uploader sends, or None; raises IngestError if malformed
+    booth = request.headers.get("X-Booth-Id")
+    if booth is not None and not BOOTH_ID_RE.fullmatch(booth):
+        raise IngestError(f"bad booth id: {booth}")
+    return booth
+
+def ingest_denied():
+    # uploads always need the token: anyone on the hotspot could otherwise add photos
+    if not INGEST_TOKEN:
+        return jsonify({"error": "set PHOTOBOOTH_INGEST_TOKEN to enable ingest"}), 403
+    if request.headers.get("X-Ingest-Token") != INGEST_TOKEN:
+        return jsonify({"error": "bad token"}), 403
+    return None
+
+@app.route("/ingest/<filename>", methods=["PUT"])
+def ingest_photo(filename):
+    denied = ingest_denied()
+    if denied:
+        return denied
+    try:
+        result = ingestor.receive("original", filename, request.stream,
+                                  request.headers.get("X-Content-SHA256"), booth=uploader_booth())
+    except IngestConflict as e:
+        return jsonify({"error": str(e)}), 409
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 201 if result["status"] == "created" else 200
+
+@app.route("/ingest/ping", methods=["POST"])
+def ingest_ping():
+    # rdk_uploader.py is running: capture presses at its booth will be pushed
+    denied = ingest_denied()
+    if denied:
+        return denied
+    try:
+        ingestor.contact(uploader_booth())
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    return "", 204
+
+@app.route("/ingest/wait")
+def ingest_wait():
+    # long-poll: returns as soon as this booth has a photo newer than ?after=<name>,
+    # or one that arrived after ?since=<unix time> (what /preview waits for)
+    after = request.args.get("after", "")
+    since = request.args.get("since", type=float)
+    timeout = min(request.args.get("timeout", 25, type=float), 60)
+    booth = current_booth()
+    latest_fn = lambda: booth_latest_photo(booth)
+    with long_wait_slot("ingest_wait") as may_wait:
+        if not may_wait:
+            return busy_response()
+        if since is not None:
+            latest = ingestor.wait_for(captured_since(since), latest_fn, timeout)
+        else:
+            latest = ingestor.wait_for_newer(after, latest_fn, timeout)
+    return jsonify({"latest": latest, "arrived": latest is not None})
+
+def staff_authorized():
+    # operator endpoints: the ingest token, as a header or ?token=; without a
+    # configured token nobody on the open hotspot counts as staff
+    token = request.headers.get("X-Ingest-Token") or request.args.get("token")
+    return bool(INGEST_TOKEN) and token == INGEST_TOKEN
+
+def redact_email(address):
+    # "jane.doe@gmail.com" -> "j***@gmail.com"
+    local, _, domain = (address or "").partition("@")
+    return f"{local[:1]}***@{domain}" if domain else "***"
+
+@app.route("/email/outbox")
+def email_outbox_status():
+    status = email_outbox.status()
+    if not staff_authorized():
+        for message in status["unsent"]:
+            message["to_email"] = redact_email(message["to_email"])
+    return jsonify(status)
+
+@app.route("/email/outbox/<int:message_id>/retry", methods=["POST"])
+def email_outbox_retry(message_id):
+    if not staff_authorized():
+        return jsonify({"ok": False, "error": "bad token"}), 403
+    if not email_outbox.retry(message_id):
+        return jsonify({"ok": False, "error": "not a failed message"}), 404
+    return jsonify({"ok": True})
+
 # ---------- gallery and static image routes ----------
 
+GALLERY_PAGE_SIZE = 48
+GALLERY_MAX_PAGE_SIZE = 200
+
 @app.route("/gallery", methods=["GET", "POST"])
 def gallery():
     if request.method == "POST":
         return redirect(url_for("did_you_know"))
-    groups = load_groups()
-    return render_template("gallery.html", groups=groups)
+    # only the group headings are rendered; photos come from /api/gallery/photos
+    return render_template("gallery.html", group_counts=photo_index.group_counts(),
+                           page_size=GALLERY_PAGE_SIZE)
+
+@app.route("/api/gallery/groups")
+def gallery_groups_api():
+    # ?after=<person>&limit=: groups in person order, with photo counts
+    after = request.args.get("after")
+    limit = min(request.args.get("limit", GALLERY_PAGE_SIZE, type=int), GALLERY_MAX_PAGE_SIZE)
+    people = list(photo_index.group_counts().items())   # sorted by person
+    start = bisect.bisect_right([p for p, _ in people], after) if after else 0
+    page = people[start:start + limit]
+    return jsonify({
+        "groups": [{"person": p, "count": n} for p, n in page],
+        "next_cursor": page[-1][0] if page and start + limit < len(people) else None,
+    })
+
+@app.route("/api/gallery/photos")
+def gallery_photos_api():
+    # ?person=&after=<filename>&limit=: one page of a group's photos
+    person = request.args.get("person", "")
+    limit = min(request.args.get("limit", GALLERY_PAGE_SIZE, type=int), GALLERY_MAX_PAGE_SIZE)
+    names, next_cursor = photo_index.group_page(person, request.args.get("after"), max(limit, 1))
+    return jsonify({
+        "person": person,
+        "photos": [{
+            "filename": name,
+            "thumb": image_url("original", name, "thumb"),
+            "screen": image_url("original", name, "screen"),
+        } for name in names],
+        "next_cursor": next_cursor,
+    })
 
 @app.route("/photos/<path:filename>")
 def photos_file(filename):
-    return send_from_directory(PHOTO_DIR, filename)
+    return send_image("original", filename)
 
 @app.route("/photos_bw/<path:filename>")
 def photos_bw_file(filename):
-    return send_from_directory(PHOTO_BW_DIR, filename)
+    return send_image("bw", filename)
 
 @app.route("/photos_vintage/<path:filename>")
 def photos_vintage_file(filename):
-    return send_from_directory(PHOTO_VINTAGE_DIR, filename)
+    return send_image("vintage", filename)
 
 @app.route("/photos_style/<path:filename>")
 def photos_style_file(filename):
-    return send_from_directory(STYLE_OUTPUT_DIR, filename)
+    return send_image("style", filename)
+
+# ---------- style job status (read-only: never starts a job) ----------
+
+@app.route("/style/status/<path:job_id>")
+def style_status(job_id):
+    # ?since=<version> turns this into a long-poll that returns on the next change
+    since = request.args.get("since", type=int)
+    if since is None:
+        job = job_board.get(job_id)
+    else:
+        wait = min(request.args.get("wait", 25.0, type=float), 60.0)
+        with long_wait_slot("style_status") as may_wait:
+            if not may_wait:
+                return busy_response()
+            job = job_board.wait(job_id, since, timeout=wait)
+    if job is None:
+        return jsonify({"job_id": job_id, "state": "unknown"}), 404
+    return jsonify(describe_style_job(job))
+
+@app.route("/style/events/<path:job_id>")
+def style_events(job_id):
+    # the stream holds its slot until the server closes the response; without one
+    # the page's script falls back to the long-poll
+    slots = long_waits
+    if not slots.acquire(blocking=False):
+        LONG_WAITS_REFUSED.inc(route="style_events")
+        return busy_response()
+    stream = job_board.events(job_id, decorate=describe_style_job)
+    resp = Response(
+        stream_with_context(stream),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    resp.call_on_close(slots.release)
+    return resp
+
+@app.route("/thumbs/<size>/<kind>/<path:filename>")
+def photo_variant(size, kind, filename):
+    filename = os.path.basename(filename)
+    path = thumbnail_cache.get(size, kind, filename)
+    if path is None:
+        return "Not found", 404
+    # an archived photo that is already small comes back as its (missing) working path
+    return send_image(kind, filename, directory=os.path.dirname(path))
+
+@app.route("/style/queue")
+def style_queue():
+    if style_worker is None:
+        return jsonify({"available": False})
+    stats = style_worker.stats()
+    stats["available"] = True
+    return jsonify(stats)
+
+@app.route("/archive/status")
+def archive_status():
+    return jsonify(photo_archive.stats())
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ---------- ZIP bundles (a photo and all its versions in one download) ----------
+
+BUNDLE_SIZES = ("screen",)   # thumbnails.SIZES keys offered instead of full size
+
+def bundle_entries(base_names, size=None):
+    # (name in the ZIP, path) for each photo and its B&W / vintage / style versions;
+    # evaluated lazily while the ZIP streams, so screen variants are made one at a time
+    for base_name in base_names:
+        files = {kind: fname for kind, (_, fname) in photo_index.derivatives(base_name).items()}
+        files.update(photo_archive.members(base_name))
+        files["original"] = base_name
+        for kind, fname in sorted(files.items(), key=lambda kv: kv[0] != "original"):
+            if size:
+                path = thumbnail_cache.get(size, kind, fname)
+            else:
+                path = os.path.join(KIND_DIRS[kind], fname)
+            if path and not os.path.exists(path):
+                path = photo_archive.open(kind, fname)
+            if path:
+                yield fname, path
+
+def zip_response(base_names, download_name):
+    size = request.args.get("size")
+    if size not in BUNDLE_SIZES:
+        size = None
+    return Response(
+        stream_zip(bundle_entries(base_names, size)),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{download_name}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+@app.route("/bundle")
+def session_bundle():
+    # every photo captured in this guest's session (or the current one); ?size=screen
+    names = [n for n in session_store.captures(current_session_id()) if photo_exists(n)]
+    if not names and current_photo():
+        names = [current_photo()]
+    if not names:
+        return "No photos in this session", 404
+    return zip_response(names, "hkust_photobooth.zip")
+
+@app.route("/bundle/<path:filename>")
+def photo_bundle(filename):
+    # one photo and its versions, by the original's filename; ?size=screen
+    if not photo_exists(filename):
+        return "Not found", 404
+    return zip_response([filename], f"hkust_photobooth_{os.path.splitext(filename)[0]}.zip")
 
 @app.route("/download/<kind>/<path:filename>")
 def download_image(kind, filename):
@@ -396,7 +816,20 @@ def download_image(kind, filename):
     else:
         return "Invalid link", 404
 
-    return render_template("download.html", img_url=img_url)
+    base_name = photo_of(kind, filename)
+    bundle_url = None
+    if photo_exists(base_name):
+        bundle_url = url_for("photo_bundle", filename=base_name, size="screen")
+    return render_template("download.html", img_url=img_url, bundle_url=bundle_url)
 
 if __name__ == "__main__":
+    # warm the model and resume unsent emails (only in the reloader's child)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        email_outbox.start()
+        photo_index.start()
+        photo_archive.start()
+        if style_worker is not None:
+            style_worker.start()
+        if METRICS_LOG_SECONDS > 0:
+            metrics.start_log_summary(METRICS_LOG_SECONDS)
     app.run(host="0.0.0.0", port=8900, debug=True)
@@ -0,0 +1,87 @@
+# benchmarks/bench_filters.py
+# Per-megapixel cost of each registered filter, with and without JPEG decode/encode.
+#
+#   python benchmarks/bench_filters.py --sizes 1 4 12 --repeat 10
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import statistics
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import image_filters  # noqa: E402
+
+
+def synthetic_photo(megapixels, seed=0):
+    # 4:3 frame with smooth gradients + noise so JPEG sizes look like real photos
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    base = np.stack([x / w * 255, y / h * 255, (x + y) / (w + h) * 255], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(samples)
+
+
+def bench(megapixels, repeat):
+    rgb = synthetic_photo(megapixels)
+    mp = rgb.shape[0] * rgb.shape[1] / 1e6
+    buf = io.BytesIO()
+    Image.fromarray(rgb).save(buf, "JPEG", quality=92)
+    jpeg = buf.getvalue()
+
+    def decode():
+        return np.asarray(Image.open(io.BytesIO(jpeg)).convert("RGB"))
+
+    results = []
+    decode_ms = median_ms(decode, repeat)
+    for name, spec in image_filters.FILTERS.items():
+        fn = spec["fn"]
+        fn(rgb)  # warm caches (vignette mask etc.)
+        filter_ms = median_ms(lambda: fn(rgb), repeat)
+
+        def end_to_end():
+            out = fn(decode())
+            Image.fromarray(out).save(io.BytesIO(), "JPEG", quality=image_filters.JPEG_QUALITY)
+
+        total_ms = median_ms(end_to_end, repeat)
+        results.append({
+            "filter": name,
+            "megapixels": round(mp, 2),
+            "filter_ms": round(filter_ms, 2),
+            "filter_ms_per_mp": round(filter_ms / mp, 2),
+            "decode_ms": round(decode_ms, 2),
+            "end_to_end_ms": round(total_ms, 2),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filter cost per megapixel")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 12])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    all_results = []
+    for mp in args.sizes:
+        for r in bench(mp, args.repeat):
+            all_results.append(r)
+            print("  ".join(f"{k}={v}" for k, v in r.items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent=2)
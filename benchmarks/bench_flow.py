@@ -0,0 +1,257 @@
+# benchmarks/bench_flow.py
+# Replays the guest flow against a real HTTP server and reports per-route latency
+# percentiles and throughput.
+#
+#   python benchmarks/bench_flow.py --sizes 100 10000 100000 --guests 200 --concurrency 8
+#   python benchmarks/bench_flow.py --url http://127.0.0.1:8900 --guests 50   # running server
+#   python benchmarks/compare_results.py old.json new.json
+#
+# For each size a throwaway booth tree is built (see bench_photo_index.build_tree) and
+# the app is started in a subprocess inside it, so the load generator doesn't share a
+# GIL with the server. Each simulated guest keeps its own session cookie and walks
+# /camera -> /trigger_capture -> (photo upload) -> /preview -> /filters -> /compare ->
+# /qr -> /email_share. The upload is a PUT to /ingest, i.e. what rdk_uploader.py does
+# between the capture press and the preview. Emails go to a no-op sender.
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import socket
+import hashlib
+import argparse
+import platform
+import tempfile
+import itertools
+import threading
+import subprocess
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from bench_photo_index import REPO_ROOT, build_tree
+
+FLOW = ["/camera", "/trigger_capture", "/ingest", "/preview", "/filters", "/compare",
+        "/qr", "/email_share"]
+
+SERVER_SCRIPT = """
+import sys, app
+from werkzeug.serving import make_server
+app.email_outbox.send_fn = lambda **kwargs: None
+app.STYLE_AVAILABLE = {with_style}
+make_server("127.0.0.1", int(sys.argv[1]), app.app, threaded=True).serve_forever()
+"""
+
+
+def sample_jpeg(megapixels=1.0):
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    img = Image.linear_gradient("L").resize((w, w * 3 // 4)).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_samples, q):
+    # nearest-rank percentile of an already sorted list
+    if not sorted_samples:
+        return None
+    k = max(0, min(len(sorted_samples) - 1, int(round(q / 100.0 * len(sorted_samples))) - 1))
+    return sorted_samples[k]
+
+
+class Guest:
+    # one browser: its own connection and session cookie
+    def __init__(self, base_url):
+        url = urllib.parse.urlsplit(base_url)
+        self.netloc = url.netloc
+        self.conn = None
+        self.cookie = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.netloc, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                resp = self.conn.getresponse()
+                resp.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+        if resp.will_close:
+            self.conn.close()
+            self.conn = None
+        set_cookie = resp.getheader("Set-Cookie")
+        if set_cookie:
+            self.cookie = set_cookie.split(";", 1)[0]
+        return resp.status
+
+
+def run_flow(base_url, photo_bytes, names, samples, lock):
+    guest = Guest(base_url)
+    for step in FLOW:
+        if step == "/ingest":
+            # unique content per upload, otherwise the server dedupes it
+            name = next(names)
+            body = photo_bytes + name.encode()
+            args = ("PUT", f"/ingest/{name}", body,
+                    {"X-Content-SHA256": hashlib.sha256(body).hexdigest(),
+                     "Content-Type": "image/jpeg"})
+        elif step == "/email_share":
+            args = ("POST", step, "email=guest%40example.com",
+                    {"Content-Type": "application/x-www-form-urlencoded"})
+        else:
+            args = ("GET", step)
+        t0 = time.perf_counter()
+        try:
+            status = guest.request(*args)
+        except OSError:
+            status = None
+        ms = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            samples.setdefault(step, []).append((ms, status is not None and status < 400))
+
+
+def summarise(samples, wall_seconds):
+    rows = []
+    for step in FLOW:
+        entries = samples.get(step, [])
+        ok = sorted(ms for ms, good in entries if good)
+        rows.append({
+            "route": step,
+            "requests": len(entries),
+            "errors": len(entries) - len(ok),
+            "p50_ms": round(percentile(ok, 50), 2) if ok else None,
+            "p95_ms": round(percentile(ok, 95), 2) if ok else None,
+            "p99_ms": round(percentile(ok, 99), 2) if ok else None,
+            "max_ms": round(ok[-1], 2) if ok else None,
+            "rps": round(len(entries) / wall_seconds, 1),
+        })
+    return rows
+
+
+def load(base_url, guests, concurrency):
+    photo = sample_jpeg()
+    counter = itertools.count()
+    names_lock = threading.Lock()
+
+    def names():
+        while True:
+            with names_lock:
+                i = next(counter)
+            yield f"20991231_{i:06d}_{os.getpid() % 1000:03d}000.jpg"
+
+    name_source = names()
+    samples, lock = {}, threading.Lock()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(guests):
+            pool.submit(run_flow, base_url, photo, name_source, samples, lock)
+    wall = time.perf_counter() - t0
+    return summarise(samples, wall), round(guests / wall, 2)
+
+
+def start_server(root, with_style):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO_ROOT, os.environ.get("PYTHONPATH", "")]))
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVER_SCRIPT.format(with_style=with_style), str(port)],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server exited during start-up")
+        try:
+            Guest(base_url).request("GET", "/camera")
+            return proc, base_url
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def bench_size(n, guests, concurrency, with_style):
+    root = tempfile.mkdtemp(prefix=f"booth_flow_{n}_")
+    proc = None
+    try:
+        build_tree(root, n)
+        shutil.copytree(os.path.join(REPO_ROOT, "static"), os.path.join(root, "static"))
+        proc, base_url = start_server(root, with_style)
+        Guest(base_url).request("GET", "/gallery")      # first scan, not part of the numbers
+        rows, flows_per_s = load(base_url, guests, concurrency)
+        for row in rows:
+            row.update({"photos": n, "concurrency": concurrency})
+        return rows, flows_per_s
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Guest-flow latency and throughput")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000])
+    parser.add_argument("--guests", type=int, default=100, help="flows to replay per size")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--url", help="benchmark an already running server instead")
+    parser.add_argument("--with-style", action="store_true", help="let /filters start style jobs")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results, summary = [], []
+    runs = [(None, args.url)] if args.url else [(n, None) for n in args.sizes]
+    for n, url in runs:
+        if url:
+            rows, flows_per_s = load(url, args.guests, args.concurrency)
+            for row in rows:
+                row.update({"photos": None, "concurrency": args.concurrency})
+        else:
+            rows, flows_per_s = bench_size(n, args.guests, args.concurrency, args.with_style)
+        summary.append({"photos": n, "flows_per_s": flows_per_s})
+        print(f"-- photos={n} concurrency={args.concurrency} flows/s={flows_per_s}")
+        for row in rows:
+            print("  ".join(f"{k}={v}" for k, v in row.items() if k not in ("photos", "concurrency")))
+        results.extend(rows)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "benchmark": "flow",
+                "meta": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "git": git_revision(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "cpus": os.cpu_count(),
+                    "guests": args.guests,
+                    "concurrency": args.concurrency,
+                    "flows": summary,
+                },
+                "results": results,
+            }, f, indent=2)
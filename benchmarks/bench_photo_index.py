@@ -0,0 +1,99 @@
+# benchmarks/bench_photo_index.py
+# Route latency vs. number of photos, with the in-memory photo index.
+#
+#   python benchmarks/bench_photo_index.py --sizes 100 1000 10000 100000
+#
+# Builds a throwaway booth tree (empty .jpg files + JSON sidecars + derivatives) for
+# each size, imports the app inside it and times the helpers and routes that used to
+# list the folders on every request. The files are backdated and the app's photo index
+# listeners removed, so nothing tries to filter or thumbnail the empty files. The first request pays the initial scan; the
+# numbers reported are for warm requests, which is what guests see.
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import statistics
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ["/preview", "/compare", "/finalize", "/qr"]
+SYNTHETIC_MTIME = 946713600    # 2000-01-01, like the RDK's unset clock
+
+
+def build_tree(root, n):
+    for d in ["photos", "photos_bw", "photos_vintage", "photos_style"]:
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+    for i in range(n):
+        name = f"20000101_{i:06d}_080000"
+        open(os.path.join(root, "photos", name + ".jpg"), "wb").close()
+        with open(os.path.join(root, "photos", name + ".json"), "w") as f:
+            json.dump({"filename": name + ".jpg", "person": f"{i % 4 + 1} People"}, f)
+        if i % 2 == 0:
+            open(os.path.join(root, "photos_bw", name + "_bw.jpg"), "wb").close()
+        else:
+            open(os.path.join(root, "photos_vintage", name + "_vintage.jpg"), "wb").close()
+        if i % 3 == 0:
+            open(os.path.join(root, "photos_style", name + "_style.jpg"), "wb").close()
+    # older than photo_index.CATCH_UP_SECONDS: a server started on this tree doesn't
+    # hand the empty files to its listeners
+    for d in ["photos", "photos_bw", "photos_vintage", "photos_style"]:
+        for entry in os.scandir(os.path.join(root, d)):
+            os.utime(entry.path, (SYNTHETIC_MTIME, SYNTHETIC_MTIME))
+    shutil.copytree(os.path.join(REPO_ROOT, "templates"), os.path.join(root, "templates"))
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(samples)
+
+
+def bench_size(n, repeat):
+    root = tempfile.mkdtemp(prefix=f"booth_{n}_")
+    old_cwd = os.getcwd()
+    try:
+        build_tree(root, n)
+        os.chdir(root)
+        sys.path.insert(0, REPO_ROOT)
+        app_module = importlib.reload(importlib.import_module("app"))
+        app_module.photo_index._listeners.clear()   # routes only, no background work
+        client = app_module.app.test_client()
+
+        t0 = time.perf_counter()
+        app_module.get_latest_photo()
+        app_module.photo_index.groups()
+        cold_ms = (time.perf_counter() - t0) * 1000.0
+
+        result = {"photos": n, "cold_scan_ms": round(cold_ms, 2)}
+        result["get_latest_photo_ms"] = round(time_call(app_module.get_latest_photo, repeat), 4)
+        result["groups_ms"] = round(time_call(app_module.photo_index.groups, repeat), 4)
+        for route in ROUTES:
+            result[route] = round(time_call(lambda: client.get(route), repeat), 3)
+        return result
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Route latency vs. number of photos")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        r = bench_size(n, args.repeat)
+        results.append(r)
+        print("  ".join(f"{k}={v}" for k, v in r.items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
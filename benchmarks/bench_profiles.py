@@ -0,0 +1,142 @@
+# benchmarks/bench_profiles.py
+# Time and peak memory of each style_filter quality profile (high / standard / preview).
+#
+#   python benchmarks/bench_profiles.py --vgg --json profiles.json   # on the board
+#   python benchmarks/bench_profiles.py                              # stand-in network
+#   python benchmarks/bench_profiles.py --vgg --precision bfloat16   # preview in bfloat16
+#   python benchmarks/bench_profiles.py --vgg --untrained            # no ImageNet download
+#
+# Each profile runs in its own process so peak RSS belongs to that profile alone:
+# model build (VGG cut to the profile's layers, in its precision), then full
+# run_style_transfer calls on a 1600x1200 photo. Without --vgg the small stand-in
+# network from bench_style.py is used; compare profiles with it, but take the
+# numbers for guest wait times from a --vgg run on the board. --untrained builds VGG19
+# with random weights: the same layers and FLOPs, so ms per step and memory hold, but
+# early stopping ends at a different step than with the real weights.
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def untrained_vgg(style_layers, content_layer, precision="float32"):
+    import style_filter
+    vgg = style_filter.vgg19.VGG19(weights=None, include_top=False)
+    vgg.trainable = False
+    return style_filter.truncate_vgg(vgg, style_layers, content_layer, precision)
+
+
+def run_profile(profile, use_vgg, repeat, untrained=False):
+    # runs in the child process; returns one result row
+    import style_cache
+    import style_filter
+    import bench_style
+
+    if not use_vgg:
+        style_filter.get_vgg_model = bench_style.stand_in_vgg
+    elif untrained:
+        style_filter.get_vgg_model = untrained_vgg
+    root = tempfile.mkdtemp(prefix="bench_profiles_")
+    style_cache.CACHE_DIR = root    # measure the style targets, not a stored copy
+    content_path, style_path = bench_style.write_images(root)
+    baseline_mb = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    style_model = style_filter.StyleModel(style_path, profile)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+
+    samples, steps = [], []
+    for _ in range(repeat):
+        report = {}
+        t0 = time.perf_counter()
+        style_filter.run_style_transfer(content_path, style_path, os.path.join(root, "out.jpg"),
+                                        style_model=style_model, report=report, profile=profile)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+        steps.append(report["total_steps"])
+
+    settings = style_filter.PROFILES[profile]
+    peak_mb = peak_rss_mb()
+    return {
+        "network": ("vgg19_untrained" if untrained else "vgg19") if use_vgg else "stand_in",
+        "profile": profile,
+        "max_size": max(settings["scales"]),
+        "precision": settings["precision"],
+        "style_layers": len(settings["style_layers"]),
+        "content_layer": settings["content_layer"],
+        "model_build_ms": round(build_ms, 1),
+        "ms": round(statistics.median(samples), 1),
+        "total_steps": int(statistics.median(steps)),
+        "ms_per_step": round(statistics.median(samples) / max(1, statistics.median(steps)), 1),
+        "peak_rss_mb": peak_mb,
+        "rss_over_baseline_mb": round(peak_mb - baseline_mb, 1),
+    }
+
+
+def bench(profiles, use_vgg, repeat, untrained=False):
+    results = []
+    for profile in profiles:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", profile, "--repeat", str(repeat)]
+        if use_vgg:
+            cmd.append("--vgg")
+        if untrained:
+            cmd.append("--untrained")
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="style_filter quality profiles: time and peak memory")
+    parser.add_argument("--vgg", action="store_true", help="use the real VGG19 instead of the stand-in")
+    parser.add_argument("--untrained", action="store_true",
+                        help="with --vgg: random weights instead of downloading ImageNet's")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--profile", action="append", help="only these profiles (repeatable)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--precision", choices=["float32", "bfloat16"],
+                        help="precision of the preview profile (PHOTOBOOTH_PREVIEW_PRECISION)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+    if args.precision:
+        os.environ["PHOTOBOOTH_PREVIEW_PRECISION"] = args.precision   # inherited by the children
+
+    if args.child:
+        print(json.dumps(run_profile(args.child, args.vgg, args.repeat, args.untrained)))
+        sys.exit(0)
+
+    import style_filter
+    results = bench(args.profile or list(style_filter.PROFILES), args.vgg, args.repeat,
+                    args.untrained)
+    for r in results:
+        print("  ".join(f"{k}={v}" for k, v in r.items()))
+
+    if args.json:
+        import tensorflow as tf
+        with open(args.json, "w") as f:
+            json.dump({
+                "benchmark": "profiles",
+                "meta": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "tensorflow": tf.__version__,
+                    "cpus": os.cpu_count(),
+                    "repeat": args.repeat,
+                },
+                "results": results,
+            }, f, indent=2)
@@ -0,0 +1,147 @@
+# benchmarks/bench_style.py
+# style_filter cost: model build, style targets, per-step time at each scale and a
+# full run_style_transfer, with a small stand-in for VGG19 so it runs offline.
+#
+#   python benchmarks/bench_style.py --repeat 3 --json style.json
+#   python benchmarks/bench_style.py --vgg          # real VGG19 (downloads weights once)
+#
+# The stand-in has VGG19's layer names and pooling so every code path is the same,
+# but far fewer channels: absolute numbers are lower than on the booth, use it to
+# compare runs (e.g. before/after a change) rather than to predict guest wait times.
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tensorflow as tf  # noqa: E402
+import style_filter  # noqa: E402
+import style_cache  # noqa: E402
+
+# (layer, filters) in VGG19 order; a max-pool follows the last conv of each block
+STAND_IN_BLOCKS = [
+    [("block1_conv1", 8)],
+    [("block2_conv1", 16)],
+    [("block3_conv1", 32)],
+    [("block4_conv1", 32)],
+    [("block5_conv1", 64), ("block5_conv2", 64)],
+]
+
+
+def stand_in_vgg(style_layers=style_filter.STYLE_LAYERS, content_layer=style_filter.CONTENT_LAYER,
+                 precision="float32"):
+    # same signature as style_filter.get_vgg_model, cut and cast the same way
+    inputs = tf.keras.Input(shape=(None, None, 3))
+    x = inputs
+    for i, block in enumerate(STAND_IN_BLOCKS):
+        for name, filters in block:
+            x = tf.keras.layers.Conv2D(filters, 3, padding="same", activation="relu", name=name)(x)
+        if i < len(STAND_IN_BLOCKS) - 1:
+            x = tf.keras.layers.MaxPool2D(2, name=f"block{i + 1}_pool")(x)
+    return style_filter.truncate_vgg(tf.keras.Model(inputs, x), style_layers, content_layer, precision)
+
+
+def write_images(root, size=(1600, 1200), seed=0):
+    rng = np.random.default_rng(seed)
+    paths = []
+    for name in ("content.jpg", "style.jpg"):
+        y, x = np.mgrid[0:size[1], 0:size[0]].astype(np.float32)
+        base = np.stack([x / size[0], y / size[1], (x + y) / sum(size)], axis=-1) * 255
+        img = np.clip(base + rng.normal(0, 20, base.shape), 0, 255).astype(np.uint8)
+        path = os.path.join(root, name)
+        Image.fromarray(img).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - t0) * 1000.0
+
+
+def bench(use_vgg, repeat, steps):
+    if not use_vgg:
+        style_filter.get_vgg_model = stand_in_vgg
+
+    root = tempfile.mkdtemp(prefix="bench_style_")
+    style_cache.CACHE_DIR = root    # measure the style targets, not a stored copy
+    content_path, style_path = write_images(root)
+    results = []
+    network = "vgg19" if use_vgg else "stand_in"
+
+    style_model, build_ms = timed(lambda: style_filter.StyleModel(style_path))
+    results.append({"network": network, "stage": "model_build", "ms": round(build_ms, 1)})
+
+    _, targets_ms = timed(lambda: style_filter.compute_style_targets(style_model.vgg_model, style_path))
+    results.append({"network": network, "stage": "style_targets", "ms": round(targets_ms, 1)})
+
+    full = style_filter.load_img(content_path, max_dim=max(style_filter.SCALES))
+    for size in style_filter.SCALES:
+        content = style_filter.resize_max_dim(full, size)
+        # first call traces the tf.function for this shape; report it separately
+        _, first_ms = timed(lambda: style_filter.optimize_at_scale(
+            style_model, content, content, 1, 0.0))
+        samples = []
+        for _ in range(repeat):
+            _, ms = timed(lambda: style_filter.optimize_at_scale(
+                style_model, content, content, steps, 0.0))
+            samples.append(ms / steps)
+        results.append({
+            "network": network,
+            "stage": "step",
+            "size": int(size),
+            "first_call_ms": round(first_ms, 1),
+            "ms_per_step": round(statistics.median(samples), 2),
+        })
+
+    samples, reports = [], []
+    for _ in range(repeat):
+        report = {}
+        _, ms = timed(lambda: style_filter.run_style_transfer(
+            content_path, style_path, os.path.join(root, "out.jpg"),
+            style_model=style_model, report=report))
+        samples.append(ms)
+        reports.append(report)
+    results.append({
+        "network": network,
+        "stage": "end_to_end",
+        "ms": round(statistics.median(samples), 1),
+        "total_steps": int(statistics.median(r["total_steps"] for r in reports)),
+    })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="style_filter end-to-end and per-step cost")
+    parser.add_argument("--vgg", action="store_true", help="use the real VGG19 instead of the stand-in")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=20, help="optimiser steps per timing sample")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results = bench(args.vgg, args.repeat, args.steps)
+    for r in results:
+        print("  ".join(f"{k}={v}" for k, v in r.items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "benchmark": "style",
+                "meta": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "tensorflow": tf.__version__,
+                    "gpus": len(tf.config.list_physical_devices("GPU")),
+                    "scales": style_filter.SCALES,
+                    "steps_per_scale": style_filter.STEPS_PER_SCALE,
+                },
+                "results": results,
+            }, f, indent=2)
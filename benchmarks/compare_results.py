@@ -0,0 +1,57 @@
+# benchmarks/compare_results.py
+# Side-by-side diff of two benchmark result files written with --json.
+#
+#   python benchmarks/compare_results.py before.json after.json
+#
+# Rows are matched on their identifying fields (route, stage, photos, size, ...);
+# every other numeric field is printed as old -> new with the relative change.
+import json
+import argparse
+
+KEY_FIELDS = ("benchmark", "route", "stage", "profile", "precision", "filter", "network", "photos",
+              "size", "megapixels", "concurrency")
+
+
+def load_rows(path):
+    with open(path) as f:
+        data = json.load(f)
+    # older benchmarks write a bare list, newer ones {"meta": ..., "results": [...]}
+    return data["results"] if isinstance(data, dict) else data
+
+
+def row_key(row):
+    return tuple((k, row[k]) for k in KEY_FIELDS if k in row)
+
+
+def compare(old_rows, new_rows, threshold):
+    old_by_key = {row_key(r): r for r in old_rows}
+    lines = []
+    for new in new_rows:
+        key = row_key(new)
+        old = old_by_key.get(key)
+        label = " ".join(f"{k}={v}" for k, v in key)
+        if old is None:
+            lines.append(f"{label}  (new)")
+            continue
+        for field, value in new.items():
+            if field in KEY_FIELDS or not isinstance(value, (int, float)):
+                continue
+            before = old.get(field)
+            if not isinstance(before, (int, float)):
+                continue
+            change = (value - before) / before if before else 0.0
+            flag = "  <--" if abs(change) >= threshold else ""
+            lines.append(f"{label}  {field}: {before} -> {value} ({change:+.1%}){flag}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="mark changes at least this large (default 10%%)")
+    args = parser.parse_args()
+
+    lines = compare(load_rows(args.old), load_rows(args.new), args.threshold)
+    print("\n".join(lines) if lines else "no matching rows")
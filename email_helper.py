@@ -1,14 +1,142 @@
-import yagmail
+import io
+import os
+import time
+import smtplib
+import mimetypes
+import threading
+from email.message import EmailMessage
+from PIL import Image
 
-SENDER_EMAIL = "isdnchkustphotobooth@gmail.com"
-APP_PASSWORD = "idkr livz wsak xwej"  # Gmail App Password
+SENDER_EMAIL = os.environ.get("PHOTOBOOTH_SENDER", "isdnchkustphotobooth@gmail.com")
+APP_PASSWORD = os.environ.get("PHOTOBOOTH_APP_PASSWORD", "idkr livz wsak xwej")  # Gmail App Password
+
+# point these at a local stand-in for testing, e.g.
+#   python -m aiosmtpd -n -l localhost:1025
+#   PHOTOBOOTH_SMTP_HOST=localhost PHOTOBOOTH_SMTP_PORT=1025 PHOTOBOOTH_SMTP_SSL=0
+SMTP_HOST = os.environ.get("PHOTOBOOTH_SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("PHOTOBOOTH_SMTP_PORT", "465"))
+SMTP_SSL = os.environ.get("PHOTOBOOTH_SMTP_SSL", "1") == "1"
+SMTP_TIMEOUT = 30
+IDLE_CHECK_SECONDS = 60      # NOOP before reusing a connection idle longer than this
+
+ATTACHMENT_MAX_BYTES = 1_500_000   # per image, after recompression
+ATTACHMENT_MAX_DIM = 2048
+
+
+class SMTPConnection:
+    # one reusable, lazily opened SMTP session; reconnects when the server drops it
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_SSL,
+                 user=SENDER_EMAIL, password=APP_PASSWORD):
+        self.host, self.port, self.use_ssl = host, port, use_ssl
+        self.user, self.password = user, password
+        self._smtp = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+            smtp.ehlo()
+            if smtp.has_extn("starttls"):
+                smtp.starttls()
+                smtp.ehlo()
+        if self.password and smtp.has_extn("auth"):
+            smtp.login(self.user, self.password)
+        return smtp
+
+    def _alive(self):
+        if self._smtp is None:
+            return False
+        if time.monotonic() - self._last_used < IDLE_CHECK_SECONDS:
+            return True
+        try:
+            return self._smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, msg):
+        with self._lock:
+            for attempt in (1, 2):
+                if not self._alive():
+                    self.close()
+                    self._smtp = self._connect()
+                try:
+                    self._smtp.send_message(msg)
+                    self._last_used = time.monotonic()
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    # stale session: reconnect once, then let the caller's retry policy decide
+                    self.close()
+                    if attempt == 2:
+                        raise
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+def shrink_image(path, max_bytes=ATTACHMENT_MAX_BYTES, max_dim=ATTACHMENT_MAX_DIM):
+    # original bytes if already small enough, else a downscaled / recompressed JPEG
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) <= max_bytes:
+        return data
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (max_dim, max_dim))
+        img = img.convert("RGB")
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        quality = 88
+        while True:
+            buf = io.BytesIO()
+            img.save(buf, "JPEG", quality=quality, optimize=True)
+            if buf.tell() <= max_bytes or min(img.size) < 320:
+                return buf.getvalue()
+            if quality > 60:
+                quality -= 10
+            else:
+                img.thumbnail((img.width * 3 // 4, img.height * 3 // 4), Image.LANCZOS)
+
+
+def build_message(to_email, subject, body, attachments=None):
+    msg = EmailMessage()
+    msg["From"] = SENDER_EMAIL
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.set_content(body)
+    for path in attachments or []:
+        if not os.path.exists(path):
+            continue
+        ctype, _ = mimetypes.guess_type(path)
+        maintype, subtype = (ctype or "application/octet-stream").split("/", 1)
+        if maintype == "image":
+            data = shrink_image(path)
+            if data[:2] == b"\xff\xd8":
+                subtype = "jpeg"
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+        msg.add_attachment(data, maintype=maintype, subtype=subtype,
+                           filename=os.path.basename(path))
+    return msg
+
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def get_connection():
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            _connection = SMTPConnection()
+        return _connection
 
-yag = yagmail.SMTP(SENDER_EMAIL, APP_PASSWORD)
 
 def send_photobooth_email(to_email, subject, body, attachments=None):
-    yag.send(
-        to=to_email,
-        subject=subject,
-        contents=body,
-        attachments=attachments or []
-    )
+    get_connection().send(build_message(to_email, subject, body, attachments))
@@ -0,0 +1,181 @@
+# email_outbox.py
+# Durable outbox for booth emails: /email_share enqueues and returns immediately,
+# a background thread sends over one reused SMTP connection with retries + backoff.
+import json
+import time
+import smtplib
+import threading
+
+from session_store import open_db
+import metrics
+from email_helper import send_photobooth_email
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 10          # seconds; doubles per failed attempt
+BACKOFF_MAX = 30 * 60
+LOOP_ERROR_DELAY = 5       # seconds before the sender retries after a database error
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_email     TEXT NOT NULL,
+    subject      TEXT NOT NULL,
+    body         TEXT NOT NULL,
+    attachments  TEXT NOT NULL,
+    state        TEXT NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error   TEXT,
+    created      REAL NOT NULL,
+    sent_at      REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox(state, next_attempt);
+"""
+
+SEND_SECONDS = metrics.histogram("email_send_seconds", "SMTP send time per attempt", ["outcome"])
+SENDS = metrics.counter("email_sends_total", "Send attempts by outcome (sent, retry, failed)",
+                        ["outcome"])
+COLUMNS = ("id", "to_email", "subject", "state", "attempts", "next_attempt",
+           "last_error", "created", "sent_at")
+
+
+def is_permanent(error):
+    # the server refused the message or recipient (5xx): another attempt won't help
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class EmailOutbox:
+    def __init__(self, db_path, send_fn=send_photobooth_email):
+        self.db_path = db_path
+        self.send_fn = send_fn
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._thread = None
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # anything mid-send when the last process died goes back in the queue
+        with conn:
+            conn.execute("UPDATE outbox SET state = 'pending' WHERE state = 'sending'")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = open_db(self.db_path)
+        return conn
+
+    # ---- API ----
+
+    def enqueue(self, to_email, subject, body, attachments=None):
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO outbox (to_email, subject, body, attachments, next_attempt, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (to_email, subject, body, json.dumps(attachments or []), now, now),
+            )
+            message_id = cur.lastrowid
+        self.start()
+        self._wake.set()
+        return message_id
+
+    def retry(self, message_id):
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE outbox SET state = 'pending', attempts = 0, next_attempt = ? "
+                "WHERE id = ? AND state = 'failed'",
+                (time.time(), message_id),
+            )
+        self._wake.set()
+        return cur.rowcount > 0
+
+    def counts(self):
+        # state -> number of messages
+        return dict(self._conn().execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall())
+
+    def status(self, limit=20):
+        conn = self._conn()
+        counts = self.counts()
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM outbox WHERE state != 'sent' "
+            "ORDER BY id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return {"counts": counts, "unsent": [dict(zip(COLUMNS, r)) for r in rows]}
+
+    # ---- sender thread ----
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+
+    def _next_due(self):
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                "SELECT id, to_email, subject, body, attachments, attempts FROM outbox "
+                "WHERE state = 'pending' AND next_attempt <= ? ORDER BY id LIMIT 1",
+                (time.time(),),
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE outbox SET state = 'sending' WHERE id = ?", (row[0],))
+        return row
+
+    def _sleep_seconds(self):
+        row = self._conn().execute(
+            "SELECT MIN(next_attempt) FROM outbox WHERE state = 'pending'"
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _run(self):
+        # never lets an error end the thread: a locked booth.db (shared with sessions,
+        # ingest and the archive) only delays sending
+        while True:
+            try:
+                self._run_once()
+            except Exception as e:
+                print("Email outbox error, retrying shortly:", e)
+                time.sleep(LOOP_ERROR_DELAY)
+
+    def _run_once(self):
+        row = self._next_due()
+        if row is None:
+            self._wake.wait(self._sleep_seconds())
+            self._wake.clear()
+            return
+
+        message_id, to_email, subject, body, attachments, attempts = row
+        t0 = time.perf_counter()
+        try:
+            self.send_fn(to_email=to_email, subject=subject, body=body,
+                         attachments=json.loads(attachments))
+        except Exception as e:
+            SEND_SECONDS.observe(time.perf_counter() - t0, outcome="error")
+            self._failed(message_id, attempts + 1, e)
+            return
+        SEND_SECONDS.observe(time.perf_counter() - t0, outcome="sent")
+        SENDS.inc(outcome="sent")
+        print(f"Email {message_id} sent in {time.perf_counter() - t0:.1f}s")
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE outbox SET state = 'sent', attempts = ?, sent_at = ?, last_error = NULL "
+                "WHERE id = ?",
+                (attempts + 1, time.time(), message_id),
+            )
+
+    def _failed(self, message_id, attempts, error):
+        give_up = attempts >= MAX_ATTEMPTS or is_permanent(error)
+        SENDS.inc(outcome="failed" if give_up else "retry")
+        delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+        print(f"Email {message_id} failed (attempt {attempts}): {error}")
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE outbox SET state = ?, attempts = ?, next_attempt = ?, last_error = ? "
+                "WHERE id = ?",
+                ("failed" if give_up else "pending", attempts, time.time() + delay,
+                 str(error)[:500], message_id),
+            )
@@ -0,0 +1,219 @@
+# face_indexer.py
+# Face counting for the gallery's person groups, done inside the project.
+#
+# Writes the same sidecar the capture side does (photos/<name>.json with num_faces,
+# has_face and person = "N People" / "unknown"), plus the photo's sha256 so later
+# runs can skip photos that were already analysed. New photos are analysed as soon
+# as the photo index sees them; old ones with --backfill across every core.
+#
+# Detection uses the Haar cascade bundled with opencv-python 4.x. OpenCV 5 dropped the
+# cascades; there, point PHOTOBOOTH_FACE_MODEL at a YuNet .onnx file
+# (face_detection_yunet_2023mar.onnx from the OpenCV model zoo).
+#
+#   python face_indexer.py --backfill               # photos without a sidecar
+#   python face_indexer.py --backfill --reanalyze   # also redo sidecars made elsewhere
+import io
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import metrics
+import photo_archive
+
+SOURCE_DIR = "photos"
+CASCADE_FILE = "haarcascade_frontalface_default.xml"   # bundled with opencv-python 4.x
+YUNET_MODEL = os.environ.get("PHOTOBOOTH_FACE_MODEL", "models/face_detection_yunet.onnx")
+YUNET_SCORE = 0.8
+DETECT_MAX_DIM = 800       # faces at a booth fill a good part of the frame
+MIN_FACE_FRACTION = 0.06   # of the short edge; ignores faces in the background crowd
+BATCH_SIZE = 16
+
+ANALYSIS_SECONDS = metrics.histogram("face_analysis_seconds", "Decode + detect + sidecar write")
+
+_local = threading.local()
+
+
+def detector_name():
+    # which detector this OpenCV build can run, or None
+    if hasattr(cv2, "CascadeClassifier"):
+        return CASCADE_FILE
+    if hasattr(cv2, "FaceDetectorYN") and os.path.exists(YUNET_MODEL):
+        return os.path.basename(YUNET_MODEL)
+    return None
+
+
+DETECTOR = detector_name()
+
+
+def _detector():
+    # OpenCV detectors aren't safe to share between threads: one per thread/process
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        if DETECTOR is None:
+            raise RuntimeError("no face detector: needs opencv-python 4.x or a YuNet model "
+                               f"at {YUNET_MODEL}")
+        if DETECTOR == CASCADE_FILE:
+            detector = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, CASCADE_FILE))
+        else:
+            detector = cv2.FaceDetectorYN.create(YUNET_MODEL, "", (320, 320), YUNET_SCORE)
+        _local.detector = detector
+    return detector
+
+
+def sidecar_path(photo_path):
+    return os.path.splitext(photo_path)[0] + ".json"
+
+
+def read_sidecar(photo_path):
+    try:
+        with open(sidecar_path(photo_path)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def person_label(num_faces):
+    # matches what the capture side writes
+    return f"{num_faces} People" if num_faces else "unknown"
+
+
+def detect_faces(data):
+    # data: JPEG bytes -> list of [x, y, w, h] in full-resolution pixels
+    detector = _detector()
+    haar = DETECTOR == CASCADE_FILE
+    with Image.open(io.BytesIO(data)) as img:
+        full_w = img.size[0]
+        mode = "L" if haar else "RGB"
+        img.draft(mode, (DETECT_MAX_DIM, DETECT_MAX_DIM))   # DCT-scaled decode, much cheaper
+        small = img.convert(mode)
+        small.thumbnail((DETECT_MAX_DIM, DETECT_MAX_DIM))
+    pixels = np.asarray(small)
+    h, w = pixels.shape[:2]
+    min_side = max(24, int(min(h, w) * MIN_FACE_FRACTION))
+    if haar:
+        faces = detector.detectMultiScale(cv2.equalizeHist(pixels), scaleFactor=1.1,
+                                          minNeighbors=5, minSize=(min_side, min_side))
+    else:
+        detector.setInputSize((w, h))
+        _, found = detector.detect(np.ascontiguousarray(pixels[..., ::-1]))   # BGR
+        faces = [f[:4] for f in (found if found is not None else []) if min(f[2], f[3]) >= min_side]
+    scale = full_w / w
+    return [[int(round(v * scale)) for v in face] for face in faces]
+
+
+def write_sidecar(photo_path, meta):
+    path = sidecar_path(photo_path)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)   # new inode: the photo index notices the change
+
+
+def analyze(photo_path, reanalyze=False):
+    # returns the new sidecar, or None if the photo was skipped
+    t0 = time.perf_counter()
+    with open(photo_path, "rb") as f:
+        data = f.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    existing = read_sidecar(photo_path)
+    if existing is not None:
+        if existing.get("sha256") == sha256:
+            return None                       # analysed this exact photo before
+        if "sha256" not in existing and not reanalyze:
+            return None                       # written by the capture side, keep it
+
+    faces = detect_faces(data)
+    meta = {
+        "filename": os.path.basename(photo_path),
+        "analyzed_at": datetime.now().isoformat(timespec="seconds"),
+        "num_faces": len(faces),
+        "has_face": bool(faces),
+        "person": person_label(len(faces)),
+        "faces": faces,
+        "sha256": sha256,
+        "detector": DETECTOR,
+    }
+    write_sidecar(photo_path, meta)
+    ANALYSIS_SECONDS.observe(time.perf_counter() - t0)
+    return meta
+
+
+def _analyze_job(args):
+    photo_path, reanalyze = args
+    try:
+        return analyze(photo_path, reanalyze) is not None
+    except Exception as e:
+        print("Face analysis failed for", photo_path, e)
+        return False
+
+
+def _init_worker():
+    cv2.setNumThreads(1)   # one process per core already
+
+
+class FaceIndexer:
+    # analyses new photos in a background thread (OpenCV releases the GIL)
+    def __init__(self, src_dir=SOURCE_DIR, workers=1):
+        self.src_dir = src_dir
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="faces")
+
+    def on_new_photo(self, kind, name):
+        # photo index listener: only originals get sidecars
+        if kind == "original":
+            self._pool.submit(self._run, os.path.join(self.src_dir, name))
+
+    def _run(self, photo_path):
+        try:
+            meta = analyze(photo_path)
+        except Exception as e:
+            print("Face analysis failed for", photo_path, e)
+            return
+        if meta:
+            print(f"Faces: {meta['person']} in {meta['filename']}")
+
+
+def backfill(src_dir=SOURCE_DIR, workers=None, reanalyze=False, batch_size=BATCH_SIZE):
+    jobs = [(os.path.join(src_dir, f), reanalyze)
+            for f in sorted(os.listdir(src_dir)) if f.endswith(".jpg")]
+    print(f"Checking {len(jobs)} photos...")
+    # archived photos keep their sidecars in photos/; only a missing one is worth reporting
+    unchecked = [name for name in photo_archive.archived_names()
+                 if not os.path.exists(os.path.join(src_dir, photo_archive.sidecar_name(name)))]
+    if unchecked:
+        print(f"{len(unchecked)} archived photos have no sidecar and were not analysed; "
+              f"python photo_archive.py --restore <photo> brings one back")
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        written = sum(pool.map(_analyze_job, jobs, chunksize=batch_size))
+    elapsed = time.perf_counter() - t0
+    print(f"Wrote {written} sidecars in {elapsed:.1f}s "
+          f"({len(jobs) / elapsed if elapsed else 0:.1f} photos/s checked)")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count faces and write photo sidecars")
+    parser.add_argument("--backfill", action="store_true", help="analyse every photo that needs it")
+    parser.add_argument("--reanalyze", action="store_true",
+                        help="also replace sidecars written by the capture side")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="photos per worker task")
+    parser.add_argument("files", nargs="*", help="individual photos to (re)analyse")
+    args = parser.parse_args()
+    if DETECTOR is None:
+        parser.error(f"no face detector: needs opencv-python 4.x or a YuNet model at {YUNET_MODEL}")
+
+    if args.backfill:
+        backfill(workers=args.workers, reanalyze=args.reanalyze, batch_size=args.batch)
+    for path in args.files:
+        print(path, "->", analyze(path, reanalyze=True))
@@ -0,0 +1,204 @@
+# fast_style.py
+# Feed-forward "fast style" backend: a small image-transformation network trained
+# offline against the same VGG loss as style_filter, then applied in one pass.
+#
+#   python fast_style.py train --content-dir photos --steps 4000
+#   python fast_style.py export            # keras -> tflite for CPU inference
+import os
+import glob
+import time
+import argparse
+import numpy as np
+import tensorflow as tf
+
+import style_filter
+
+FAST_MODEL_PATH  = "models/hkust_fast_style.keras"
+FAST_TFLITE_PATH = "models/hkust_fast_style.tflite"
+FAST_MAX_DIM     = 640
+FAST_WIDTH       = 16      # base filter count; 32 matches Johnson et al., 16 is kinder to the CPU
+NUM_THREADS      = os.cpu_count() or 1
+
+# ------------ network ------------
+
+def _conv(x, filters, kernel, strides=1, relu=True):
+    x = tf.keras.layers.Conv2D(filters, kernel, strides=strides, padding="same")(x)
+    x = tf.keras.layers.GroupNormalization(groups=-1)(x)  # instance norm
+    if relu:
+        x = tf.keras.layers.ReLU()(x)
+    return x
+
+def _residual(x, filters):
+    y = _conv(x, filters, 3)
+    y = _conv(y, filters, 3, relu=False)
+    return tf.keras.layers.Add()([x, y])
+
+def _upsample(x, filters):
+    x = tf.keras.layers.UpSampling2D(2, interpolation="nearest")(x)
+    return _conv(x, filters, 3)
+
+def build_transform_net(width=FAST_WIDTH, num_residual=5):
+    inp = tf.keras.Input(shape=(None, None, 3))
+    x = _conv(inp, width, 9)
+    x = _conv(x, width * 2, 3, strides=2)
+    x = _conv(x, width * 4, 3, strides=2)
+    for _ in range(num_residual):
+        x = _residual(x, width * 4)
+    x = _upsample(x, width * 2)
+    x = _upsample(x, width)
+    x = tf.keras.layers.Conv2D(3, 9, padding="same", activation="sigmoid")(x)
+    return tf.keras.Model(inp, x, name="hkust_fast_style")
+
+def _snap_to_multiple(img, multiple=4):
+    # two stride-2 convs + two 2x upsamples: sides must divide by 4 to round-trip
+    h, w = img.shape[1], img.shape[2]
+    h, w = max(multiple, h - h % multiple), max(multiple, w - w % multiple)
+    return tf.image.resize(img, (h, w))
+
+# ------------ training ------------
+
+def _content_dataset(content_dir, image_size, batch_size):
+    files = sorted(glob.glob(os.path.join(content_dir, "*.jpg")))
+    if not files:
+        raise FileNotFoundError(f"no .jpg files in {content_dir}")
+
+    def decode(path):
+        img = tf.image.decode_jpeg(tf.io.read_file(path), channels=3)
+        img = tf.image.convert_image_dtype(img, tf.float32)
+        img = tf.image.resize(img, (image_size, image_size))
+        return tf.image.random_flip_left_right(img)
+
+    ds = tf.data.Dataset.from_tensor_slices(files).shuffle(len(files)).repeat()
+    ds = ds.map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.batch(batch_size, drop_remainder=True).prefetch(tf.data.AUTOTUNE), len(files)
+
+def train(content_dir="photos", style_path=style_filter.STYLE_IMAGE_PATH, steps=4000,
+          batch_size=4, image_size=256, learning_rate=1e-3, out_path=FAST_MODEL_PATH,
+          resume=True):
+    vgg_model = style_filter.get_vgg_model()
+    style_target_features = style_filter.compute_style_targets(vgg_model, style_path)
+    num_style_layers = len(style_filter.STYLE_LAYERS)
+
+    if resume and os.path.exists(out_path):
+        net = tf.keras.models.load_model(out_path)
+        print("Resuming from", out_path)
+    else:
+        net = build_transform_net()
+    optimizer = tf.optimizers.Adam(learning_rate=learning_rate)
+    dataset, num_files = _content_dataset(content_dir, image_size, batch_size)
+    print(f"Training on {num_files} photos, {steps} steps of batch {batch_size}")
+
+    @tf.function
+    def train_step(batch):
+        content_targets = vgg_model(style_filter.vgg_preprocess(batch))[num_style_layers:]
+        with tf.GradientTape() as tape:
+            out = net(batch, training=True)
+            outputs = vgg_model(style_filter.vgg_preprocess(out))
+            loss = style_filter.style_content_loss(
+                outputs, style_target_features, content_targets, out
+            )
+        grads = tape.gradient(loss, net.trainable_variables)
+        optimizer.apply_gradients(zip(grads, net.trainable_variables))
+        return loss
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    t0 = time.perf_counter()
+    for step, batch in enumerate(dataset.take(steps), start=1):
+        loss = train_step(batch)
+        if step % 100 == 0 or step == steps:
+            rate = step / (time.perf_counter() - t0)
+            print(f"step {step}/{steps}  loss {float(loss):.1f}  {rate:.2f} steps/s")
+        if step % 1000 == 0:
+            net.save(out_path)
+    net.save(out_path)
+    print("Saved", out_path)
+    return out_path
+
+def export_tflite(model_path=FAST_MODEL_PATH, tflite_path=FAST_TFLITE_PATH):
+    net = tf.keras.models.load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(net)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]  # int8 weights, float activations
+    with open(tflite_path, "wb") as f:
+        f.write(converter.convert())
+    print("Saved", tflite_path)
+    return tflite_path
+
+# ------------ inference ------------
+
+class FastBackend:
+    name = "fast"
+
+    def __init__(self, model_path=FAST_MODEL_PATH, tflite_path=FAST_TFLITE_PATH):
+        self.interpreter = None
+        self.net = None
+        self._input_shape = None
+        self.model_file = tflite_path if os.path.exists(tflite_path) else model_path
+        if os.path.exists(tflite_path):
+            # XNNPACK-backed TFLite runtime is the fastest CPU path on the board
+            self.interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=NUM_THREADS)
+            self._input_index = self.interpreter.get_input_details()[0]["index"]
+            self._output_index = self.interpreter.get_output_details()[0]["index"]
+        elif os.path.exists(model_path):
+            self.net = tf.keras.models.load_model(model_path)
+            self._predict_fn = tf.function(lambda x: self.net(x, training=False))
+        else:
+            raise FileNotFoundError(
+                f"no fast style model at {tflite_path} or {model_path}; run `python fast_style.py train`"
+            )
+
+    def refresh(self):
+        pass  # the style is baked into the trained weights
+
+    def cache_params(self, profile=None):
+        return {"backend": self.name, "files": [self.model_file], "max_dim": FAST_MAX_DIM}
+
+    def _predict(self, img):
+        if self.net is not None:
+            return self._predict_fn(img).numpy()
+        shape = tuple(img.shape)
+        if shape != self._input_shape:
+            self.interpreter.resize_tensor_input(self._input_index, shape)
+            self.interpreter.allocate_tensors()
+            self._input_shape = shape
+        self.interpreter.set_tensor(self._input_index, np.asarray(img, dtype=np.float32))
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output_index)
+
+    def stylize(self, content_path, output_path, report=None, progress=None,
+                max_dim=FAST_MAX_DIM, **kwargs):
+        t0 = time.perf_counter()
+        img = _snap_to_multiple(style_filter.load_img(content_path, max_dim=max_dim))
+        out = self._predict(img)
+        if progress is not None:
+            progress(1, 1)
+        seconds = round(time.perf_counter() - t0, 3)
+        print(f"Fast style run: {img.shape[2]}x{img.shape[1]} in {seconds}s")
+        if report is not None:
+            report.update({"backend": self.name, "total_seconds": seconds, "total_steps": 1})
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        style_filter.tensor_to_image(np.clip(out, 0.0, 1.0)).save(output_path)
+        return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train / export the fast HKUST style network")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_train = sub.add_parser("train")
+    p_train.add_argument("--content-dir", default="photos")
+    p_train.add_argument("--style", default=style_filter.STYLE_IMAGE_PATH)
+    p_train.add_argument("--steps", type=int, default=4000)
+    p_train.add_argument("--batch-size", type=int, default=4)
+    p_train.add_argument("--image-size", type=int, default=256)
+    p_train.add_argument("--lr", type=float, default=1e-3)
+    p_train.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+
+    sub.add_parser("export")
+
+    args = parser.parse_args()
+    if args.command == "train":
+        train(args.content_dir, args.style, args.steps, args.batch_size,
+              args.image_size, args.lr, resume=not args.fresh)
+        export_tflite()
+    elif args.command == "export":
+        export_tflite()
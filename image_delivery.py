@@ -0,0 +1,153 @@
+# image_delivery.py
+# Serving booth images so repeat views cost a 304 or nothing at all.
+#
+# Photo filenames are timestamped and never rewritten, so every original carries a
+# content-hash ETag and "Cache-Control: immutable": the browser reuses its copy across
+# /preview, /filters, /compare, /finalize and /qr without asking again, and a reload
+# gets a 304. Derivatives (B&W, vintage, style and their variants) can be rewritten
+# under the same name by a backfill, so they are sent with immutable=False: "no-cache",
+# and the browser revalidates with the ETag, which costs a 304. Range and If-None-Match requests are handled by Werkzeug. Recently
+# served files are kept in a small in-memory LRU, so the latest photo that every page
+# shows is read from disk once. Images moved into pack files (photo_archive.py) are
+# served the same way through a fallback, keeping the ETag they had as files.
+import os
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+
+from flask import Response, request, send_file
+from werkzeug.security import safe_join
+
+import metrics
+
+MEMORY_CACHE_BYTES = int(os.environ.get("PHOTOBOOTH_IMAGE_CACHE_MB", "64")) * 1024 * 1024
+MAX_CACHED_FILE = 8 * 1024 * 1024     # larger files are streamed from disk
+MAX_AGE = 365 * 24 * 3600
+ETAG_ENTRIES = 20000                  # remembered hashes, for files not kept in memory
+
+LOOKUPS = metrics.counter("image_cache_lookups_total",
+                          "Image responses by source (memory, disk, archive)", ["source"])
+
+
+def content_etag(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageServer:
+    def __init__(self, max_bytes=MEMORY_CACHE_BYTES, max_file=MAX_CACHED_FILE, max_age=MAX_AGE):
+        self.max_bytes = max_bytes
+        self.max_file = max_file
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._files = OrderedDict()    # path -> (mtime_ns, size, etag, data), LRU first
+        self._bytes = 0
+        self._etags = OrderedDict()    # path -> (mtime_ns, size, etag)
+
+    def send(self, directory, filename, fallback=None, immutable=True):
+        # fallback(): file object with .size, .mtime and .etag for a file that isn't on
+        # disk (an archived image, photo_archive.MemberFile), or None
+        path = safe_join(directory, filename)
+        if path is None:
+            return Response("Not found", 404)
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            member = fallback() if fallback else None
+            if member is None:
+                return Response("Not found", 404)
+            return self._send_member(path, filename, member, immutable)
+        version = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._files.get(path)
+            if entry and entry[:2] == version:
+                self._files.move_to_end(path)
+            else:
+                entry = None
+
+        if entry is None:
+            etag = self._etag(path, version)
+            if st.st_size > self.max_file:
+                LOOKUPS.inc(source="disk")
+                response = send_file(path, etag=etag, conditional=True, max_age=self.max_age,
+                                     last_modified=st.st_mtime)
+                return self._cache_headers(response, immutable)
+            with open(path, "rb") as f:
+                data = f.read()
+            entry = (*version, etag, data)
+            self._remember(path, entry)
+            LOOKUPS.inc(source="disk")
+        else:
+            LOOKUPS.inc(source="memory")
+        return self._respond(filename, entry, st.st_mtime, immutable)
+
+    def _send_member(self, path, filename, member, immutable):
+        with member:
+            version = (int(member.mtime * 1e9), member.size)
+            with self._lock:
+                entry = self._files.get(path)
+                if entry and entry[:2] == version:
+                    self._files.move_to_end(path)
+                else:
+                    entry = None
+            if entry is None:
+                entry = (*version, member.etag, member.read())
+                if member.size <= self.max_file:
+                    self._remember(path, entry)
+                LOOKUPS.inc(source="archive")
+            else:
+                LOOKUPS.inc(source="memory")
+        return self._respond(filename, entry, member.mtime, immutable)
+
+    def _respond(self, filename, entry, mtime, immutable):
+        _, size, etag, data = entry
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = mtime
+        response = response.make_conditional(request, accept_ranges=True, complete_length=size)
+        return self._cache_headers(response, immutable)
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def _cache_headers(self, response, immutable=True):
+        response.cache_control.public = True
+        if immutable:
+            response.cache_control.max_age = self.max_age
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+            response.cache_control.max_age = None
+        return response
+
+    def _etag(self, path, version):
+        with self._lock:
+            known = self._etags.get(path)
+            if known and known[:2] == version:
+                self._etags.move_to_end(path)
+                return known[2]
+        etag = content_etag(path)
+        with self._lock:
+            self._etags[path] = (*version, etag)
+            while len(self._etags) > ETAG_ENTRIES:
+                self._etags.popitem(last=False)
+        return etag
+
+    def _remember(self, path, entry):
+        size = len(entry[3])
+        with self._lock:
+            old = self._files.pop(path, None)
+            if old:
+                self._bytes -= len(old[3])
+            self._files[path] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._files:
+                _, evicted = self._files.popitem(last=False)
+                self._bytes -= len(evicted[3])
@@ -0,0 +1,221 @@
+# image_filters.py
+# B&W and vintage filters in NumPy, run in-process as soon as a photo arrives.
+#
+# Every filter works on the whole uint8 image at once: integer luma, then 256-entry
+# lookup tables (colour matrices and tone curves folded into one table), so a photo
+# is ready a few hundred ms after it arrives instead of after a round trip through
+# the RDK scripts + rsync. New filters are one register_filter() call.
+#
+#   python image_filters.py --backfill              # fill photos_bw/ + photos_vintage/
+#   python image_filters.py --backfill --filters bw
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+
+import metrics
+import photo_archive
+
+SOURCE_DIR = "photos"
+JPEG_QUALITY = 92
+INGEST_FILTERS = ("bw", "vintage")   # run automatically on every new photo
+
+FILTERS = {}   # name -> {"fn", "out_dir", "suffix"}
+
+FILTER_SECONDS = metrics.histogram("filter_ingest_seconds",
+                                   "Decode + filter + encode time for one new photo")
+FILTER_FAILURES = metrics.counter("filter_failures_total", "New photos the filters failed on")
+
+
+def register_filter(name, fn, out_dir, suffix=None):
+    # fn(rgb uint8 HxWx3) -> uint8 HxW or HxWx3
+    FILTERS[name] = {"fn": fn, "out_dir": out_dir, "suffix": suffix or f"_{name}"}
+
+
+def output_name(name, base_name):
+    root, _ = os.path.splitext(base_name)
+    return f"{root}{FILTERS[name]['suffix']}.jpg"
+
+
+# ------------ building blocks ------------
+
+def curve_lut(points):
+    # piecewise-linear tone curve through (in, out) points -> uint8[256]
+    xs, ys = zip(*points)
+    return np.clip(np.interp(np.arange(256), xs, ys), 0, 255).astype(np.uint8)
+
+
+def luma(rgb):
+    # integer Rec.601 luma (weights / 256), no float temporaries
+    r = rgb[..., 0].astype(np.uint16)
+    g = rgb[..., 1].astype(np.uint16)
+    b = rgb[..., 2].astype(np.uint16)
+    return ((77 * r + 150 * g + 29 * b) >> 8).astype(np.uint8)
+
+
+_vignette_cache = {}
+_vignette_lock = threading.Lock()
+
+
+def vignette_mask(shape, strength=0.35):
+    # radial falloff in 1/256 units, cached per image size (the camera always
+    # shoots the same size)
+    key = (shape[0], shape[1], strength)
+    with _vignette_lock:
+        mask = _vignette_cache.get(key)
+        if mask is None:
+            h, w = shape[:2]
+            y = np.linspace(-1.0, 1.0, h, dtype=np.float32)[:, None]
+            x = np.linspace(-1.0, 1.0, w, dtype=np.float32)[None, :]
+            r2 = (x * x + y * y) / 2.0
+            mask = np.round((1.0 - strength * r2) * 256).astype(np.uint16)
+            _vignette_cache[key] = mask
+    return mask
+
+
+def tone_lut(matrix, channel_curves):
+    # Fold a colour matrix and per-channel curves into one (256, 3) table indexed by
+    # luma. Exact for matrices whose rows are multiples of the luma weights, which
+    # tinting matrices like sepia are to within a couple of percent.
+    gains = np.asarray(matrix, dtype=np.float32).sum(axis=1)
+    y = np.arange(256, dtype=np.float32)
+    lut = np.empty((256, 3), dtype=np.uint8)
+    for c in range(3):
+        tinted = np.clip(np.round(y * gains[c]), 0, 255).astype(np.uint8)
+        lut[:, c] = channel_curves[c][tinted]
+    return lut
+
+
+# ------------ filters ------------
+
+BW_CONTRAST = curve_lut([(0, 0), (40, 28), (128, 128), (215, 228), (255, 255)])
+
+
+def bw_filter(rgb):
+    # luma, then a gentle S-curve
+    return np.take(BW_CONTRAST, luma(rgb))
+
+
+SEPIA_MATRIX = [
+    [0.393, 0.769, 0.189],
+    [0.349, 0.686, 0.168],
+    [0.272, 0.534, 0.131],
+]
+# faded blacks and slightly warm highlights
+VINTAGE_CURVES = (
+    curve_lut([(0, 28), (128, 138), (255, 250)]),
+    curve_lut([(0, 22), (128, 126), (255, 238)]),
+    curve_lut([(0, 30), (128, 112), (255, 215)]),
+)
+VINTAGE_LUT = tone_lut(SEPIA_MATRIX, VINTAGE_CURVES)
+
+
+def vintage_filter(rgb):
+    y = luma(rgb)
+    y = ((y * vignette_mask(y.shape)) >> 8).astype(np.uint8)
+    return np.take(VINTAGE_LUT, y, axis=0)
+
+
+register_filter("bw", bw_filter, "photos_bw")
+register_filter("vintage", vintage_filter, "photos_vintage")
+
+
+# ------------ running ------------
+
+def load_rgb(path):
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def save_jpeg(arr, dst_path):
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    Image.fromarray(arr).save(tmp_path, "JPEG", quality=JPEG_QUALITY)
+    os.replace(tmp_path, dst_path)  # readers never see a half-written file
+
+
+def apply_filters(src_path, names=INGEST_FILTERS, overwrite=False):
+    # decode once, run every requested filter; returns {name: output path}
+    base_name = os.path.basename(src_path)
+    todo = {}
+    for name in names:
+        dst_path = os.path.join(FILTERS[name]["out_dir"], output_name(name, base_name))
+        if overwrite or not os.path.exists(dst_path):
+            todo[name] = dst_path
+    if not todo:
+        return {}
+
+    rgb = load_rgb(src_path)
+    for name, dst_path in todo.items():
+        save_jpeg(FILTERS[name]["fn"](rgb), dst_path)
+    return todo
+
+
+def _apply_job(args):
+    src_path, names = args
+    try:
+        return len(apply_filters(src_path, names))
+    except Exception as e:
+        print("Filter failed for", src_path, e)
+        return 0
+
+
+class FilterEngine:
+    # runs INGEST_FILTERS on new photos in a small thread pool (NumPy and Pillow
+    # release the GIL for the heavy parts)
+    def __init__(self, names=INGEST_FILTERS, workers=2):
+        self.names = names
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="filters")
+
+    def on_new_photo(self, kind, name):
+        # photo index listener: only originals are filtered
+        if kind == "original":
+            self._pool.submit(self._run, os.path.join(SOURCE_DIR, name))
+
+    def _run(self, src_path):
+        t0 = time.perf_counter()
+        try:
+            written = apply_filters(src_path, self.names)
+        except Exception as e:
+            FILTER_FAILURES.inc()
+            print("Filter failed for", src_path, e)
+            return
+        if written:
+            FILTER_SECONDS.observe(time.perf_counter() - t0)
+            print(f"Filters {', '.join(written)} for {os.path.basename(src_path)} "
+                  f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+def backfill(names=INGEST_FILTERS, src_dir=SOURCE_DIR, workers=None):
+    jobs = [
+        (os.path.join(src_dir, f), names)
+        for f in sorted(os.listdir(src_dir)) if f.endswith(".jpg")
+    ]
+    print(f"Filtering {len(jobs)} photos with {', '.join(names)}...")
+    skipped = len(photo_archive.archived_names())
+    if skipped:
+        # archived with whatever versions they had; restoring one makes it a working photo again
+        print(f"{skipped} archived photos not checked; "
+              f"python photo_archive.py --restore <photo> brings one back")
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        written = sum(pool.map(_apply_job, jobs, chunksize=8))
+    print(f"Wrote {written} images in {time.perf_counter() - t0:.1f}s")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply B&W / vintage filters to booth photos")
+    parser.add_argument("--backfill", action="store_true", help="filter every photo missing an output")
+    parser.add_argument("--filters", nargs="+", default=list(INGEST_FILTERS), choices=sorted(FILTERS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("files", nargs="*", help="individual photos to (re)filter")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill(tuple(args.filters), workers=args.workers)
+    for path in args.files:
+        print(path, "->", apply_filters(path, args.filters, overwrite=True))
@@ -0,0 +1,195 @@
+# ingest.py
+# Push-based photo ingest: the capture side PUTs each new file as soon as it is
+# written (see rdk_uploader.py) instead of the server waiting for the next rsync pass.
+#
+# Files are streamed to a temp file while hashing, checked against the sender's
+# SHA-256, de-duplicated by content, renamed into place atomically, and then anyone
+# waiting for a new photo (e.g. /preview) is woken up.
+#
+# Each upload can name the booth it came from (X-Booth-Id), so several kiosks can
+# share one server and each /preview waits for its own booth's newest photo.
+import os
+import time
+import hashlib
+import threading
+
+from session_store import open_db
+
+CHUNK_SIZE = 64 * 1024
+UPLOADER_TIMEOUT = 60    # an uploader not heard from for this long (no upload, no ping) is offline
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested (
+    kind     TEXT NOT NULL,
+    sha256   TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    ts       REAL NOT NULL,
+    booth    TEXT,
+    PRIMARY KEY (kind, sha256)
+);
+"""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestError(ValueError):
+    pass
+
+
+class IngestConflict(IngestError):
+    # the name is taken by a file with different content
+    pass
+
+
+class Ingestor:
+    def __init__(self, kind_dirs, db_path, on_arrival=None):
+        self.kind_dirs = kind_dirs
+        self.db_path = db_path
+        self.on_arrival = on_arrival     # on_arrival(kind, filename) after the rename
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._arrivals = 0
+        self._latest = {}   # booth -> newest photo name, filled from the table on first use
+        self._contact = {}  # booth -> time of its uploader's last upload or ping
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(ingested)")]
+        if "booth" not in columns:   # booth.db from before multi-booth support
+            with conn:
+                conn.execute("ALTER TABLE ingested ADD COLUMN booth TEXT")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = open_db(self.db_path)
+        return conn
+
+    # ---- receiving ----
+
+    def receive(self, kind, filename, stream, expected_sha256=None, booth=None):
+        self._check_name(kind, filename)
+        self.contact(booth)
+        target_dir = self.kind_dirs[kind]
+        os.makedirs(target_dir, exist_ok=True)
+        final_path = os.path.join(target_dir, filename)
+        tmp_path = os.path.join(target_dir, f".{filename}.{threading.get_ident()}.part")
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != sha256:
+                raise IngestError(f"hash mismatch for {filename}")
+            if size == 0:
+                raise IngestError(f"empty upload for {filename}")
+
+            existing = self._conn().execute(
+                "SELECT filename FROM ingested WHERE kind = ? AND sha256 = ?", (kind, sha256)
+            ).fetchone()
+            if existing and os.path.exists(os.path.join(target_dir, existing[0])):
+                return {"status": "duplicate", "filename": existing[0], "sha256": sha256}
+            if os.path.exists(final_path):
+                # e.g. copied in by sync_rdk.sh: fine if it is the same photo, but a
+                # different one under a name the guests may already have is never replaced
+                if file_sha256(final_path) != sha256:
+                    raise IngestConflict(f"{filename} already exists with different content")
+                self._record(kind, sha256, filename, booth)
+                return {"status": "duplicate", "filename": filename, "sha256": sha256}
+
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._record(kind, sha256, filename, booth)
+        if self.on_arrival:
+            self.on_arrival(kind, filename)
+        with self._cond:
+            if booth and kind == "original" and filename.endswith(".jpg"):
+                if filename > self._latest.get(booth, ""):
+                    self._latest[booth] = filename
+            self._arrivals += 1
+            self._cond.notify_all()
+        return {"status": "created", "filename": filename, "sha256": sha256, "bytes": size}
+
+    def _record(self, kind, sha256, filename, booth):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingested (kind, sha256, filename, ts, booth) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, sha256, filename, time.time(), booth),
+            )
+
+    def _check_name(self, kind, filename):
+        if kind not in self.kind_dirs:
+            raise IngestError(f"unknown kind: {kind}")
+        if os.path.basename(filename) != filename or filename.startswith("."):
+            raise IngestError(f"bad filename: {filename}")
+        if not (filename.endswith(".jpg") or (kind == "original" and filename.endswith(".json"))):
+            raise IngestError(f"unsupported file type: {filename}")
+
+    # ---- per-booth lookups ----
+
+    def latest(self, booth):
+        # newest photo uploaded by this booth (names are timestamps), or None
+        with self._cond:
+            if booth in self._latest:
+                return self._latest[booth]
+        row = self._conn().execute(
+            "SELECT MAX(filename) FROM ingested "
+            "WHERE kind = 'original' AND booth = ? AND filename LIKE '%.jpg'",
+            (booth,),
+        ).fetchone()
+        with self._cond:
+            if row[0] and row[0] > self._latest.get(booth, ""):
+                self._latest[booth] = row[0]
+            return self._latest.get(booth)
+
+    # ---- uploader liveness ----
+
+    def contact(self, booth=None):
+        # an upload or a ping (rdk_uploader.py sends one while idle)
+        with self._cond:
+            self._contact[booth] = time.time()
+
+    def uploader_online(self, booth=None):
+        # is a capture press at this booth going to be pushed? None: any uploader
+        with self._cond:
+            times = [self._contact.get(booth, 0)] if booth else list(self._contact.values())
+        return any(time.time() - t < UPLOADER_TIMEOUT for t in times)
+
+    # ---- waiting ----
+
+    def wait_for_newer(self, after, latest_fn, timeout):
+        # newest photo name sorting after `after`, or None on timeout
+        return self.wait_for(lambda latest: not after or latest > after, latest_fn, timeout)
+
+    def wait_for(self, accept, latest_fn, timeout):
+        # latest_fn() once accept() takes it, or None on timeout. Also notices photos
+        # that arrive some other way (rsync) by re-checking latest_fn.
+        deadline = time.monotonic() + timeout
+        while True:
+            seen = self._arrivals
+            latest = latest_fn()
+            if latest and accept(latest):
+                return latest
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._cond:
+                if self._arrivals == seen:
+                    self._cond.wait(min(remaining, 0.5))
@@ -0,0 +1,128 @@
+# job_status.py
+# In-memory status board for background jobs (style transfer), with blocking reads
+# for long-poll and Server-Sent Events. Reading status never touches the disk and
+# never starts work; persistence to a JSON file is optional and only happens when a
+# job changes state, not on every progress tick.
+import os
+import json
+import time
+import threading
+
+TERMINAL_STATES = ("done", "error", "dropped")
+MAX_JOBS = 200            # oldest finished jobs are forgotten past this
+HEARTBEAT_SECONDS = 15    # SSE comment to keep proxies / phones from closing the stream
+
+
+class JobStatusBoard:
+    def __init__(self, persist_path=None):
+        self.persist_path = persist_path
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._version = 0
+        self._load()
+
+    # ---- writes ----
+
+    def update(self, job_id, **fields):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = {"job_id": job_id, "state": "idle", "created": time.time()}
+                self._trim()
+            state_changed = fields.get("state", job["state"]) != job["state"]
+            job.update(fields)
+            self._version += 1
+            job["version"] = self._version
+            job["ts"] = time.time()
+            snapshot = dict(job)
+            self._cond.notify_all()
+        if state_changed:
+            self._persist()
+        return snapshot
+
+    # ---- reads ----
+
+    def get(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def latest(self):
+        with self._cond:
+            if not self._jobs:
+                return None
+            return dict(max(self._jobs.values(), key=lambda j: j["version"]))
+
+    def wait(self, job_id, since_version=0, timeout=25.0):
+        # long-poll: block until the job moves past since_version (or timeout)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job and (job["version"] > since_version or job["state"] in TERMINAL_STATES):
+                    return dict(job)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return dict(job) if job else None
+                self._cond.wait(remaining)
+
+    def events(self, job_id, decorate=None, max_seconds=600):
+        # SSE generator: one "status" event per change, ends after a terminal state.
+        # A job that isn't on the board (never submitted, trimmed, lost in a restart)
+        # gets one "missing" event, so the stream doesn't hold a request thread open
+        since = 0
+        started = time.monotonic()
+        while time.monotonic() - started < max_seconds:
+            job = self.wait(job_id, since, timeout=HEARTBEAT_SECONDS if since else 0)
+            if job is None:
+                yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'state': 'missing'})}\n\n"
+                return
+            if job["version"] <= since:
+                yield ": keep-alive\n\n"
+                continue
+            since = job["version"]
+            if decorate:
+                job = decorate(job)
+            yield f"event: status\nid: {since}\ndata: {json.dumps(job)}\n\n"
+            if job["state"] in TERMINAL_STATES:
+                return
+
+    # ---- persistence ----
+
+    def _trim(self):
+        if len(self._jobs) <= MAX_JOBS:
+            return
+        finished = sorted(
+            (j for j in self._jobs.values() if j["state"] in TERMINAL_STATES),
+            key=lambda j: j["version"],
+        )
+        for job in finished[:len(self._jobs) - MAX_JOBS]:
+            del self._jobs[job["job_id"]]
+
+    def _persist(self):
+        if not self.persist_path:
+            return
+        with self._cond:
+            data = {"jobs": list(self._jobs.values())}
+        tmp_path = self.persist_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            print(f"Failed to save job status: {e}")
+
+    def _load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        for job in data.get("jobs", []):
+            if job.get("state") not in TERMINAL_STATES:
+                # the worker that owned it died with the old process
+                job["state"], job["phase"] = "error", "interrupted"
+            self._version = max(self._version, job.get("version", 0))
+            self._jobs[job["job_id"]] = job
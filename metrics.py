@@ -0,0 +1,249 @@
+# metrics.py
+# Process-wide counters, gauges and latency histograms, served in the Prometheus
+# text format on /metrics.
+#
+# Recording is a dict lookup and an add under a per-metric lock, so it stays on in
+# production. Modules declare their metrics once at import time:
+#
+#   SCANS = metrics.counter("photo_index_scans_total", "Folder rescans", ["kind"])
+#   SCANS.inc(kind="original")
+#
+# Gauges can also be sampled at scrape time from a callback (queue depths etc.).
+import time
+import bisect
+import threading
+
+# seconds; covers a cached page (ms) up to a quality style job (minutes)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+REGISTRY = {}   # name -> metric, in registration order
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {sorted(labels)}")
+        return tuple(labels[n] for n in self.label_names)
+
+    def samples(self):
+        # [(suffix, label values, extra label, value)]
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_label_text(self.label_names, key, extra)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        super().__init__(name, help_text, labels)
+        # fn() -> number, or {label values tuple: number} for labelled gauges
+        self.fn = fn
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is None:
+            return super().samples()
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Metric {self.name} callback failed:", e)
+            return []
+        if isinstance(value, dict):
+            return [("", key if isinstance(key, tuple) else (key,), None, v)
+                    for key, v in value.items()]
+        return [("", (), None, value)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket (not cumulative) counts, sum, count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def totals(self):
+        # label values -> (count, sum), for summaries
+        with self._lock:
+            return {key: (entry[2], entry[1]) for key, entry in self._values.items()}
+
+    def samples(self):
+        out = []
+        with self._lock:
+            entries = [(key, list(e[0]), e[1], e[2]) for key, e in self._values.items()]
+        for key, counts, total, count in entries:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                out.append(("_bucket", key, f'le="{_number(bound)}"', running))
+            out.append(("_sum", key, None, total))
+            out.append(("_count", key, None, count))
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0, **self.labels)
+
+
+def _register(cls, name, *args, **kwargs):
+    with _registry_lock:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            metric = REGISTRY[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"metric {name} already registered as {metric.kind}")
+        return metric
+
+
+def counter(name, help_text, labels=()):
+    return _register(Counter, name, help_text, labels)
+
+
+def gauge(name, help_text, labels=(), fn=None):
+    metric = _register(Gauge, name, help_text, labels)
+    if fn is not None:
+        metric.fn = fn
+    return metric
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, help_text, labels, buckets)
+
+
+def render():
+    with _registry_lock:
+        metrics = list(REGISTRY.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------ periodic log summary ------------
+
+def _snapshot():
+    snap = {}
+    with _registry_lock:
+        metrics = list(REGISTRY.values())
+    for metric in metrics:
+        if isinstance(metric, Histogram):
+            for key, (count, total) in metric.totals().items():
+                snap[(metric.name, key)] = (count, total)
+        elif isinstance(metric, Counter):
+            for _, key, _, value in metric.samples():
+                snap[(metric.name, key)] = (value, None)
+    return snap
+
+
+def summary_line(before, after, top=6):
+    # what changed between two snapshots, busiest first
+    changes = []
+    for (name, key), (value, total) in after.items():
+        old_value, old_total = before.get((name, key), (0, 0.0))
+        delta = value - old_value
+        if delta <= 0:
+            continue
+        label = name + (f"[{','.join(map(str, key))}]" if key else "")
+        if total is not None:
+            mean_ms = (total - (old_total or 0.0)) / delta * 1000.0
+            changes.append((delta, f"{label} n={delta} avg={mean_ms:.0f}ms"))
+        else:
+            changes.append((delta, f"{label} +{delta}"))
+    changes.sort(key=lambda c: -c[0])
+    parts = [text for _, text in changes[:top]]
+    if len(changes) > top:
+        parts.append(f"... {len(changes) - top} more")
+    return "; ".join(parts) if parts else "idle"
+
+
+def start_log_summary(interval):
+    # print one line every `interval` seconds with what happened since the last one
+    def loop():
+        before = _snapshot()
+        while True:
+            time.sleep(interval)
+            after = _snapshot()
+            print(f"[metrics {interval:.0f}s] {summary_line(before, after)}")
+            before = after
+
+    thread = threading.Thread(target=loop, name="metrics-log", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,631 @@
+# photo_archive.py
+# Pack-file archive for old photos, so the working folders stay small.
+#
+# A photo that hasn't been taken or viewed for ARCHIVE_AFTER, or that falls outside the
+# KEEP_RECENT most recently used, is moved together with its _bw / _vintage / _style
+# versions into an append-only pack file under photos_archive/. The `archive` table in
+# booth.db records where each image starts in which pack; serving one is a single
+# seek-and-read (os.pread), so the /photos*, /thumbs and /bundle routes keep working for
+# archived photos, with the same ETag they had as files. Sidecars stay in photos/: they
+# are small and keep archived photos in the gallery groups.
+#
+# Ages use the server's clock: the `working` table records when a sweep first saw each
+# photo and its last view. File mtimes can't be used, rsync -a keeps the RDK's clock.
+#
+# Each record in a pack is a header (magic, kind, name, size, mtime) followed by the
+# JPEG bytes, so the index can be rebuilt from the packs alone (--reindex). Records are
+# fsync'ed and indexed before the working files are removed.
+#
+# Retention: with PHOTOBOOTH_ARCHIVE_MB or PHOTOBOOTH_ARCHIVE_RETENTION_DAYS set, the
+# least recently viewed archived photos are dropped first and packs that are mostly
+# dead space are rewritten. Both are off by default: every event photo stays. A dropped
+# photo loses its sidecar too (so it leaves the gallery) and its names stay in the
+# `dropped` table, so --list keeps sync_rdk.sh from copying it back.
+#
+#   python photo_archive.py --sweep         # archive now with the configured policy
+#   python photo_archive.py --stats
+#   python photo_archive.py --restore 20250101_120000_001.jpg
+#   python photo_archive.py --reindex       # rebuild the index from the pack files
+#   python photo_archive.py --list          # archived and dropped file names (sync_rdk.sh excludes them)
+import io
+import os
+import sys
+import time
+import fcntl
+import struct
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+from session_store import open_db
+from photo_index import DERIVATIVE_SUFFIX
+import metrics
+
+ARCHIVE_DIR = "photos_archive"
+DEFAULT_DB = "booth.db"
+PACK_MAX_BYTES = 256 * 1024 * 1024
+# hours since a photo was taken or last viewed; 0 = no age limit
+ARCHIVE_AFTER = float(os.environ.get("PHOTOBOOTH_ARCHIVE_AFTER_HOURS", "12")) * 3600
+# photos kept in the working folders; 0 = no count limit
+KEEP_RECENT = int(os.environ.get("PHOTOBOOTH_KEEP_RECENT", "500"))
+# never archived younger than this: the guest may still be in the flow or waiting on style
+MIN_AGE = 3600
+# archive quota and retention; 0 = keep every photo
+ARCHIVE_MAX_BYTES = int(os.environ.get("PHOTOBOOTH_ARCHIVE_MB", "0")) * 1024 * 1024
+RETENTION = float(os.environ.get("PHOTOBOOTH_ARCHIVE_RETENTION_DAYS", "0")) * 86400
+SWEEP_SECONDS = 10 * 60
+COMPACT_BELOW = 0.5        # rewrite a full pack once less than half of it is still indexed
+CHUNK_SIZE = 1024 * 1024
+
+RECORD = struct.Struct("<4sHHQd")   # magic, len(kind), len(name), size, mtime
+MAGIC = b"PBA1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive (
+    kind        TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    photo       TEXT NOT NULL,
+    pack        TEXT NOT NULL,
+    offset      INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime       REAL NOT NULL,
+    etag        TEXT NOT NULL,
+    archived_at REAL NOT NULL,
+    last_viewed REAL NOT NULL,
+    PRIMARY KEY (kind, name)
+);
+CREATE INDEX IF NOT EXISTS archive_photo ON archive(photo);
+CREATE INDEX IF NOT EXISTS archive_pack ON archive(pack);
+CREATE TABLE IF NOT EXISTS working (
+    photo       TEXT PRIMARY KEY,
+    arrived     REAL NOT NULL,
+    last_viewed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dropped (
+    name       TEXT PRIMARY KEY,
+    photo      TEXT NOT NULL,
+    dropped_at REAL NOT NULL,
+    reason     TEXT NOT NULL
+);
+"""
+
+ARCHIVED = metrics.counter("photo_archive_photos_total", "Photos moved into pack files")
+READS = metrics.counter("photo_archive_reads_total", "Images opened from pack files", ["kind"])
+DROPPED = metrics.counter("photo_archive_dropped_total",
+                          "Archived photos dropped by retention or quota", ["reason"])
+
+
+def photo_of(kind, name):
+    # the original a derivative was made from ("x_bw.jpg" -> "x.jpg")
+    root, ext = os.path.splitext(name)
+    suffix = DERIVATIVE_SUFFIX.get(kind)
+    if suffix and root.endswith(suffix):
+        root = root[:-len(suffix)]
+    return root + ext
+
+
+def derivative_name(kind, base_name):
+    root, ext = os.path.splitext(base_name)
+    return root + DERIVATIVE_SUFFIX[kind] + ext
+
+
+def sidecar_name(base_name):
+    return os.path.splitext(base_name)[0] + ".json"
+
+
+def archived_names(kind="original", db_path=DEFAULT_DB):
+    # names in the pack files, for backfills that only list the working folders;
+    # empty when there is no archive (never creates booth.db)
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        return [row[0] for row in conn.execute(
+            "SELECT name FROM archive WHERE kind = ? ORDER BY name", (kind,))]
+    except sqlite3.OperationalError:    # booth.db from before the archive
+        return []
+    finally:
+        conn.close()
+
+
+class MemberFile(io.RawIOBase):
+    # read-only, seekable view of one image inside a pack, read with os.pread
+    def __init__(self, path, offset, size, mtime, etag):
+        super().__init__()
+        self._fd = os.open(path, os.O_RDONLY)
+        self._offset = offset
+        self._pos = 0
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buf):
+        n = min(len(buf), self.size - self._pos)
+        if n <= 0:
+            return 0
+        data = os.pread(self._fd, n, self._offset + self._pos)
+        buf[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self.size
+        self._pos = max(0, pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            os.close(self._fd)
+        super().close()
+
+
+class PhotoArchive:
+    def __init__(self, kind_dirs, db_path, archive_dir=ARCHIVE_DIR, archive_after=ARCHIVE_AFTER,
+                 keep_recent=KEEP_RECENT, max_bytes=ARCHIVE_MAX_BYTES, retention=RETENTION):
+        # kind_dirs: kind -> working directory, as for PhotoIndex
+        self.kind_dirs = kind_dirs
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.archive_after = archive_after
+        self.keep_recent = keep_recent
+        self.max_bytes = max_bytes
+        self.retention = retention
+        self._local = threading.local()
+        self._lock = threading.Lock()    # one writer per process; flock across processes
+        self._views = {}                 # photo -> last view, written to booth.db by sweep()
+        self._thread = None
+        os.makedirs(archive_dir, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = open_db(self.db_path)
+        return conn
+
+    # ---- lookups ----
+
+    def contains(self, kind, name):
+        return self._find(kind, name) is not None
+
+    def members(self, base_name):
+        # kind -> name of every archived version of a photo, the original included
+        rows = self._conn().execute(
+            "SELECT kind, name FROM archive WHERE photo = ?", (base_name,)
+        ).fetchall()
+        return dict(rows)
+
+    def open(self, kind, name):
+        # MemberFile for an archived image, or None
+        for _ in range(2):   # a compaction may have just moved it to another pack
+            row = self._find(kind, name)
+            if row is None:
+                return None
+            pack, offset, size, mtime, etag = row
+            try:
+                member = MemberFile(os.path.join(self.archive_dir, pack), offset, size, mtime, etag)
+            except FileNotFoundError:
+                continue
+            READS.inc(kind=kind)
+            return member
+        return None
+
+    def touch(self, kind, name):
+        # called once an image was served (so it exists); keeps recently viewed photos
+        # out of the archive and archived ones out of retention
+        self._views[photo_of(kind, name)] = time.time()
+
+    def names(self):
+        # every archived or dropped file name, all kinds: none may be copied back
+        return [row[0] for row in self._conn().execute(
+            "SELECT name FROM archive UNION SELECT name FROM dropped ORDER BY name")]
+
+    def archived(self, kind):
+        return [row[0] for row in self._conn().execute(
+            "SELECT name FROM archive WHERE kind = ? ORDER BY name", (kind,))]
+
+    def stats(self):
+        conn = self._conn()
+        photos, members, live = conn.execute(
+            "SELECT COUNT(DISTINCT photo), COUNT(*), COALESCE(SUM(size), 0) FROM archive"
+        ).fetchone()
+        dropped = conn.execute("SELECT COUNT(DISTINCT photo) FROM dropped").fetchone()[0]
+        packs = self._packs()
+        return {
+            "photos": photos,
+            "images": members,
+            "dropped_photos": dropped,
+            "live_bytes": live,
+            "pack_bytes": sum(self._pack_size(p) for p in packs),
+            "packs": len(packs),
+            "archive_after_hours": self.archive_after / 3600,
+            "keep_recent": self.keep_recent,
+            "max_bytes": self.max_bytes,
+            "retention_days": self.retention / 86400,
+        }
+
+    def _find(self, kind, name):
+        return self._conn().execute(
+            "SELECT pack, offset, size, mtime, etag FROM archive WHERE kind = ? AND name = ?",
+            (kind, name),
+        ).fetchone()
+
+    # ---- archiving ----
+
+    def select(self, now=None):
+        # photos to move out of the working folders, least recently used first. A photo
+        # this sweep sees for the first time arrives now: age never comes from mtimes
+        now = now or time.time()
+        try:
+            names = {f for f in os.listdir(self.kind_dirs["original"]) if f.endswith(".jpg")}
+        except FileNotFoundError:
+            names = set()
+        conn = self._conn()
+        known = {photo: (arrived, last_viewed) for photo, arrived, last_viewed in
+                 conn.execute("SELECT photo, arrived, last_viewed FROM working")}
+        new = names - set(known)
+        gone = set(known) - names
+        if new or gone:
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO working (photo, arrived, last_viewed) "
+                                 "VALUES (?, ?, 0)", [(name, now) for name in new])
+                conn.executemany("DELETE FROM working WHERE photo = ?", [(name,) for name in gone])
+            known.update((name, (now, 0)) for name in new)
+        photos = sorted((max(arrived, last_viewed), arrived, name)
+                        for name, (arrived, last_viewed) in known.items() if name in names)
+
+        chosen = []
+        keep = len(photos)
+        for last_used, arrived, name in photos:
+            if now - arrived < MIN_AGE:
+                continue
+            too_old = self.archive_after and now - last_used >= self.archive_after
+            too_many = self.keep_recent and keep > self.keep_recent
+            if too_old or too_many:
+                chosen.append(name)
+                keep -= 1
+        return chosen
+
+    def archive_photo(self, base_name):
+        # append the photo and its versions to the current pack; bytes archived
+        files = [("original", base_name)] + [
+            (kind, derivative_name(kind, base_name)) for kind in DERIVATIVE_SUFFIX
+            if kind in self.kind_dirs
+        ]
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT MAX(arrived, last_viewed) FROM working WHERE photo = ?", (base_name,)
+        ).fetchone()
+        last_used = row[0] if row else now
+        rows, paths = [], []
+        with self._writing():
+            pack = self._current_pack()
+            pack_path = os.path.join(self.archive_dir, pack)
+            with open(pack_path, "ab") as out:
+                for kind, name in files:
+                    path = os.path.join(self.kind_dirs[kind], name)
+                    try:
+                        src = open(path, "rb")
+                    except FileNotFoundError:
+                        continue
+                    with src:
+                        st = os.fstat(src.fileno())
+                        offset, size, mtime, etag = self._append(out, kind, name, src,
+                                                                 st.st_size, st.st_mtime)
+                    rows.append((kind, name, base_name, pack, offset, size, mtime, etag, now,
+                                 last_used))
+                    paths.append(path)
+                out.flush()
+                os.fsync(out.fileno())
+            with self._conn() as conn:
+                conn.execute("DELETE FROM archive WHERE photo = ?", (base_name,))
+                conn.executemany(
+                    "INSERT INTO archive (kind, name, photo, pack, offset, size, mtime, etag, "
+                    "archived_at, last_viewed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.execute("DELETE FROM working WHERE photo = ?", (base_name,))
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if rows:
+            ARCHIVED.inc()
+        return sum(row[5] for row in rows)
+
+    def restore(self, base_name):
+        # move an archived photo back into the working folders; False if not archived.
+        # It counts as just arrived, so no sweep (in this process or the server's)
+        # archives it again before MIN_AGE / ARCHIVE_AFTER have passed anew
+        found = False
+        for kind, name in self.members(base_name).items():
+            member = self.open(kind, name)
+            if member is None or kind not in self.kind_dirs:
+                continue
+            path = os.path.join(self.kind_dirs[kind], name)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with member, open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: member.read(CHUNK_SIZE), b""):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+            found = True
+        if found:
+            now = time.time()
+            with self._writing(), self._conn() as conn:
+                conn.execute("DELETE FROM archive WHERE photo = ?", (base_name,))
+                conn.execute("INSERT OR REPLACE INTO working (photo, arrived, last_viewed) "
+                             "VALUES (?, ?, ?)", (base_name, now, now))
+        return found
+
+    def sweep(self, now=None):
+        # archive what the policy selects, apply retention / quota, compact; a summary
+        now = now or time.time()
+        self._flush_views()
+        archived = 0
+        nbytes = 0
+        for name in self.select(now):
+            try:
+                nbytes += self.archive_photo(name)
+                archived += 1
+            except OSError as e:
+                print("Archiving failed for", name, e)
+        dropped = self._apply_retention(now)
+        compacted = self.compact()
+        if archived or dropped or compacted:
+            print(f"Archive: moved {archived} photos ({nbytes / 1e6:.1f} MB), "
+                  f"dropped {dropped}, compacted {compacted} packs")
+        return {"archived": archived, "bytes": nbytes, "dropped": dropped, "compacted": compacted}
+
+    def _append(self, out, kind, name, src, size, mtime):
+        # one record at the end of the pack; the ETag matches image_delivery.content_etag
+        kind_b, name_b = kind.encode(), name.encode()
+        start = out.tell()
+        try:
+            out.write(RECORD.pack(MAGIC, len(kind_b), len(name_b), size, mtime) + kind_b + name_b)
+            offset = out.tell()
+            digest = hashlib.blake2b(digest_size=16)
+            remaining = size
+            while remaining:
+                chunk = src.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise OSError(f"{name} shrank while archiving")
+                digest.update(chunk)
+                out.write(chunk)
+                remaining -= len(chunk)
+        except BaseException:
+            out.truncate(start)   # keep the pack a clean sequence of records
+            raise
+        return offset, size, mtime, digest.hexdigest()
+
+    # ---- retention ----
+
+    def _flush_views(self):
+        # views since the last sweep, to whichever table has the photo
+        views, self._views = self._views, {}
+        rows = [(t, photo) for photo, t in views.items()]
+        if rows:
+            with self._conn() as conn:
+                conn.executemany(
+                    "UPDATE working SET last_viewed = MAX(last_viewed, ?) WHERE photo = ?", rows)
+                conn.executemany(
+                    "UPDATE archive SET last_viewed = MAX(last_viewed, ?) WHERE photo = ?", rows)
+
+    def _apply_retention(self, now):
+        if not self.max_bytes and not self.retention:
+            return 0
+        conn = self._conn()
+        photos = conn.execute(
+            "SELECT photo, MAX(last_viewed), SUM(size) FROM archive "
+            "GROUP BY photo ORDER BY MAX(last_viewed)"
+        ).fetchall()
+        total = sum(size for _, _, size in photos)
+        drop = []
+        for photo, last_viewed, size in photos:
+            if self.retention and now - last_viewed >= self.retention:
+                drop.append((photo, "retention"))
+            elif self.max_bytes and total > self.max_bytes:
+                drop.append((photo, "quota"))
+            else:
+                break
+            total -= size
+        if drop:
+            with self._writing(), self._conn() as conn:
+                for photo, reason in drop:
+                    names = [row[0] for row in conn.execute(
+                        "SELECT name FROM archive WHERE photo = ?", (photo,))]
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO dropped (name, photo, dropped_at, reason) "
+                        "VALUES (?, ?, ?, ?)",
+                        [(name, photo, now, reason) for name in names + [sidecar_name(photo)]])
+                    conn.execute("DELETE FROM archive WHERE photo = ?", (photo,))
+            for photo, reason in drop:
+                # without its sidecar the photo leaves the gallery groups
+                try:
+                    os.remove(os.path.join(self.kind_dirs["original"], sidecar_name(photo)))
+                except FileNotFoundError:
+                    pass
+                DROPPED.inc(reason=reason)
+        return len(drop)
+
+    def compact(self):
+        # rewrite full packs that are mostly dropped or replaced records; packs rewritten
+        compacted = 0
+        with self._writing():
+            current = self._current_pack()
+            live = dict(self._conn().execute(
+                "SELECT pack, SUM(size) FROM archive GROUP BY pack").fetchall())
+            for pack in self._packs():
+                if pack == current:
+                    continue
+                if live.get(pack, 0) >= self._pack_size(pack) * COMPACT_BELOW:
+                    continue
+                self._rewrite(pack)
+                compacted += 1
+        return compacted
+
+    def _rewrite(self, pack):
+        # copy the live records of `pack` to the current pack, then delete it
+        rows = self._conn().execute(
+            "SELECT kind, name, offset, size, mtime, etag FROM archive WHERE pack = ? ORDER BY offset",
+            (pack,),
+        ).fetchall()
+        moved = []
+        if rows:
+            target = self._current_pack()
+            with open(os.path.join(self.archive_dir, target), "ab") as out:
+                for kind, name, offset, size, mtime, etag in rows:
+                    with MemberFile(os.path.join(self.archive_dir, pack), offset, size, mtime,
+                                    etag) as src:
+                        new_offset = self._append(out, kind, name, src, size, mtime)[0]
+                    moved.append((target, new_offset, kind, name))
+                out.flush()
+                os.fsync(out.fileno())
+            with self._conn() as conn:
+                conn.executemany(
+                    "UPDATE archive SET pack = ?, offset = ? WHERE kind = ? AND name = ?", moved)
+        os.remove(os.path.join(self.archive_dir, pack))
+
+    # ---- packs ----
+
+    def _packs(self):
+        try:
+            return sorted(f for f in os.listdir(self.archive_dir) if f.endswith(".pack"))
+        except FileNotFoundError:
+            return []
+
+    def _pack_size(self, pack):
+        try:
+            return os.path.getsize(os.path.join(self.archive_dir, pack))
+        except FileNotFoundError:
+            return 0
+
+    def _current_pack(self):
+        packs = self._packs()
+        if packs and self._pack_size(packs[-1]) < PACK_MAX_BYTES:
+            return packs[-1]
+        number = int(packs[-1][5:-5]) + 1 if packs else 1
+        return f"pack-{number:06d}.pack"
+
+    def _writing(self):
+        return _PackLock(self._lock, os.path.join(self.archive_dir, "lock"))
+
+    def reindex(self):
+        # rebuild the table from the pack files (e.g. after losing booth.db); records
+        # dropped by retention stay dropped while the `dropped` table survives
+        rows = {}
+        now = time.time()
+        dropped = {row[0] for row in self._conn().execute("SELECT name FROM dropped")}
+        for pack in self._packs():
+            path = os.path.join(self.archive_dir, pack)
+            with open(path, "rb") as f:
+                while True:
+                    header = f.read(RECORD.size)
+                    if len(header) < RECORD.size:
+                        break
+                    magic, kind_len, name_len, size, mtime = RECORD.unpack(header)
+                    if magic != MAGIC:
+                        print(f"{pack}: unreadable record at {f.tell() - RECORD.size}, skipping the rest")
+                        break
+                    kind = f.read(kind_len).decode()
+                    name = f.read(name_len).decode()
+                    offset = f.tell()
+                    digest = hashlib.blake2b(digest_size=16)
+                    remaining = size
+                    while remaining:
+                        chunk = f.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        remaining -= len(chunk)
+                    if remaining:
+                        print(f"{pack}: truncated record for {name}")
+                        break
+                    if name in dropped:
+                        continue
+                    rows[(kind, name)] = (kind, name, photo_of(kind, name), pack, offset, size,
+                                          mtime, digest.hexdigest(), now, now)
+        with self._writing(), self._conn() as conn:
+            conn.execute("DELETE FROM archive")
+            conn.executemany(
+                "INSERT INTO archive (kind, name, photo, pack, offset, size, mtime, etag, "
+                "archived_at, last_viewed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows.values())
+        return len(rows)
+
+    # ---- sweeper thread ----
+
+    def start(self, interval=SWEEP_SECONDS):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,),
+                                            name="photo-archive", daemon=True)
+            self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print("Archive sweep failed:", e)
+            time.sleep(interval)
+
+
+class _PackLock:
+    # thread lock plus flock on photos_archive/lock, so a CLI run and the server
+    # never append to the same pack at once
+    def __init__(self, lock, path):
+        self._lock = lock
+        self._path = path
+        self._f = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._f = open(self._path, "a")
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._f.close()     # releases the flock
+        finally:
+            self._lock.release()
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old photos into pack files")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--sweep", action="store_true", help="archive now with the configured policy")
+    parser.add_argument("--stats", action="store_true")
+    parser.add_argument("--restore", metavar="PHOTO", help="move a photo back into the working folders")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the index from the pack files")
+    parser.add_argument("--list", action="store_true", help="print archived file names, one per line")
+    args = parser.parse_args()
+
+    archive = PhotoArchive({"original": "photos", "bw": "photos_bw",
+                            "vintage": "photos_vintage", "style": "photos_style"}, args.db)
+    if args.list:
+        print("\n".join(archive.names()))
+        sys.exit(0)
+    if args.reindex:
+        print(f"Indexed {archive.reindex()} images")
+    if args.restore:
+        print("Restored" if archive.restore(args.restore) else "Not in the archive:", args.restore)
+    if args.sweep:
+        print(archive.sweep())
+    if args.stats or not (args.sweep or args.restore or args.reindex):
+        print(archive.stats())
@@ -0,0 +1,293 @@
+# photo_index.py
+# In-memory index of the photo folders so routes don't listdir/parse on every request.
+#
+# Each folder is rescanned only when its directory mtime changes (a file was added,
+# removed or renamed into place), and even then only new or changed entries are
+# stat'ed / parsed. Lookups (latest photo, derivatives of a photo, person groups)
+# are dictionary reads.
+#
+# Listeners (filters, thumbnails, face sidecars) are told about new files by whatever
+# refreshes the index first: a request, ingest (refresh() right after the rename) or
+# the watcher thread (start()), so photos that arrive while nobody is browsing are
+# processed too. The first scan only reports files newer than CATCH_UP_SECONDS, so
+# photos copied in while the server was down get their derivatives without replaying
+# the whole folder; older ones are the backfills' job.
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+
+import metrics
+
+# on filesystems with whole-second mtimes a scan this close to the directory's
+# mtime may have raced a write, so the folder stays dirty until it is older than this
+MTIME_SLACK = 2.0
+WATCH_SECONDS = 2.0          # watcher thread: how often folders are checked (one stat each)
+CATCH_UP_SECONDS = 3600      # first scan: files this recent still go to the listeners
+
+DERIVATIVE_SUFFIX = {"bw": "_bw", "vintage": "_vintage", "style": "_style"}
+
+SCANS = metrics.counter("photo_index_scans_total", "Photo folder rescans", ["kind"])
+ENTRIES_SCANNED = metrics.counter("photo_index_entries_scanned_total",
+                                  "Directory entries listed by rescans", ["kind"])
+FILES_READ = metrics.counter("photo_index_files_read_total", "Sidecar JSON files parsed")
+
+
+class _Folder:
+    def __init__(self, path):
+        self.path = path
+        self.dir_mtime = None
+        self.dirty = True
+        self.scanned = False
+        self.names = []        # sorted .jpg names
+        self.mtimes = {}       # .jpg name -> mtime
+        self.arrived = {}      # .jpg name -> when a scan first saw it (server clock)
+        self.sidecars = {}     # .json name -> (inode, meta)
+
+
+class PhotoIndex:
+    def __init__(self, folders):
+        # folders: kind -> directory, e.g. {"original": "photos", "bw": "photos_bw", ...}
+        self._lock = threading.RLock()
+        self._folders = {kind: _Folder(path) for kind, path in folders.items()}
+        self._derivatives = defaultdict(dict)  # photo root -> kind -> (mtime, fname)
+        self._groups = None
+        self._group_counts = {}
+        self._listeners = []
+        self._pending = []      # (kind, name) found by a scan, for the listeners
+        self._depth = threading.local()
+        self._thread = None
+        self.scans = 0
+
+    # ---- lookups ----
+
+    def latest(self, kind="original"):
+        with self._locked():
+            folder = self._refresh(kind)
+            return folder.names[-1] if folder.names else None
+
+    def names(self, kind="original"):
+        with self._locked():
+            return list(self._refresh(kind).names)
+
+    def contains(self, kind, name):
+        with self._locked():
+            return name in self._refresh(kind).mtimes
+
+    def arrived(self, kind, name):
+        # server time the file first showed up; unlike its mtime (rsync -a keeps the
+        # RDK's clock, often still in 2000) this is comparable with time.time()
+        with self._locked():
+            return self._refresh(kind).arrived.get(name)
+
+    def derivatives(self, base_name):
+        # kind -> (mtime, fname) for every derivative of base_name that exists
+        root, _ = os.path.splitext(base_name)
+        with self._locked():
+            for kind in DERIVATIVE_SUFFIX:
+                if kind in self._folders:
+                    self._refresh(kind)
+            return dict(self._derivatives.get(root, {}))
+
+    def groups(self):
+        # person -> sorted image names, rebuilt only when a sidecar changed
+        with self._locked():
+            self._refresh("original")
+            if self._groups is None:
+                groups = defaultdict(list)
+                for _, meta in self._folders["original"].sidecars.values():
+                    img_name = meta.get("filename")
+                    if img_name:
+                        groups[meta.get("person", "unknown")].append(img_name)
+                for files in groups.values():
+                    files.sort()
+                self._groups = groups
+                self._group_counts = {person: len(files) for person, files in sorted(groups.items())}
+            return self._groups
+
+    def group_counts(self):
+        # person -> number of photos, in person order; cached with the groups
+        with self._locked():
+            self.groups()
+            return dict(self._group_counts)
+
+    def group_page(self, person, after=None, limit=48):
+        # one page of a group, ordered by (timestamped) filename. The cursor is the
+        # last name returned, so it stays valid as new photos are added.
+        with self._locked():
+            files = self.groups().get(person, [])
+            start = bisect.bisect_right(files, after) if after else 0
+            page = files[start:start + limit]
+            next_cursor = page[-1] if page and start + limit < len(files) else None
+            return page, next_cursor
+
+    def sidecar(self, base_name):
+        root, _ = os.path.splitext(base_name)
+        with self._locked():
+            entry = self._refresh("original").sidecars.get(root + ".json")
+            return entry[1] if entry else None
+
+    # ---- change notification ----
+
+    def subscribe(self, callback):
+        # callback(kind, name) for every .jpg that appears after the first scan
+        self._listeners.append(callback)
+
+    def invalidate(self, kind=None):
+        with self._locked():
+            for k, folder in self._folders.items():
+                if kind is None or k == kind:
+                    folder.dirty = True
+
+    def refresh(self, kind=None):
+        # rescan now (listeners run for anything new) instead of on the next lookup
+        with self._locked():
+            for k, folder in self._folders.items():
+                if kind is None or k == kind:
+                    folder.dirty = True
+                    self._refresh(k)
+
+    def start(self, interval=WATCH_SECONDS):
+        # background refresh, so listeners don't wait for page traffic
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, args=(interval,),
+                                            name="photo-index", daemon=True)
+            self._thread.start()
+
+    def _watch(self, interval):
+        while True:
+            for kind in self._folders:
+                try:
+                    with self._locked():
+                        self._refresh(kind)
+                except Exception as e:
+                    print("Photo index refresh failed:", e)
+            time.sleep(interval)
+
+    # ---- scanning ----
+
+    def _refresh(self, kind):
+        folder = self._folders[kind]
+        try:
+            dir_mtime = os.stat(folder.path).st_mtime
+        except FileNotFoundError:
+            dir_mtime = None
+        if dir_mtime == folder.dir_mtime and not folder.dirty:
+            return folder
+
+        first_scan = not folder.scanned
+        added = self._scan(kind, folder)
+        folder.scanned = True
+        folder.dir_mtime = dir_mtime
+        folder.dirty = (dir_mtime is not None and dir_mtime == int(dir_mtime)
+                        and time.time() - dir_mtime < MTIME_SLACK)
+
+        if first_scan:
+            recent = time.time() - CATCH_UP_SECONDS
+            added = [name for name in added if folder.mtimes[name] >= recent]
+        if self._listeners:
+            self._pending.extend((kind, name) for name in added)
+        return folder
+
+    @contextmanager
+    def _locked(self):
+        # the index lock; listeners for what the scans found run after it is released,
+        # so a slow one never holds up lookups
+        with self._lock:
+            self._depth.n = getattr(self._depth, "n", 0) + 1
+            try:
+                yield
+            finally:
+                self._depth.n -= 1
+        if self._depth.n == 0 and self._pending:
+            self._notify()
+
+    def _notify(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for kind, name in pending:
+            for callback in self._listeners:
+                try:
+                    callback(kind, name)
+                except Exception as e:
+                    print("Photo index listener failed:", e)
+
+    def _scan(self, kind, folder):
+        self.scans += 1
+        SCANS.inc(kind=kind)
+        seen_jpg = set()
+        seen_json = set()
+        added = []
+        sidecars_changed = False
+
+        try:
+            entries = list(os.scandir(folder.path))
+        except FileNotFoundError:
+            entries = []
+        ENTRIES_SCANNED.inc(len(entries), kind=kind)
+        now = time.time()
+
+        for entry in entries:
+            name = entry.name
+            if name.endswith(".jpg"):
+                seen_jpg.add(name)
+                if name not in folder.mtimes:
+                    try:
+                        mtime = entry.stat().st_mtime
+                    except FileNotFoundError:
+                        continue
+                    folder.mtimes[name] = mtime
+                    # files already there at startup arrived no later than their mtime
+                    folder.arrived[name] = now if folder.scanned else min(mtime, now)
+                    bisect.insort(folder.names, name)
+                    self._add_derivative(kind, name, mtime)
+                    added.append(name)
+            elif name.endswith(".json") and kind == "original":
+                seen_json.add(name)
+                # sidecars are written once or replaced atomically, so a new inode
+                # (free from scandir, unlike mtime) is enough to spot a change
+                inode = entry.inode()
+                cached = folder.sidecars.get(name)
+                if cached and cached[0] == inode:
+                    continue
+                FILES_READ.inc()
+                try:
+                    with open(entry.path, "r") as f:
+                        meta = json.load(f)
+                except Exception as e:
+                    print("Failed to read", entry.path, e)
+                    continue
+                folder.sidecars[name] = (inode, meta)
+                sidecars_changed = True
+
+        for name in set(folder.mtimes) - seen_jpg:
+            del folder.mtimes[name]
+            del folder.arrived[name]
+            folder.names.pop(bisect.bisect_left(folder.names, name))
+            self._remove_derivative(kind, name)
+        if kind == "original":
+            for name in set(folder.sidecars) - seen_json:
+                del folder.sidecars[name]
+                sidecars_changed = True
+            if sidecars_changed:
+                self._groups = None
+        return added
+
+    def _add_derivative(self, kind, name, mtime):
+        suffix = DERIVATIVE_SUFFIX.get(kind)
+        root = os.path.splitext(name)[0]
+        if suffix and root.endswith(suffix):
+            self._derivatives[root[:-len(suffix)]][kind] = (mtime, name)
+
+    def _remove_derivative(self, kind, name):
+        suffix = DERIVATIVE_SUFFIX.get(kind)
+        root = os.path.splitext(name)[0]
+        if suffix and root.endswith(suffix):
+            kinds = self._derivatives.get(root[:-len(suffix)])
+            if kinds:
+                kinds.pop(kind, None)
+                if not kinds:
+                    del self._derivatives[root[:-len(suffix)]]
@@ -0,0 +1,175 @@
+# rdk_uploader.py
+# Runs on the RDK next to the capture script: pushes every new photo (and its JSON
+# sidecar) to the Flask server's /ingest endpoint as soon as it is written, instead
+# of the server rsyncing the whole folder every 10 seconds. Standard library only.
+#
+#   python3 rdk_uploader.py --server http://192.168.127.1:8900
+#   python3 rdk_uploader.py --server http://... --all     # also send photos already there
+#   python3 rdk_uploader.py --server http://... --booth left   # kiosk opened at /?booth=left
+#
+# Only the photos/ folder is watched: the server makes its own B&W / vintage versions.
+import os
+import sys
+import time
+import json
+import hashlib
+import argparse
+import http.client
+import urllib.parse
+
+WATCH_DIR = "photos"
+POLL_SECONDS = 0.1          # directory mtime check; the folder is only listed when it changes
+SIDECAR_WAIT = 2.0          # the capture script writes the .json right after the .jpg
+RETRY_BASE = 1.0
+RETRY_MAX = 30.0
+TIMEOUT = 15
+PING_SECONDS = 20           # while idle, so the server knows a capture press will be pushed
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def jpeg_complete(path):
+    # a JPEG still being written has no end-of-image marker yet
+    try:
+        with open(path, "rb") as f:
+            f.seek(-2, os.SEEK_END)
+            return f.read(2) == b"\xff\xd9"
+    except OSError:
+        return False
+
+
+class Uploader:
+    def __init__(self, server, watch_dir=WATCH_DIR, token=None, booth=None):
+        self.url = urllib.parse.urlsplit(server)
+        self.watch_dir = watch_dir
+        self.token = token
+        self.booth = booth
+        self._conn = None
+        self._last_contact = 0.0
+
+    def _connection(self):
+        # one keep-alive connection, reopened after any error
+        if self._conn is None:
+            cls = (http.client.HTTPSConnection if self.url.scheme == "https"
+                   else http.client.HTTPConnection)
+            self._conn = cls(self.url.netloc, timeout=TIMEOUT)
+        return self._conn
+
+    def _request(self, method, target, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.token:
+            headers["X-Ingest-Token"] = self.token
+        if self.booth:
+            headers["X-Booth-Id"] = self.booth
+        try:
+            conn = self._connection()
+            conn.request(method, f"{self.url.path.rstrip('/')}{target}", body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self._conn = None
+            raise
+        self._last_contact = time.monotonic()
+        return resp, data
+
+    def put(self, path):
+        name = os.path.basename(path)
+        headers = {
+            "Content-Length": str(os.path.getsize(path)),
+            "Content-Type": "application/json" if name.endswith(".json") else "image/jpeg",
+            "X-Content-SHA256": sha256_of(path),
+        }
+        with open(path, "rb") as f:   # streamed from disk
+            resp, body = self._request("PUT", f"/ingest/{urllib.parse.quote(name)}", f, headers)
+        if resp.status == 409:
+            # the server has a different photo under this name; retrying won't help
+            print(f"{name}: not uploaded, {body[:200]!r}")
+            return {"status": "conflict", "filename": name}
+        if resp.status >= 300:
+            raise RuntimeError(f"{name}: HTTP {resp.status} {body[:200]!r}")
+        return json.loads(body)
+
+    def ping(self):
+        resp, body = self._request("POST", "/ingest/ping", b"", {"Content-Length": "0"})
+        if resp.status >= 300:
+            raise RuntimeError(f"ping: HTTP {resp.status} {body[:200]!r}")
+
+    def send_photo(self, jpg_path):
+        # sidecar first so the person label is there when the photo appears
+        sidecar = os.path.splitext(jpg_path)[0] + ".json"
+        deadline = time.monotonic() + SIDECAR_WAIT
+        while not os.path.exists(sidecar) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        t0 = time.perf_counter()
+        if os.path.exists(sidecar):
+            self.put(sidecar)
+        result = self.put(jpg_path)
+        print(f"{result['status']}: {result['filename']} "
+              f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    def run(self, send_existing=False):
+        sent = set() if send_existing else {
+            f for f in os.listdir(self.watch_dir) if f.endswith(".jpg")
+        }
+        pending = {}          # name -> (size, next attempt time, attempts)
+        dir_mtime = None
+        print(f"Watching {self.watch_dir}/ -> {self.url.geturl()}")
+        while True:
+            mtime = os.stat(self.watch_dir).st_mtime_ns
+            if mtime != dir_mtime:
+                dir_mtime = mtime
+                for name in sorted(os.listdir(self.watch_dir)):
+                    if name.endswith(".jpg") and name not in sent and name not in pending:
+                        pending[name] = (-1, 0.0, 0)
+
+            now = time.monotonic()
+            for name, (last_size, due, attempts) in sorted(pending.items()):
+                if now < due:
+                    continue
+                path = os.path.join(self.watch_dir, name)
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    del pending[name]      # removed before we got to it
+                    continue
+                # wait until the file has stopped growing and is a whole JPEG
+                if size != last_size or not jpeg_complete(path):
+                    pending[name] = (size, now + POLL_SECONDS, attempts)
+                    continue
+                try:
+                    self.send_photo(path)
+                except Exception as e:
+                    delay = min(RETRY_BASE * 2 ** attempts, RETRY_MAX)
+                    print(f"Upload of {name} failed ({e}); retrying in {delay:.0f}s")
+                    pending[name] = (size, now + delay, attempts + 1)
+                    continue
+                del pending[name]
+                sent.add(name)
+            if not pending and time.monotonic() - self._last_contact >= PING_SECONDS:
+                try:
+                    self.ping()
+                except Exception as e:
+                    print(f"Server unreachable ({e}); captures won't be pushed until it is back")
+                    self._last_contact = time.monotonic()
+            time.sleep(POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Push new booth photos to the Flask server")
+    parser.add_argument("--server", required=True, help="e.g. http://192.168.127.1:8900")
+    parser.add_argument("--dir", default=WATCH_DIR)
+    parser.add_argument("--token", default=os.environ.get("PHOTOBOOTH_INGEST_TOKEN"))
+    parser.add_argument("--all", action="store_true", help="also upload photos already in the folder")
+    parser.add_argument("--booth", default=os.environ.get("PHOTOBOOTH_BOOTH_ID"),
+                        help="booth id when several kiosks share one server")
+    args = parser.parse_args()
+    try:
+        Uploader(args.server, args.dir, args.token, args.booth).run(send_existing=args.all)
+    except KeyboardInterrupt:
+        sys.exit(0)
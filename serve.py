@@ -0,0 +1,193 @@
+# serve.py
+# Production entry point: one process, a pool of request threads, one style engine.
+#
+#   python serve.py                           # 0.0.0.0:8900, 16 threads
+#   python serve.py --threads 8 --drain-timeout 120
+#   python serve.py --measure-startup         # print cold-start timings as JSON and exit
+#
+# Uses waitress when it is installed, otherwise Werkzeug's server with a fixed thread
+# pool (not the debug server). Threads rather than processes on purpose: the board
+# has no GPU and room for exactly one TensorFlow model, so the style worker lives in
+# this single process and every request thread hands jobs to it.
+#
+# TensorFlow is not imported before the first request: app.py only checks that it is
+# installed and the style worker imports it on its own thread once the server is up.
+#
+# On SIGTERM / Ctrl-C the style worker stops taking jobs and finishes the queued and
+# running ones (guests can still watch them complete), then the server stops.
+# Queued emails are kept in booth.db and sent after the next start.
+import time
+
+PROCESS_START = time.perf_counter()
+
+import os  # noqa: E402
+import sys  # noqa: E402
+import json  # noqa: E402
+import signal  # noqa: E402
+import argparse  # noqa: E402
+import threading  # noqa: E402
+import urllib.request  # noqa: E402
+from concurrent.futures import ThreadPoolExecutor  # noqa: E402
+
+DEFAULT_THREADS = int(os.environ.get("PHOTOBOOTH_THREADS", "16"))
+DRAIN_TIMEOUT = 300   # seconds; a quality style job can take a couple of minutes
+BACKLOG_PER_THREAD = 4   # Werkzeug pool: connections queued beyond this get a 503
+BUSY_REPLY = (b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 2\r\n"
+              b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+
+
+class _PooledWerkzeugServer:
+    # Werkzeug's WSGI server with requests handed to a fixed-size thread pool and a
+    # bounded backlog: past it new connections are refused with a 503 straight away
+    # rather than queueing behind SSE streams and long-polls
+    def __init__(self, host, port, wsgi_app, threads):
+        from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+        class Handler(WSGIRequestHandler):
+            # one request per connection: idle keep-alive sockets would pin pool threads
+            protocol_version = "HTTP/1.0"
+
+        class Server(BaseWSGIServer):
+            multithread = True
+
+            def process_request(server, request, client_address):
+                if not self.slots.acquire(blocking=False):
+                    try:
+                        request.sendall(BUSY_REPLY)
+                    except OSError:
+                        pass
+                    server.shutdown_request(request)
+                    return
+                self.pool.submit(self._handle, request, client_address)
+
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self.slots = threading.BoundedSemaphore(threads * (1 + BACKLOG_PER_THREAD))
+        self.server = Server(host, port, wsgi_app, handler=Handler)
+
+    def _handle(self, request, client_address):
+        try:
+            self.server.finish_request(request, client_address)
+        except Exception:
+            self.server.handle_error(request, client_address)
+        finally:
+            self.server.shutdown_request(request)
+            self.slots.release()
+
+    def run(self):
+        self.server.serve_forever()
+
+    def close(self):
+        self.server.shutdown()
+        self.pool.shutdown(wait=False)
+
+
+class _WaitressServer:
+    def __init__(self, host, port, wsgi_app, threads):
+        from waitress.server import create_server
+        # waitress bounds its own backlog (connection_limit)
+        self.server = create_server(wsgi_app, host=host, port=port, threads=threads)
+
+    def run(self):
+        self.server.run()
+
+    def close(self):
+        self.server.close()
+
+
+def make_server(host, port, wsgi_app, threads):
+    try:
+        server = _WaitressServer(host, port, wsgi_app, threads)
+        name = "waitress"
+    except ImportError:
+        server = _PooledWerkzeugServer(host, port, wsgi_app, threads)
+        name = "werkzeug"
+    print(f"Serving on http://{host}:{port} ({name}, {threads} threads)")
+    return server
+
+
+def first_response(port, path="/camera"):
+    # seconds from process start until the server answered its first request
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as resp:
+                resp.read()
+            return time.perf_counter() - PROCESS_START
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the photo booth app for an event")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="request threads; SSE and long-poll pages each hold one while open")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="seconds to let style jobs finish on shutdown")
+    parser.add_argument("--no-style-warmup", action="store_true",
+                        help="load the style model on the first job instead of at start-up")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="print cold-start timings as JSON and exit")
+    args = parser.parse_args()
+
+    t_import = time.perf_counter()
+    import app as booth
+    import metrics
+    import_seconds = time.perf_counter() - t_import
+    booth.set_long_wait_slots(args.threads // 2)
+
+    server = make_server(args.host, args.port, booth.app, args.threads)
+    threading.Thread(target=server.run, name="http-server", daemon=True).start()
+
+    first = first_response(args.port)
+    timings = {
+        "import_app_seconds": round(import_seconds, 3),
+        "first_response_seconds": round(first, 3),
+    }
+    print(f"Cold start: app imported in {import_seconds:.2f}s, "
+          f"first response {first:.2f}s after process start")
+    metrics.gauge("process_cold_start_seconds",
+                  "Process start to first HTTP response").set(round(first, 3))
+    if args.measure_startup:
+        server.close()
+        print(json.dumps(timings))
+        return
+
+    booth.email_outbox.start()
+    booth.photo_index.start()     # filters / thumbnails / faces for photos nobody has viewed yet
+    booth.photo_archive.start()
+    if booth.style_worker is not None and not args.no_style_warmup:
+        booth.style_worker.start()     # imports TensorFlow + builds the model in the background
+    if booth.METRICS_LOG_SECONDS > 0:
+        metrics.start_log_summary(booth.METRICS_LOG_SECONDS)
+
+    stopping = threading.Event()
+
+    def drain_and_stop():
+        if booth.style_worker is not None:
+            print(f"Shutting down: finishing style jobs (up to {args.drain_timeout:.0f}s)...")
+            if not booth.style_worker.drain(args.drain_timeout):
+                print("Style jobs still running after the drain timeout, stopping anyway")
+        server.close()
+        stopping.set()
+
+    signals = []
+
+    def on_signal(signum, frame):
+        signals.append(signum)
+        if len(signals) > 1:
+            sys.exit(1)    # second Ctrl-C: don't wait any longer
+        threading.Thread(target=drain_and_stop, name="drain", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    while not stopping.wait(0.5):
+        pass
+    print("Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# session_store.py
+# Booth sessions and their captures in SQLite (WAL mode), replacing session_photos.json.
+#
+# One row per booth session keeps a running capture count, so retake checks are a
+# single primary-key read. Captures are de-duplicated per session, every write is one
+# short transaction, and readers never block writers.
+import time
+import uuid
+import sqlite3
+import threading
+
+DB_PATH = "booth.db"
+SESSION_TTL = 2 * 60 * 60        # seconds of inactivity before a session is expired
+EXPIRE_EVERY = 10 * 60           # run expiry/compaction at most this often
+TOUCH_EVERY = 60                 # last_seen is written at most this often per session
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id            TEXT PRIMARY KEY,
+    created       REAL NOT NULL,
+    last_seen     REAL NOT NULL,
+    capture_count INTEGER NOT NULL DEFAULT 0,
+    latest_photo  TEXT
+);
+CREATE TABLE IF NOT EXISTS captures (
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    filename   TEXT NOT NULL,
+    ts         REAL NOT NULL,
+    PRIMARY KEY (session_id, filename)
+);
+CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions(last_seen);
+"""
+
+
+class SessionStore:
+    def __init__(self, db_path=DB_PATH, ttl=SESSION_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_expire = 0.0
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = open_db(self.db_path)
+        return conn
+
+    # ---- sessions ----
+
+    def new_session(self):
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO sessions (id, created, last_seen) VALUES (?, ?, ?)",
+                (session_id, now, now),
+            )
+        self.maybe_expire()
+        return session_id
+
+    def ensure_session(self, session_id):
+        # returns a live session id: the given one if it still exists, else a new one.
+        # A plain read on most page views: last_seen only needs minute precision for
+        # expiry, so the write lock is taken at most once every TOUCH_EVERY seconds
+        if session_id:
+            now = time.time()
+            row = self._conn().execute(
+                "SELECT last_seen FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is not None and now - row[0] < TOUCH_EVERY:
+                return session_id
+            if row is not None:
+                with self._conn() as conn:
+                    cur = conn.execute(
+                        "UPDATE sessions SET last_seen = ? WHERE id = ?", (now, session_id)
+                    )
+                    if cur.rowcount:
+                        return session_id
+        return self.new_session()
+
+    def get(self, session_id):
+        row = self._conn().execute(
+            "SELECT id, created, last_seen, capture_count, latest_photo FROM sessions WHERE id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "created", "last_seen", "capture_count", "latest_photo")
+        return dict(zip(keys, row))
+
+    # ---- captures ----
+
+    def add_capture(self, session_id, filename):
+        # returns the session's capture count; a repeated filename is not counted twice
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO captures (session_id, filename, ts) VALUES (?, ?, ?)",
+                (session_id, filename, now),
+            )
+            if cur.rowcount:
+                conn.execute(
+                    "UPDATE sessions SET capture_count = capture_count + 1, latest_photo = ?, "
+                    "last_seen = ? WHERE id = ?",
+                    (filename, now, session_id),
+                )
+            row = conn.execute(
+                "SELECT capture_count FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def capture_count(self, session_id):
+        row = self._conn().execute(
+            "SELECT capture_count FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def captures(self, session_id):
+        rows = self._conn().execute(
+            "SELECT filename FROM captures WHERE session_id = ? ORDER BY ts", (session_id,)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    # ---- housekeeping ----
+
+    def maybe_expire(self):
+        now = time.time()
+        if now - self._last_expire < EXPIRE_EVERY:
+            return 0
+        self._last_expire = now
+        return self.expire()
+
+    def expire(self, older_than=None):
+        cutoff = time.time() - (self.ttl if older_than is None else older_than)
+        with self._conn() as conn:
+            cur = conn.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,))
+            removed = cur.rowcount
+        if removed:
+            self.compact()
+        return removed
+
+    def compact(self):
+        conn = self._conn()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA optimize")
+
+    def vacuum(self):
+        # full rewrite of the file; only worth it after a big expiry (e.g. end of event)
+        self._conn().execute("VACUUM")
+
+
+def open_db(db_path):
+    # autocommit connection in WAL mode; use `with conn:` for a write transaction.
+    # Connections are per thread, callers keep one in a threading.local.
+    conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return _Transaction(conn)
+
+
+class _Transaction:
+    # sqlite3 connection whose `with` block is BEGIN IMMEDIATE ... COMMIT/ROLLBACK
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def executemany(self, *args):
+        return self.conn.executemany(*args)
+
+    def executescript(self, script):
+        return self.conn.executescript(script)
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
@@ -0,0 +1,81 @@
+// gallery.js
+// Lazy gallery: each group block asks /api/gallery/photos for a page when it scrolls
+// near the viewport, and thumbnails only get their src when they are about to show.
+function initGallery(photosUrl, pageSize) {
+  var imageObserver = null;
+  if (window.IntersectionObserver) {
+    imageObserver = new IntersectionObserver(function (entries) {
+      entries.forEach(function (entry) {
+        if (!entry.isIntersecting) return;
+        var img = entry.target;
+        img.src = img.dataset.src;
+        imageObserver.unobserve(img);
+      });
+    }, { rootMargin: "300px" });
+  }
+
+  function addPhoto(container, photo) {
+    var link = document.createElement("a");
+    link.href = photo.screen;
+    link.target = "_blank";
+    link.className = "thumb";
+    var img = document.createElement("img");
+    img.alt = photo.filename;
+    img.loading = "lazy";
+    if (imageObserver) {
+      img.dataset.src = photo.thumb;
+      imageObserver.observe(img);
+    } else {
+      img.src = photo.thumb;
+    }
+    link.appendChild(img);
+    container.appendChild(link);
+  }
+
+  function loadPage(block) {
+    if (block.dataset.loading === "1" || block.dataset.done === "1") return;
+    block.dataset.loading = "1";
+    var url = photosUrl + "?person=" + encodeURIComponent(block.dataset.person) +
+              "&limit=" + pageSize;
+    if (block.dataset.cursor) url += "&after=" + encodeURIComponent(block.dataset.cursor);
+    fetch(url)
+      .then(function (r) { return r.json(); })
+      .then(function (page) {
+        var thumbs = block.querySelector(".thumbs");
+        page.photos.forEach(function (photo) { addPhoto(thumbs, photo); });
+        block.dataset.cursor = page.next_cursor || "";
+        if (!page.next_cursor) block.dataset.done = "1";
+        block.dataset.loading = "0";
+        // the page may not have filled the row yet
+        if (!page.next_cursor) return;
+        var sentinel = block.querySelector(".more");
+        if (!pageObserver || isNear(sentinel)) loadPage(block);
+      })
+      .catch(function () {
+        block.dataset.loading = "0";
+        setTimeout(function () { loadPage(block); }, 3000);
+      });
+  }
+
+  function isNear(el) {
+    var box = el.getBoundingClientRect();
+    return box.top < window.innerHeight + 300 && box.left < window.innerWidth + 300;
+  }
+
+  var pageObserver = null;
+  if (window.IntersectionObserver) {
+    pageObserver = new IntersectionObserver(function (entries) {
+      entries.forEach(function (entry) {
+        if (entry.isIntersecting) loadPage(entry.target.closest(".person-block"));
+      });
+    }, { rootMargin: "300px" });
+  }
+
+  document.querySelectorAll(".person-block[data-person]").forEach(function (block) {
+    if (pageObserver) {
+      pageObserver.observe(block.querySelector(".more"));
+    } else {
+      loadPage(block);
+    }
+  });
+}
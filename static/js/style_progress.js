@@ -0,0 +1,61 @@
+// style_progress.js
+// Follow one style job: Server-Sent Events first, long-poll if SSE is missing or drops.
+// onUpdate(job) gets {state, phase, step, max_steps, eta_seconds, url, ...}.
+function followStyleJob(eventsUrl, statusUrl, onUpdate) {
+  var finished = false;
+  var TERMINAL = ["done", "error", "dropped", "missing"];
+
+  function handle(job) {
+    onUpdate(job);
+    if (TERMINAL.indexOf(job.state) >= 0) finished = true;
+  }
+
+  function poll(since) {
+    if (finished) return;
+    fetch(statusUrl + "?since=" + since + "&wait=25")
+      .then(function (r) {
+        // 404: the server has no such job (never started or forgotten); stop asking
+        if (r.status === 404) return {state: "missing"};
+        return r.ok ? r.json() : null;
+      })
+      .then(function (job) {
+        if (finished) return;
+        if (job) {
+          handle(job);
+          since = job.version || since;
+        }
+        setTimeout(function () { poll(since); }, job ? 0 : 2000);
+      })
+      .catch(function () {
+        setTimeout(function () { poll(since); }, 3000);
+      });
+  }
+
+  if (!window.EventSource) {
+    poll(0);
+    return;
+  }
+  var source = new EventSource(eventsUrl);
+  source.addEventListener("status", function (e) {
+    handle(JSON.parse(e.data));
+    if (finished) source.close();
+  });
+  source.onerror = function () {
+    source.close();
+    if (!finished) poll(0);
+  };
+}
+
+function describeStyleJob(job) {
+  if (job.state === "done") return "Your HKUST style portrait is ready!";
+  if (job.state === "error") return "Sorry, the HKUST style portrait could not be made.";
+  if (job.state === "dropped") return "The style queue is busy, please try again.";
+  if (job.state === "missing") return "No HKUST style portrait is being made for this photo.";
+  if (job.state === "queued") return "Your HKUST style portrait is waiting in line.";
+  if (job.step && job.max_steps) {
+    var text = "Carving your HKUST portrait: step " + job.step + " of up to " + job.max_steps;
+    if (job.eta_seconds) text += ", about " + Math.ceil(job.eta_seconds) + " s left";
+    return text + ".";
+  }
+  return "Your HKUST style portrait is being prepared.";
+}
@@ -0,0 +1,191 @@
+# style_backfill.py
+# Restyle past photos offline, e.g. overnight after adding or changing the style image.
+#
+#   python style_backfill.py                  # every photo without a current _style.jpg
+#   python style_backfill.py --batch 8 --limit 200
+#   python style_backfill.py --force          # redo everything with the current style
+#   python style_backfill.py --profile standard   # cheaper quality profile (style_filter.PROFILES)
+#
+# One StyleModel (VGG19 + Gram targets) is built for the whole run. Photos are grouped
+# by pixel size and each group is optimised a batch at a time, so one forward/backward
+# pass through VGG serves several photos and the traced loss function is reused for
+# every full batch of that size.
+#
+# A style file counts as current if it is newer than the style image. Progress is saved
+# after every batch (STATE_FILE, keyed by the style image's hash), so an interrupted
+# run picks up where it stopped; a changed style image starts a fresh state.
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import defaultdict
+
+import tensorflow as tf
+from PIL import Image
+
+import style_filter
+import photo_archive
+
+SOURCE_DIR = "photos"
+OUTPUT_DIR = style_filter.STYLE_OUTPUT_DIR
+STATE_FILE = "style_backfill_state.json"
+BATCH_SIZE = 4       # 512px batches of 4 fit comfortably in the board's RAM
+
+
+def style_output_name(base_name):
+    # same name the web flow uses (app.style_output_name)
+    return os.path.splitext(base_name)[0] + "_style.jpg"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_state(path, style_hash, profile):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = None
+    if not state or state.get("style_sha256") != style_hash or state.get("profile") != profile:
+        state = {"style_sha256": style_hash, "profile": profile, "done": [], "failed": {},
+                 "images": 0, "seconds": 0.0}
+    return state
+
+
+def save_state(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def needs_style(name, style_mtime, done, force):
+    if name in done:
+        return False
+    out_path = os.path.join(OUTPUT_DIR, style_output_name(name))
+    try:
+        return force or os.path.getmtime(out_path) < style_mtime
+    except OSError:
+        return True
+
+
+def plan_batches(names, batch_size):
+    # same-size photos together; each group cut into batches, largest groups first
+    groups = defaultdict(list)
+    for name in names:
+        try:
+            with Image.open(os.path.join(SOURCE_DIR, name)) as img:   # header only
+                groups[img.size].append(name)
+        except OSError as e:
+            print(f"Skipping {name}: {e}")
+    batches = []
+    for size, members in sorted(groups.items(), key=lambda kv: -len(kv[1])):
+        for i in range(0, len(members), batch_size):
+            batches.append((size, members[i:i + batch_size]))
+    return batches
+
+
+def stylize_batch(style_model, names, schedule):
+    scales, steps_per_scale, min_rel_improvement = schedule
+    images = [style_filter.load_img(os.path.join(SOURCE_DIR, name), max_dim=max(scales))
+              for name in names]
+    batch = tf.concat(images, axis=0)
+    result, report = style_filter.optimize_multiscale(
+        style_model, batch, scales, steps_per_scale, min_rel_improvement
+    )
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    for name, image in zip(names, result.numpy()):
+        out_path = os.path.join(OUTPUT_DIR, style_output_name(name))
+        tmp_path = out_path + ".tmp"
+        style_filter.tensor_to_image(image).save(tmp_path, format="JPEG")
+        os.replace(tmp_path, out_path)   # the web app never serves a half-written file
+    return report
+
+
+def backfill(style_path=style_filter.STYLE_IMAGE_PATH, batch_size=BATCH_SIZE, limit=None,
+             force=False, state_path=STATE_FILE, profile=style_filter.DEFAULT_PROFILE):
+    style_hash = file_sha256(style_path)
+    style_mtime = os.path.getmtime(style_path)
+    state = load_state(state_path, style_hash, profile)
+    done = set(state["done"])
+
+    names = sorted(f for f in os.listdir(SOURCE_DIR) if f.endswith(".jpg"))
+    todo = [n for n in names if needs_style(n, style_mtime, done, force)]
+    if limit:
+        todo = todo[:limit]
+    batches = plan_batches(todo, batch_size)
+    print(f"{len(todo)} of {len(names)} photos need the current style "
+          f"({len(done)} done earlier), {len(batches)} batches")
+    skipped = len(photo_archive.archived_names())
+    if skipped:
+        print(f"{skipped} archived photos not checked; "
+              f"python photo_archive.py --restore <photo> brings one back")
+    if not batches:
+        return state
+
+    t0 = time.perf_counter()
+    print("Loading VGG19...")
+    style_model = style_filter.StyleModel(style_path, profile)
+    print(f"Model ready in {time.perf_counter() - t0:.1f}s ('{profile}' profile)")
+    schedule = style_filter.default_schedule(profile=profile)
+
+    run_images = 0
+    run_seconds = 0.0
+    try:
+        for i, (size, batch) in enumerate(batches, 1):
+            t_batch = time.perf_counter()
+            try:
+                report = stylize_batch(style_model, batch, schedule)
+            except Exception as e:
+                print(f"Batch {i} failed ({e}); skipping {', '.join(batch)}")
+                state["failed"].update({name: str(e) for name in batch})
+                save_state(state_path, state)
+                continue
+            seconds = time.perf_counter() - t_batch
+            run_images += len(batch)
+            run_seconds += seconds
+            state["done"].extend(batch)
+            for name in batch:
+                state["failed"].pop(name, None)
+            state["images"] += len(batch)
+            state["seconds"] = round(state["seconds"] + seconds, 1)
+            save_state(state_path, state)
+
+            steps = "/".join(str(s["steps"]) for s in report["scales"])
+            print(f"[{i}/{len(batches)}] {len(batch)} x {size[0]}x{size[1]} in {seconds:.1f}s "
+                  f"(steps {steps}), {len(batch) / seconds * 60:.1f} img/min, "
+                  f"run {run_images / run_seconds * 60:.1f} img/min")
+    except KeyboardInterrupt:
+        print("Interrupted; progress is saved, run again to resume")
+
+    if run_seconds:
+        remaining = len(todo) - run_images
+        rate = run_images / run_seconds * 60
+        print(f"Styled {run_images} photos in {run_seconds / 60:.1f} min: {rate:.1f} img/min"
+              + (f", about {remaining / rate:.0f} min left" if remaining and rate else ""))
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the current style to past photos")
+    parser.add_argument("--style", default=style_filter.STYLE_IMAGE_PATH)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="photos per optimisation")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many photos")
+    parser.add_argument("--force", action="store_true",
+                        help="also restyle photos whose style file is newer than the style image")
+    parser.add_argument("--state", default=STATE_FILE, help="progress file for resuming")
+    parser.add_argument("--profile", default=style_filter.DEFAULT_PROFILE,
+                        choices=sorted(style_filter.PROFILES))
+    args = parser.parse_args()
+    if args.batch < 1:
+        parser.error("--batch must be at least 1")
+
+    state = backfill(args.style, args.batch, args.limit, args.force, args.state, args.profile)
+    sys.exit(1 if state["failed"] else 0)
@@ -0,0 +1,201 @@
+# style_cache.py
+# Content-addressed cache of style results, plus the style image's Gram targets.
+#
+# A result is keyed by sha256(content photo) + the backend's parameters, which name
+# the files they depend on (style image, trained model) by content hash too. A retake
+# of the same frame, a second guest with the same photo or a repeat request is then
+# a file copy instead of another optimisation, and a changed style image or changed
+# hyperparameters never return a stale result.
+#
+# Results live under style_cache/results/<key[:2]>/<key>.jpg, bounded by
+# CACHE_MAX_BYTES and evicted least recently used first. style_cache/targets/ holds
+# the Gram matrices of the style image (.npz), so a restart skips that VGG pass.
+# numpy only: importing this never pulls in TensorFlow.
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+CACHE_DIR = "style_cache"
+CACHE_MAX_BYTES = int(os.environ.get("PHOTOBOOTH_STYLE_CACHE_MB", "256")) * 1024 * 1024
+DIGEST_ENTRIES = 20000     # remembered file hashes, checked against (mtime, size)
+
+LOOKUPS = metrics.counter("style_cache_lookups_total", "Style result lookups by result (hit, miss)",
+                          ["result"])
+EVICTIONS = metrics.counter("style_cache_evictions_total", "Style results evicted for space")
+
+_digests = OrderedDict()   # path -> (mtime_ns, size, sha256)
+_digest_lock = threading.Lock()
+
+
+def file_digest(path):
+    # sha256 of a file, re-read only when its mtime or size changes
+    st = os.stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+    with _digest_lock:
+        known = _digests.get(path)
+        if known and known[:2] == version:
+            _digests.move_to_end(path)
+            return known[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+    with _digest_lock:
+        _digests[path] = (*version, digest)
+        while len(_digests) > DIGEST_ENTRIES:
+            _digests.popitem(last=False)
+    return digest
+
+
+def params_key(params):
+    # params: JSON-able dict; paths listed under "files" are replaced by their hashes
+    params = dict(params)
+    params["files"] = [file_digest(p) for p in params.get("files", ())]
+    text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _copy_into_place(src_path, dst_path):
+    os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
+    tmp_path = f"{dst_path}.{threading.get_ident()}.tmp"
+    shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, dst_path)
+
+
+class StyleResultCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.results_dir = os.path.join(cache_dir, "results")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None          # path -> size, least recently used first
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, content_path, params):
+        return hashlib.sha256(
+            f"{file_digest(content_path)}:{params_key(params)}".encode()
+        ).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.results_dir, key[:2], key + ".jpg")
+
+    # ---- lookups ----
+
+    def get(self, key, dst_path):
+        # copy a cached result to dst_path; False on a miss
+        return self.get_first([key], dst_path)
+
+    def get_first(self, keys, dst_path):
+        # like get(), for the first of several acceptable keys that is cached
+        hit = False
+        for path in map(self._path, keys):
+            with self._lock:
+                self._load()
+                if path not in self._entries:
+                    continue
+                self._entries.move_to_end(path)
+            try:
+                _copy_into_place(path, dst_path)
+                os.utime(path)     # keeps the LRU order across restarts
+                hit = True
+                break
+            except FileNotFoundError:
+                with self._lock:
+                    self._total -= self._entries.pop(path, 0)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        LOOKUPS.inc(result="hit" if hit else "miss")
+        return hit
+
+    def put(self, key, src_path):
+        path = self._path(key)
+        _copy_into_place(src_path, path)
+        nbytes = os.path.getsize(path)
+        with self._lock:
+            self._load()
+            self._total += nbytes - self._entries.pop(path, 0)
+            self._entries[path] = nbytes
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+    # ---- bookkeeping ----
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        found = []
+        for dirpath, _, files in os.walk(self.results_dir):
+            for fname in files:
+                if not fname.endswith(".jpg"):
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((st.st_mtime, path, st.st_size))
+        found.sort()
+        self._entries = OrderedDict((path, nbytes) for _, path, nbytes in found)
+        self._total = sum(self._entries.values())
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, nbytes = self._entries.popitem(last=False)
+            self._total -= nbytes
+            self.evictions += 1
+            EVICTIONS.inc()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# ------------ style targets ------------
+
+def targets_path(style_path, params, cache_dir=None):
+    key = hashlib.sha256(
+        f"{file_digest(style_path)}:{params_key(params)}".encode()
+    ).hexdigest()
+    return os.path.join(cache_dir or CACHE_DIR, "targets", key[:32] + ".npz")
+
+
+def load_targets(path):
+    # list of arrays, in layer order, or None if not stored yet
+    try:
+        with np.load(path) as data:
+            return [data[f"t{i}"] for i in range(len(data.files))]
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+
+
+def save_targets(path, arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp.npz"
+    np.savez(tmp_path, **{f"t{i}": np.asarray(a) for i, a in enumerate(arrays)})
+    os.replace(tmp_path, path)
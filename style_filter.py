@@ -1,10 +1,14 @@
 # style_filter.py
 import os
+import time
+import importlib
 import tensorflow as tf
 from tensorflow.keras.applications import vgg19
 import numpy as np
 from PIL import Image
 
+import style_cache
+
 # where your style image + outputs live
 STYLE_IMAGE_PATH = "static/img/hkust_style.png"   # put any style jpg here
 STYLE_OUTPUT_DIR = "photos_style"
@@ -27,6 +31,14 @@ NUM_STEPS      = 200
 LEARNING_RATE  = 0.02
 MAX_DIM        = 512
 
+# coarse-to-fine: optimise at each long-edge size in turn, upsampling in between.
+# Set MULTI_SCALE = False for the old single 512px / 200-step run.
+MULTI_SCALE         = True
+SCALES              = [256, MAX_DIM]
+STEPS_PER_SCALE     = [150, 60]     # upper bound per scale, early stopping usually ends sooner
+MIN_REL_IMPROVEMENT = 2e-3          # stop a scale once the loss improves less than this...
+CHECK_EVERY         = 10            # ...over this many steps
+
 # ------------ utilities ------------
 
 def load_img(path_to_img, max_dim=MAX_DIM):
@@ -41,6 +53,12 @@ def load_img(path_to_img, max_dim=MAX_DIM):
     img = img[tf.newaxis, :]
     return img
 
+def resize_max_dim(img, max_dim):
+    shape = tf.cast(tf.shape(img)[1:3], tf.float32)
+    scale = max_dim / tf.reduce_max(shape)
+    new_shape = tf.cast(tf.round(shape * scale), tf.int32)
+    return tf.image.resize(img, new_shape)
+
 def tensor_to_image(tensor):
     tensor = tensor * 255.0
     tensor = np.array(tensor, dtype=np.uint8)
@@ -55,80 +73,373 @@ def gram_matrix(tensor):
     w = tf.cast(tf.shape(tensor)[2], tf.float32)
     return result / (h * w)
 
-def get_vgg_model():
+def truncate_vgg(vgg, style_layers=STYLE_LAYERS, content_layer=CONTENT_LAYER, precision="float32"):
+    # VGG rebuilt up to the deepest layer the loss reads (later blocks are never run),
+    # optionally computing in reduced precision with float32 weights and outputs
+    wanted = list(style_layers) + [content_layer]
+    layers = [l for l in vgg.layers if not isinstance(l, tf.keras.layers.InputLayer)]
+    last = max(i for i, l in enumerate(layers) if l.name in wanted)
+    policy = None
+    if precision != "float32":
+        policy = tf.keras.mixed_precision.Policy(f"mixed_{precision}")
+
+    inputs = x = tf.keras.Input(shape=(None, None, 3))
+    found = {}
+    for layer in layers[:last + 1]:
+        if policy is None:
+            x = layer(x)
+        else:
+            copy = layer.__class__.from_config({**layer.get_config(), "dtype": policy})
+            x = copy(x)
+            copy.set_weights(layer.get_weights())
+        if layer.name in wanted:
+            found[layer.name] = x
+
+    outputs = []
+    for i, name in enumerate(wanted):
+        out = found[name]
+        if policy is not None or name in wanted[:i]:
+            # float32 for the Gram / loss maths; also keeps every output a distinct tensor
+            out = tf.keras.layers.Activation("linear", dtype="float32", name=f"{name}_out{i}")(out)
+        outputs.append(out)
+    model = tf.keras.Model(inputs, outputs)
+    model.trainable = False
+    return model
+
+def get_vgg_model(style_layers=STYLE_LAYERS, content_layer=CONTENT_LAYER, precision="float32"):
     vgg = vgg19.VGG19(weights="imagenet", include_top=False)
     vgg.trainable = False
-    outputs = [vgg.get_layer(name).output for name in STYLE_LAYERS + [CONTENT_LAYER]]
-    return tf.keras.Model(vgg.input, outputs)
+    return truncate_vgg(vgg, style_layers, content_layer, precision)
 
 # ------------ core logic------------
 
-def run_style_transfer(content_path, style_path, output_path):
-    content_image = load_img(content_path)
+def vgg_preprocess(x):
+    return vgg19.preprocess_input(x * 255.0)
+
+def compute_style_targets(vgg_model, style_path, num_style_layers=len(STYLE_LAYERS)):
     style_image = load_img(style_path)
+    style_targets = vgg_model(vgg_preprocess(style_image))
+    return [gram_matrix(t) for t in style_targets[:num_style_layers]]
 
-    vgg_model = get_vgg_model()
+def style_content_loss(outputs, style_target_features, content_target_features, img,
+                       style_layer_weights=STYLE_LAYER_WEIGHTS):
+    # shared objective: used by the per-photo optimiser and by fast_style training
+    num_style_layers = len(style_layer_weights)
+    style_outputs = outputs[:num_style_layers]
+    content_outputs = outputs[num_style_layers:]
 
-    def vgg_preprocess(x):
-        return vgg19.preprocess_input(x * 255.0)
+    style_loss = 0.0
+    for w, target_gram, out in zip(
+        style_layer_weights, style_target_features, style_outputs
+    ):
+        gram_out = gram_matrix(out)
+        style_loss += w * tf.reduce_mean(tf.square(gram_out - target_gram))
+    style_loss *= STYLE_WEIGHT / sum(style_layer_weights)
 
-    style_targets = vgg_model(vgg_preprocess(style_image))
-    content_targets = vgg_model(vgg_preprocess(content_image))
+    content_loss = 0.0
+    for t_c, o_c in zip(content_target_features, content_outputs):
+        content_loss += tf.reduce_mean(tf.square(o_c - t_c))
+    content_loss *= CONTENT_WEIGHT
+
+    tv_loss = tf.image.total_variation(img)
+    tv_loss = TV_WEIGHT * tf.reduce_mean(tv_loss)
 
-    num_style_layers = len(STYLE_LAYERS)
-    style_target_features = [gram_matrix(t) for t in style_targets[:num_style_layers]]
-    content_target_features = content_targets[num_style_layers:]
+    return style_loss + content_loss + tv_loss
 
+def make_loss_fn(vgg_model, style_target_features, style_layer_weights=STYLE_LAYER_WEIGHTS):
     @tf.function
-    def compute_loss_and_grads(img_var):
+    def compute_loss_and_grads(img_var, content_target_features):
         with tf.GradientTape() as tape:
             outputs = vgg_model(vgg_preprocess(img_var))
-            style_outputs = outputs[:num_style_layers]
-            content_outputs = outputs[num_style_layers:]
+            total_loss = style_content_loss(
+                outputs, style_target_features, content_target_features, img_var,
+                style_layer_weights,
+            )
 
-            style_loss = 0.0
-            for w, target_gram, out in zip(
-                STYLE_LAYER_WEIGHTS, style_target_features, style_outputs
-            ):
-                gram_out = gram_matrix(out)
-                style_loss += w * tf.reduce_mean(tf.square(gram_out - target_gram))
-            style_loss *= STYLE_WEIGHT / sum(STYLE_LAYER_WEIGHTS)
+        grads = tape.gradient(total_loss, img_var)
+        return grads, total_loss
 
-            content_loss = 0.0
-            for t_c, o_c in zip(content_target_features, content_outputs):
-                content_loss += tf.reduce_mean(tf.square(o_c - t_c))
-            content_loss *= CONTENT_WEIGHT
+    return compute_loss_and_grads
 
-            tv_loss = tf.image.total_variation(img_var)
-            tv_loss = TV_WEIGHT * tf.reduce_mean(tv_loss)
+# ------------ quality profiles ------------
+# Cheaper settings for when the style queue is long: resolution, step budget, the VGG
+# layers the loss reads (the network is cut after the deepest one) and the precision
+# VGG computes in. "high" is the schedule above. Time and peak memory of each on the
+# board: python benchmarks/bench_profiles.py --vgg
+#
+# Every profile computes in float32 unless PHOTOBOOTH_PREVIEW_PRECISION=bfloat16 is set:
+# bfloat16 convolutions may be slower than float32 on a CPU without native support
+# (or unsupported), so turn it on only after bench_profiles.py --precision bfloat16
+# has shown it is faster on the board.
+PREVIEW_PRECISION = os.environ.get("PHOTOBOOTH_PREVIEW_PRECISION", "float32")
 
-            total_loss = style_loss + content_loss + tv_loss
+PROFILES = {   # best first
+    "high": {
+        "scales": SCALES,
+        "steps_per_scale": STEPS_PER_SCALE,
+        "min_rel_improvement": MIN_REL_IMPROVEMENT,
+        "style_layers": STYLE_LAYERS,
+        "style_layer_weights": STYLE_LAYER_WEIGHTS,
+        "content_layer": CONTENT_LAYER,
+        "precision": "float32",
+    },
+    "standard": {
+        "scales": [256, 384],
+        "steps_per_scale": [120, 40],
+        "min_rel_improvement": MIN_REL_IMPROVEMENT,
+        "style_layers": STYLE_LAYERS,
+        "style_layer_weights": STYLE_LAYER_WEIGHTS,
+        "content_layer": CONTENT_LAYER,
+        "precision": "float32",
+    },
+    "preview": {
+        "scales": [256],
+        "steps_per_scale": [80],
+        "min_rel_improvement": 4e-3,
+        "style_layers": STYLE_LAYERS[:4],          # VGG stops after block4_conv1
+        "style_layer_weights": STYLE_LAYER_WEIGHTS[:4],
+        "content_layer": "block4_conv1",
+        "precision": PREVIEW_PRECISION,
+    },
+}
+DEFAULT_PROFILE = "high"
 
-        grads = tape.gradient(total_loss, img_var)
-        return grads, total_loss
+class StyleModel:
+    # VGG19 + precomputed style Gram targets, built once and reused across photos
+    def __init__(self, style_path=STYLE_IMAGE_PATH, profile=None):
+        settings = PROFILES[profile or DEFAULT_PROFILE]
+        self.style_path = style_path
+        self.style_layers = list(settings["style_layers"])
+        self.style_layer_weights = list(settings["style_layer_weights"])
+        self.content_layer = settings["content_layer"]
+        self.precision = settings["precision"]
+        self.vgg_model = get_vgg_model(self.style_layers, self.content_layer, self.precision)
+        self.style_mtime = None
+        self.refresh_style()
+
+    def refresh_style(self):
+        # cheap stat so swapping the style image doesn't need a restart
+        mtime = os.path.getmtime(self.style_path)
+        if mtime == self.style_mtime:
+            return
+        self.style_target_features = self._load_style_targets()
+        self.loss_fn = make_loss_fn(self.vgg_model, self.style_target_features,
+                                    self.style_layer_weights)
+        self.style_mtime = mtime
 
-    stylized_var = tf.Variable(content_image, dtype=tf.float32)
+    def _load_style_targets(self):
+        # Gram targets are stored per (style image, layers, network), so a restart
+        # doesn't run the style image through VGG again
+        path = style_cache.targets_path(self.style_path, {
+            "layers": self.style_layers,
+            "precision": self.precision,
+            "max_dim": MAX_DIM,
+            "vgg_params": int(self.vgg_model.count_params()),
+        })
+        arrays = style_cache.load_targets(path)
+        if arrays is not None:
+            return [tf.constant(a) for a in arrays]
+        targets = compute_style_targets(self.vgg_model, self.style_path, len(self.style_layers))
+        try:
+            style_cache.save_targets(path, [t.numpy() for t in targets])
+        except OSError as e:
+            print("Could not store style targets:", e)
+        return targets
+
+def optimize_at_scale(style_model, content_image, init_image, max_steps, min_rel_improvement,
+                      on_step=None):
+    content_targets = style_model.vgg_model(vgg_preprocess(content_image))
+    content_target_features = content_targets[len(style_model.style_layers):]
+    compute_loss_and_grads = style_model.loss_fn
+
+    stylized_var = tf.Variable(init_image, dtype=tf.float32)
+    # best image and its loss stay on-device: the host reads the loss only at the
+    # early-stopping checks, not on every step
+    best_var = tf.Variable(init_image, dtype=tf.float32)
+    best_loss_var = tf.Variable(float("inf"), dtype=tf.float32)
     optimizer = tf.optimizers.Adam(learning_rate=LEARNING_RATE)
 
-    best_img = None
-    best_loss = float("inf")
+    @tf.function
+    def keep_best(total_loss):
+        if total_loss < best_loss_var:
+            best_loss_var.assign(total_loss)
+            best_var.assign(stylized_var)
+
+    last_check_loss = float("inf")
+    steps = 0
 
-    for step in range(1, NUM_STEPS + 1):
-        grads, total_loss = compute_loss_and_grads(stylized_var)
+    for step in range(1, max_steps + 1):
+        grads, total_loss = compute_loss_and_grads(stylized_var, content_target_features)
         optimizer.apply_gradients([(grads, stylized_var)])
         stylized_var.assign(tf.clip_by_value(stylized_var, 0.0, 1.0))
+        keep_best(tf.cast(total_loss, tf.float32))
+        steps = step
+        if on_step is not None:
+            on_step(step)
 
-        if total_loss < best_loss:
-            best_loss = total_loss
-            best_img = stylized_var.numpy()
+        if min_rel_improvement > 0 and step % CHECK_EVERY == 0:
+            best_loss = float(best_loss_var)
+            if last_check_loss != float("inf"):
+                rel = (last_check_loss - best_loss) / max(abs(last_check_loss), 1e-12)
+                if rel < min_rel_improvement:
+                    break
+            last_check_loss = best_loss
 
-    final_pil = tensor_to_image(best_img)
+    return best_var, float(best_loss_var), steps
+
+def default_schedule(scales=None, steps_per_scale=None, min_rel_improvement=None, profile=None):
+    if profile is not None:
+        settings = PROFILES[profile]
+        scales = scales or settings["scales"]
+        steps_per_scale = steps_per_scale or settings["steps_per_scale"]
+        if min_rel_improvement is None:
+            min_rel_improvement = settings["min_rel_improvement"]
+    if scales is None:
+        scales = SCALES if MULTI_SCALE else [MAX_DIM]
+    if steps_per_scale is None:
+        steps_per_scale = STEPS_PER_SCALE if MULTI_SCALE else [NUM_STEPS]
+    if min_rel_improvement is None:
+        min_rel_improvement = MIN_REL_IMPROVEMENT if MULTI_SCALE else 0.0
+    return scales, steps_per_scale, min_rel_improvement
+
+def optimize_multiscale(style_model, full_image, scales, steps_per_scale,
+                        min_rel_improvement, progress=None):
+    # full_image: [batch, h, w, 3] at max(scales). Photos of the same size can be
+    # stacked into one batch: every loss term is per image, and Adam ignores the
+    # 1/batch scale of the mean, so each photo is optimised as it would be alone
+    # (early stopping looks at the batch total). Returns (images, report).
+    run_report = {"scales": [], "total_seconds": 0.0}
+    t_start = time.perf_counter()
+
+    current = None
+    for i, (size, max_steps) in enumerate(zip(scales, steps_per_scale)):
+        t_scale = time.perf_counter()
+        steps_before = sum(s["steps"] for s in run_report["scales"])
+        budget = steps_before + sum(steps_per_scale[i:])
+        on_step = None
+        if progress is not None:
+            on_step = lambda step, size=size: progress(steps_before + step, budget, size)
+
+        content_image = resize_max_dim(full_image, size)
+        if current is None:
+            init_image = content_image
+        else:
+            init_image = tf.image.resize(current, tf.shape(content_image)[1:3])
+
+        current, loss, steps = optimize_at_scale(
+            style_model, content_image, init_image, max_steps, min_rel_improvement, on_step
+        )
+        run_report["scales"].append({
+            "size": int(size),
+            "steps": steps,
+            "max_steps": max_steps,
+            "loss": loss,
+            "seconds": round(time.perf_counter() - t_scale, 3),
+        })
+
+    run_report["total_seconds"] = round(time.perf_counter() - t_start, 3)
+    run_report["total_steps"] = sum(s["steps"] for s in run_report["scales"])
+    return current, run_report
+
+def run_style_transfer(content_path, style_path, output_path, style_model=None,
+                       scales=None, steps_per_scale=None,
+                       min_rel_improvement=None, report=None, progress=None, profile=None):
+    # progress(step, max_steps, size) is called after every optimiser step; max_steps
+    # is an upper bound that shrinks as early stopping skips work. profile: a PROFILES
+    # key for the schedule (and network, when style_model isn't given)
+    if style_model is None or style_model.style_path != style_path:
+        style_model = StyleModel(style_path, profile)
+
+    scales, steps_per_scale, min_rel_improvement = default_schedule(
+        scales, steps_per_scale, min_rel_improvement, profile)
+    full_image = load_img(content_path, max_dim=max(scales))
+    current, run_report = optimize_multiscale(
+        style_model, full_image, scales, steps_per_scale, min_rel_improvement, progress
+    )
+    print("Style run:", ", ".join(
+        f"{s['size']}px {s['steps']}/{s['max_steps']} steps {s['seconds']}s"
+        for s in run_report["scales"]
+    ))
+    if report is not None:
+        report.update(run_report)
+
+    final_pil = tensor_to_image(current.numpy())
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     final_pil.save(output_path)
     return output_path
 
+# ------------ backends ------------
+# A backend turns one content photo into one stylised file:
+#   backend.refresh()                                  pick up a changed style image
+#   backend.stylize(content_path, output_path, report=None, **kwargs)
+#   backend.cache_params(profile=None)                 what the result depends on, for
+#                                                      style_cache (files by content)
+# Backends with a `profiles` tuple (best first) also take stylize(..., profile=name).
+# Entries are "module:Class" and imported on first use, so unused backends cost nothing.
+
+STYLE_BACKENDS = {
+    "quality": "style_filter:QualityBackend",   # per-photo optimisation (this file)
+    "fast": "fast_style:FastBackend",           # feed-forward network, one pass
+}
+DEFAULT_BACKEND = "quality"
+
+def register_backend(name, target):
+    STYLE_BACKENDS[name] = target
+
+def load_backend(name=DEFAULT_BACKEND):
+    if name not in STYLE_BACKENDS:
+        raise ValueError(f"unknown style backend: {name}")
+    module_name, class_name = STYLE_BACKENDS[name].split(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)()
+
+class QualityBackend:
+    name = "quality"
+    profiles = tuple(PROFILES)
+
+    def __init__(self, style_path=STYLE_IMAGE_PATH):
+        self.style_path = style_path
+        self._models = {}   # (layers, content layer, precision) -> StyleModel
+        self.style_model = self.model_for(DEFAULT_PROFILE)
+
+    def model_for(self, profile):
+        # profiles that differ only in schedule share one network
+        settings = PROFILES[profile]
+        key = (tuple(settings["style_layers"]), settings["content_layer"], settings["precision"])
+        model = self._models.get(key)
+        if model is None:
+            model = self._models[key] = StyleModel(self.style_path, profile)
+        return model
+
+    def refresh(self):
+        for model in self._models.values():
+            model.refresh_style()
+
+    def cache_params(self, profile=None):
+        profile = profile or DEFAULT_PROFILE
+        settings = PROFILES[profile]
+        return {
+            "backend": self.name,
+            "profile": profile,
+            "files": [self.style_path],
+            **settings,
+            "check_every": CHECK_EVERY,
+            "weights": [STYLE_WEIGHT, CONTENT_WEIGHT, TV_WEIGHT, LEARNING_RATE],
+        }
+
+    def stylize(self, content_path, output_path, report=None, profile=None, **kwargs):
+        profile = profile or DEFAULT_PROFILE
+        model = self.model_for(profile)
+        model.refresh_style()
+        if report is not None:
+            report["profile"] = profile
+        return run_style_transfer(content_path, self.style_path, output_path,
+                                  style_model=model, report=report, profile=profile, **kwargs)
+
 # helper: run on latest photo with fixed style
-def run_style_on_latest(content_path, output_basename):
+def run_style_on_latest(content_path, output_basename, backend=None, **kwargs):
     os.makedirs(STYLE_OUTPUT_DIR, exist_ok=True)
     out_path = os.path.join(STYLE_OUTPUT_DIR, output_basename)
-    return run_style_transfer(content_path, STYLE_IMAGE_PATH, out_path)
+    if backend is None or isinstance(backend, str):
+        backend = load_backend(backend or DEFAULT_BACKEND)
+    return backend.stylize(content_path, out_path, **kwargs)
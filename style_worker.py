@@ -0,0 +1,324 @@
+# style_worker.py
+# One long-lived thread that owns the style backends (VGG model, fast network)
+# and runs style jobs one at a time.
+#
+# The style module (and with it TensorFlow) can be passed by name; it is then
+# imported on the worker thread, so the web server answers requests while it loads.
+#
+# When several kiosks share the server, each booth has its own queue and the worker
+# takes jobs from the booths in turn, so a busy booth can't starve a quiet one.
+#
+# With a style_cache.StyleResultCache, a photo whose result is already cached (same
+# content, style and parameters) is copied into place instead of being optimised:
+# right at submit() once the backend's parameters are known, else on the worker.
+#
+# Backends with quality profiles (style_filter: high / standard / preview) get one per
+# job. Unless the job asks for one, the worker takes the best profile whose recent
+# job time, times the guests waiting, still fits in target_wait seconds.
+import os
+import time
+import importlib
+import threading
+import traceback
+from collections import OrderedDict
+
+import metrics
+
+MAX_PENDING = 4          # per booth
+DEFAULT_BOOTH = "default"
+TARGET_WAIT = float(os.environ.get("PHOTOBOOTH_STYLE_TARGET_WAIT", "180"))  # seconds
+LATENCY_WEIGHT = 0.3     # of the newest job in the running average per profile
+
+PHASE_SECONDS = metrics.histogram("style_phase_seconds",
+                                  "Time a style job spends queued, loading and optimizing", ["phase"])
+JOBS = metrics.counter("style_jobs_total", "Style jobs by outcome (done, cached, error, dropped)", ["outcome"])
+STEPS = metrics.counter("style_steps_total", "Optimiser / network steps run", ["backend"])
+STEP_RATE = metrics.gauge("style_steps_per_second", "Step rate of the running (or last) job")
+PROFILE_PICKS = metrics.counter("style_profile_jobs_total", "Style jobs run per quality profile",
+                                ["profile"])
+
+
+class StyleWorker:
+    def __init__(self, style_module, max_pending=MAX_PENDING, on_status=None,
+                 cache=None, output_dir="photos_style", target_wait=TARGET_WAIT):
+        # style_module: the style_filter module, or its name to import lazily
+        self._style_module = style_module
+        self.cache = cache
+        self.output_dir = output_dir   # where style_module writes results
+        self.target_wait = target_wait
+        # requested backend name -> {profile: params} of the backend that ran, best first
+        self._cache_params = {}
+        self._profile_seconds = {}     # profile -> running average of optimizing time
+        self._import_lock = threading.Lock()
+        self.max_pending = max_pending
+        self.on_status = on_status or (lambda *args, **kwargs: None)
+
+        self._cond = threading.Condition()
+        # booth -> OrderedDict(content_path -> (out_name, backend, params already
+        # looked up in the cache)), oldest first; booths in the order they are served next
+        self._queues = OrderedDict()
+        self._booth_of = {}            # content_path -> booth, for queued jobs
+        self._queued_at = {}           # content_path -> monotonic submit time
+        self._current = None
+        self._thread = None
+        self._accepting = True
+        self.backends = {}  # name -> loaded backend, each built once
+        self.last_report = None
+
+    @property
+    def style_module(self):
+        if isinstance(self._style_module, str):
+            with self._import_lock:
+                if isinstance(self._style_module, str):
+                    t0 = time.perf_counter()
+                    self._style_module = importlib.import_module(self._style_module)
+                    print(f"Imported {self._style_module.__name__} in "
+                          f"{time.perf_counter() - t0:.1f}s")
+        return self._style_module
+
+    # ---- public API ----
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="style-worker", daemon=True)
+            self._thread.start()
+
+    def submit(self, content_path, out_name, backend=None, booth=None, profile=None):
+        # Returns the job's position: 0 = running now, 1.. = waiting in the queue,
+        # None if the result came from the cache (already in place) or the worker is
+        # shutting down and takes no new jobs. profile None = picked from the queue.
+        booth = booth or DEFAULT_BOOTH
+        checked = self._cache_candidates(backend, profile)
+        if self._from_cache(content_path, out_name, checked):
+            return None
+        self.start()
+        with self._cond:
+            if not self._accepting:
+                return None
+            if self._current and self._current[0] == content_path:
+                return 0
+            if content_path in self._booth_of:
+                return self._position_locked(content_path)
+
+            queue = self._queues.setdefault(booth, OrderedDict())
+            if len(queue) >= self.max_pending:
+                # this booth's oldest guest has most likely walked away already
+                dropped_path, (dropped_out, *_) = queue.popitem(last=False)
+                self._booth_of.pop(dropped_path, None)
+                self._queued_at.pop(dropped_path, None)
+                JOBS.inc(outcome="dropped")
+                print(f"Style queue for booth '{booth}' full, dropping", dropped_path)
+                self.on_status("dropped", dropped_out, phase="dropped")
+
+            # None = the style module's default, resolved on the worker thread
+            queue[content_path] = (out_name, backend, profile, checked)
+            self._booth_of[content_path] = booth
+            self._queued_at[content_path] = time.monotonic()
+            self.on_status("queued", out_name, phase="queued", booth=booth)
+            self._cond.notify_all()
+            return self._position_locked(content_path)
+
+    def position(self, content_path):
+        with self._cond:
+            if self._current and self._current[0] == content_path:
+                return 0
+            if content_path in self._booth_of:
+                return self._position_locked(content_path)
+            return None
+
+    def drain(self, timeout=None):
+        # stop taking new jobs and wait for the queued and running ones to finish;
+        # False if they were still going after `timeout` seconds
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._accepting = False
+            while self._booth_of or self._current:
+                if self._thread is None:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._booth_of) + (1 if self._current else 0)
+
+    def stats(self):
+        with self._cond:
+            order = self._service_order_locked()
+            return {
+                "running": self._current[1] if self._current else None,
+                "pending": [self._queues[booth][path][0] for path, booth in order],
+                "booths": {booth: len(queue) for booth, queue in self._queues.items()},
+                "depth": len(order) + (1 if self._current else 0),
+                "backends_loaded": sorted(self.backends),
+                "profile_seconds": {p: round(s, 1) for p, s in self._profile_seconds.items()},
+                "target_wait": self.target_wait,
+                "cache": self.cache.stats() if self.cache else None,
+                "accepting": self._accepting,
+                "last_report": self.last_report,
+            }
+
+    # ---- worker thread ----
+
+    def _service_order_locked(self):
+        # queued jobs as [(content_path, booth)] in the order the worker will run them
+        queues = [(booth, list(queue)) for booth, queue in self._queues.items()]
+        order = []
+        for i in range(max((len(paths) for _, paths in queues), default=0)):
+            order.extend((paths[i], booth) for booth, paths in queues if i < len(paths))
+        return order
+
+    def _position_locked(self, content_path):
+        return [path for path, _ in self._service_order_locked()].index(content_path) + 1
+
+    def _next_job_locked(self):
+        # oldest job of the booth whose turn it is; that booth then goes to the back
+        booth, queue = next(iter(self._queues.items()))
+        content_path, job = queue.popitem(last=False)
+        if queue:
+            self._queues.move_to_end(booth)
+        else:
+            del self._queues[booth]
+        del self._booth_of[content_path]
+        return content_path, job
+
+    def _cache_key(self, content_path, params):
+        if self.cache is None or params is None:
+            return None
+        try:
+            return self.cache.key(content_path, params)
+        except OSError as e:
+            print("Style cache key failed:", e)
+            return None
+
+    def _cache_candidates(self, backend_name, profile):
+        # params whose cached result would do for this job: any profile if it has none
+        known = self._cache_params.get(backend_name)
+        if not known:
+            return []
+        if profile is not None:
+            return [known[profile]] if profile in known else []
+        return list(known.values())
+
+    def _from_cache(self, content_path, out_name, candidates):
+        keys = [k for k in (self._cache_key(content_path, p) for p in candidates) if k]
+        if not keys or not self.cache.get_first(keys, os.path.join(self.output_dir, out_name)):
+            return False
+        JOBS.inc(outcome="cached")
+        self.on_status("done", out_name, phase="cached")
+        return True
+
+    def _get_backend(self, name):
+        backend = self.backends.get(name)
+        if backend is not None:
+            backend.refresh()
+            return backend
+        try:
+            print(f"Loading style backend '{name}'...")
+            backend = self.style_module.load_backend(name)
+        except Exception as e:
+            default = self.style_module.DEFAULT_BACKEND
+            if name == default:
+                raise
+            print(f"Style backend '{name}' unavailable ({e}), using '{default}'")
+            return self._get_backend(default)
+        print(f"✓ style backend '{name}' ready")
+        self.backends[name] = backend
+        return backend
+
+    def _pick_profile(self, profiles, waiting):
+        # best profile whose recent job time fits everyone in line into target_wait;
+        # a profile without a finished job yet gets a try, which measures it
+        for name in profiles:
+            seconds = self._profile_seconds.get(name)
+            if seconds is None or (waiting + 1) * seconds <= self.target_wait:
+                return name
+        return profiles[-1]
+
+    def _record_profile_time(self, profile, seconds):
+        old = self._profile_seconds.get(profile)
+        self._profile_seconds[profile] = (
+            seconds if old is None else old + LATENCY_WEIGHT * (seconds - old))
+
+    def _progress_reporter(self, out_name, backend_name):
+        started = time.monotonic()
+
+        def progress(step, max_steps, size=None):
+            elapsed = time.monotonic() - started
+            STEPS.inc(backend=backend_name)
+            if elapsed > 0:
+                STEP_RATE.set(round(step / elapsed, 2))
+            eta = elapsed / step * max(max_steps - step, 0) if step else None
+            self.on_status("running", out_name, phase="optimizing", step=step,
+                           max_steps=max_steps, size=size,
+                           eta_seconds=round(eta, 1) if eta is not None else None)
+
+        return progress
+
+    def _run(self):
+        try:
+            self._get_backend(self.style_module.DEFAULT_BACKEND)
+        except Exception as e:
+            print("Style model failed to load:", e)
+            traceback.print_exc()
+
+        while True:
+            with self._cond:
+                while not self._booth_of:
+                    self._cond.wait()
+                content_path, (out_name, backend_name, profile, checked) = self._next_job_locked()
+                waiting = len(self._booth_of)
+                queued_at = self._queued_at.pop(content_path, None)
+                self._current = (content_path, out_name)
+            if queued_at is not None:
+                PHASE_SECONDS.observe(time.monotonic() - queued_at, phase="queued")
+
+            self.on_status("running", out_name, phase="loading")
+            try:
+                with PHASE_SECONDS.time(phase="loading"):
+                    backend = self._get_backend(backend_name or self.style_module.DEFAULT_BACKEND)
+                profiles = getattr(backend, "profiles", None)
+                options = {}
+                if profiles:
+                    profile = options["profile"] = profile or self._pick_profile(profiles, waiting)
+                    PROFILE_PICKS.inc(profile=profile)
+                if hasattr(backend, "cache_params"):
+                    self._cache_params[backend_name] = (
+                        {p: backend.cache_params(p) for p in profiles} if profiles
+                        else {None: backend.cache_params()})
+                params = self._cache_params.get(backend_name, {}).get(options.get("profile"))
+                if params is not None and params not in checked and \
+                        self._from_cache(content_path, out_name, [params]):
+                    continue
+                self.on_status("running", out_name, phase="optimizing", **options)
+                report = {"filename": out_name, "backend": backend.name}
+                t_optimize = time.monotonic()
+                with PHASE_SECONDS.time(phase="optimizing"):
+                    self.style_module.run_style_on_latest(
+                        content_path, out_name, backend=backend, report=report,
+                        progress=self._progress_reporter(out_name, backend.name), **options
+                    )
+                if profiles:
+                    self._record_profile_time(profile, time.monotonic() - t_optimize)
+                self.last_report = report
+                key = self._cache_key(content_path, params)
+                if key is not None:
+                    try:
+                        self.cache.put(key, os.path.join(self.output_dir, out_name))
+                    except OSError as e:
+                        print("Could not cache style result:", e)
+                JOBS.inc(outcome="done")
+                self.on_status("done", out_name, phase="finished")
+            except Exception as e:
+                JOBS.inc(outcome="error")
+                print("Style job failed:", e)
+                self.on_status("error", out_name, phase="error")
+            finally:
+                with self._cond:
+                    self._current = None
+                    self._cond.notify_all()   # wake drain()
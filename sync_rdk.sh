@@ -1,13 +1,24 @@
 #!/bin/bash
+# Fallback only: rdk_uploader.py on the RDK pushes new photos as soon as they are
+# taken (see readme). Use this polling loop if the uploader can't reach the server.
 
 RDK_USER=sunrise
 RDK_IP=192.168.127.10
 RDK_DIR=/home/sunrise/ISDN3000C_Final_Project
 LOCAL_DIR=/Users/shalini/Downloads/ISDN3000C_Flask
 
+ARCHIVED=$LOCAL_DIR/photos_archive/synced_names.txt
+
 while true; do
-  rsync -av --delete $RDK_USER@$RDK_IP:$RDK_DIR/photos/         $LOCAL_DIR/photos/
-  rsync -av --delete $RDK_USER@$RDK_IP:$RDK_DIR/photos_bw/      $LOCAL_DIR/photos_bw/
-  rsync -av --delete $RDK_USER@$RDK_IP:$RDK_DIR/photos_vintage/ $LOCAL_DIR/photos_vintage/
+  # photos moved into pack files (photo_archive.py) must not be copied back
+  mkdir -p "$LOCAL_DIR/photos_archive"
+  (cd "$LOCAL_DIR" && python3 photo_archive.py --list > "$ARCHIVED.tmp") && mv "$ARCHIVED.tmp" "$ARCHIVED"
+  touch "$ARCHIVED"
+  # no --delete anywhere: the app writes face sidecars next to the photos
+  # (face_indexer.py) and its own B&W / vintage versions (image_filters.py);
+  # --ignore-existing keeps the server's sidecars, photos are never rewritten
+  rsync -av --ignore-existing --exclude-from="$ARCHIVED" $RDK_USER@$RDK_IP:$RDK_DIR/photos/         $LOCAL_DIR/photos/
+  rsync -av --exclude-from="$ARCHIVED" $RDK_USER@$RDK_IP:$RDK_DIR/photos_bw/      $LOCAL_DIR/photos_bw/
+  rsync -av --exclude-from="$ARCHIVED" $RDK_USER@$RDK_IP:$RDK_DIR/photos_vintage/ $LOCAL_DIR/photos_vintage/
   sleep 10
 done
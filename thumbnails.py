@@ -0,0 +1,249 @@
+# thumbnails.py
+# Reduced-size variants of booth photos, cached on disk.
+#
+# Variants are made on ingest (photo index notification) or lazily on first request,
+# and live under photos_cache/<size>/<kind>/<filename>. The cache is bounded by
+# CACHE_MAX_BYTES and evicts the least recently served files first. Photos moved into
+# pack files (photo_archive.py) are read from there when their variant is gone.
+#
+#   python thumbnails.py --backfill      # generate every missing variant, all cores
+#                                        # (archived photos too, read from their packs)
+import os
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from PIL import Image
+
+import metrics
+import photo_archive
+
+CACHE_DIR = "photos_cache"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+JPEG_QUALITY = 80
+
+# long-edge pixels; pages pick the smallest one that fits their layout
+SIZES = {
+    "thumb": 240,    # gallery grid (90x120 css px, 2x for phone screens)
+    "screen": 960,   # preview / filters / compare / finalize / qr panels
+}
+
+KIND_DIRS = {
+    "original": "photos",
+    "bw": "photos_bw",
+    "vintage": "photos_vintage",
+    "style": "photos_style",
+}
+
+LOOKUPS = metrics.counter("thumbnail_lookups_total",
+                          "Variant lookups by result (hit, miss, original)", ["result"])
+GENERATE_SECONDS = metrics.histogram("thumbnail_generate_seconds", "Time to make one variant", ["size"])
+
+
+def variant_path(size, kind, filename):
+    return os.path.join(CACHE_DIR, size, kind, filename)
+
+
+def make_variant(src_path, dst_path, max_dim):
+    with Image.open(src_path) as img:
+        # JPEG draft mode decodes straight at 1/2, 1/4 or 1/8 scale
+        img.draft("RGB", (max_dim, max_dim))
+        img = img.convert("RGB")
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    os.replace(tmp_path, dst_path)
+    return dst_path
+
+
+def _make_variant_job(args):
+    src_path, dst_path, max_dim = args
+    try:
+        with Image.open(src_path) as img:
+            if max(img.size) <= max_dim:
+                return None, 0  # served as-is, no variant needed
+        make_variant(src_path, dst_path, max_dim)
+        return dst_path, os.path.getsize(dst_path)
+    except Exception as e:
+        print("Thumbnail failed for", src_path, e)
+        return None, 0
+
+
+class ThumbnailCache:
+    def __init__(self, kind_dirs=KIND_DIRS, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                 archive=None):
+        self.kind_dirs = kind_dirs
+        self.archive = archive        # photo_archive.PhotoArchive, for archived sources
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None          # path -> size, least recently served first
+        self._total = 0
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbs")
+
+    # ---- lookups ----
+
+    def get(self, size, kind, filename):
+        # path of the variant (generated if needed), or the original if it's already small;
+        # for an archived original that path doesn't exist, serve it through the archive
+        if size not in SIZES or kind not in self.kind_dirs:
+            return None
+        src_path = os.path.join(self.kind_dirs[kind], filename)
+        dst_path = os.path.join(self.cache_dir, size, kind, filename)
+
+        with self._lock:
+            self._load()
+            if dst_path in self._entries:
+                self._entries.move_to_end(dst_path)
+                if self._is_current(dst_path, src_path):
+                    LOOKUPS.inc(result="hit")
+                    return dst_path
+                self._total -= self._entries.pop(dst_path)
+
+        source = src_path
+        if not os.path.exists(src_path):
+            source = self.archive.open(kind, filename) if self.archive else None
+            if source is None:
+                return None
+        try:
+            if self._is_small(source, SIZES[size]):
+                LOOKUPS.inc(result="original")
+                return src_path
+            if source is not src_path:
+                source.seek(0)
+            LOOKUPS.inc(result="miss")
+            with GENERATE_SECONDS.time(size=size):
+                make_variant(source, dst_path, SIZES[size])
+        finally:
+            if source is not src_path:
+                source.close()
+        self._add(dst_path)
+        return dst_path
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            return {"files": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+    # ---- generation ----
+
+    def generate_async(self, kind, filename):
+        # used from photo index notifications: never block the caller
+        for size in SIZES:
+            self._pool.submit(self._safe_get, size, kind, filename)
+
+    def backfill(self, workers=None):
+        jobs = []
+        for kind, src_dir in self.kind_dirs.items():
+            if not os.path.isdir(src_dir):
+                continue
+            for fname in sorted(os.listdir(src_dir)):
+                if not fname.endswith(".jpg"):
+                    continue
+                src_path = os.path.join(src_dir, fname)
+                for size, max_dim in SIZES.items():
+                    dst_path = os.path.join(self.cache_dir, size, kind, fname)
+                    if not self._is_current(dst_path, src_path):
+                        jobs.append((src_path, dst_path, max_dim))
+
+        # archived photos have no source path for the pool: made here through get()
+        archived = []
+        if self.archive is not None:
+            for kind in self.kind_dirs:
+                for fname in self.archive.archived(kind):
+                    for size in SIZES:
+                        if not os.path.exists(os.path.join(self.cache_dir, size, kind, fname)):
+                            archived.append((size, kind, fname))
+
+        print(f"Generating {len(jobs)} variants, {len(archived)} for archived photos...")
+        t0 = time.perf_counter()
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for dst_path, nbytes in pool.map(_make_variant_job, jobs, chunksize=16):
+                if dst_path:
+                    self._add(dst_path, nbytes)
+                    done += 1
+        for size, kind, fname in archived:
+            path = self.get(size, kind, fname)
+            if path and path.startswith(self.cache_dir + os.sep):
+                done += 1
+        elapsed = time.perf_counter() - t0
+        print(f"Generated {done} variants in {elapsed:.1f}s")
+        return done
+
+    # ---- cache bookkeeping ----
+
+    def _safe_get(self, size, kind, filename):
+        try:
+            self.get(size, kind, filename)
+        except Exception as e:
+            print("Thumbnail failed for", kind, filename, e)
+
+    def _is_current(self, dst_path, src_path):
+        # a derivative rewritten under the same name (style / filter backfill) makes
+        # its variants stale; an archived source no longer changes
+        try:
+            made = os.path.getmtime(dst_path)
+        except FileNotFoundError:
+            return False
+        try:
+            return os.path.getmtime(src_path) <= made
+        except FileNotFoundError:
+            return True
+
+    def _is_small(self, src_path, max_dim):
+        with Image.open(src_path) as img:
+            return max(img.size) <= max_dim
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        found = []
+        for dirpath, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                if fname.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((st.st_atime, path, st.st_size))
+        found.sort()
+        self._entries = OrderedDict((path, nbytes) for _, path, nbytes in found)
+        self._total = sum(self._entries.values())
+
+    def _add(self, path, nbytes=None):
+        if nbytes is None:
+            nbytes = os.path.getsize(path)
+        with self._lock:
+            self._load()
+            self._total += nbytes - self._entries.pop(path, 0)
+            self._entries[path] = nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, nbytes = self._entries.popitem(last=False)
+            self._total -= nbytes
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate cached photo variants")
+    parser.add_argument("--backfill", action="store_true", help="generate all missing variants")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    archive = None
+    if os.path.exists(photo_archive.DEFAULT_DB):
+        archive = photo_archive.PhotoArchive(KIND_DIRS, photo_archive.DEFAULT_DB)
+    cache = ThumbnailCache(archive=archive)
+    if args.backfill:
+        cache.backfill(args.workers)
+    print(cache.stats())
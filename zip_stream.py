@@ -0,0 +1,57 @@
+# zip_stream.py
+# ZIP archives streamed straight from files on disk, for the photo bundle download.
+#
+# zipfile writes to an object that can't seek or tell by putting each entry's size and
+# CRC in a data descriptor after its data, so the archive can be generated front to
+# back: the response yields every chunk as soon as zipfile has written it. Nothing is
+# staged in a temp file and memory stays at about one chunk whatever the bundle size.
+# Entries are stored, not deflated: JPEGs don't get smaller.
+import os
+import time
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _Sink:
+    # write-only file object: collects what zipfile writes until the generator takes it
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    # entries: iterable of (name in the archive, path on disk or an open binary file
+    # with an .mtime, e.g. photo_archive.MemberFile); yields bytes
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for arcname, path in entries:
+            if isinstance(path, str):
+                try:
+                    src = open(path, "rb")
+                except FileNotFoundError:
+                    continue    # removed since the bundle was listed
+                mtime = os.fstat(src.fileno()).st_mtime
+            else:
+                src, mtime = path, path.mtime
+            with src:
+                info = zipfile.ZipInfo(arcname, time.localtime(mtime)[:6])
+                with zf.open(info, "w") as dst:
+                    for chunk in iter(lambda: src.read(chunk_size), b""):
+                        dst.write(chunk)
+                        yield sink.take()
+            data = sink.take()
+            if data:
+                yield data
+    yield sink.take()   # central directory, written by close()